@@ -0,0 +1,3 @@
+"""
+Пакет для замеров производительности бота
+"""
@@ -0,0 +1,126 @@
+"""
+Нагрузочный прогон ежедневной сводки на записанных ответах внешних сервисов.
+
+Запуск из корня проекта:
+    python -m benchmarks.digest_load [--users 100000] [--latency 0.05] [--error-rate 0.1] [--json]
+"""
+import argparse
+import asyncio
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from src.bot.services.notification_service import NotificationService
+from src.core.database import Database
+from src.utils.replay import ReplayTransport
+from src.utils.services import Services, ZODIAC_SIGNS
+
+FIXTURES_DIR = Path(__file__).parent / 'fixtures' / 'services'
+
+
+class FakeBot:
+    """
+    Заглушка бота: считает отправленные сообщения и имитирует задержку Telegram API
+    """
+    def __init__(self, latency: float = 0):
+        self.latency = latency
+        self.sent = 0
+
+    async def send_message(self, chat_id, text, parse_mode=None, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.sent += 1
+
+
+class FakeApplication:
+    """
+    Заглушка приложения с ботом
+    """
+    def __init__(self, bot: FakeBot):
+        self.bot = bot
+
+
+def populate(db: Database, users: int, seed: int = 0):
+    """
+    Заполнение базы пользователями с одним лекарством и случайным знаком зодиака
+
+    Args:
+        db (Database): База данных
+        users (int): Количество пользователей
+        seed (int, optional): Зерно генератора. По умолчанию 0.
+    """
+    rnd = random.Random(seed)
+    signs = list(ZODIAC_SIGNS)
+    db.conn.executemany(
+        "INSERT INTO medications (user_id, name, dose_per_intake, intakes_per_day, start_date, "
+        "duration_value, duration_unit, break_value, break_unit, cycles) "
+        "VALUES (?, 'Витамин D', 1, 1, '2025-01-01', 3, 'months', 1, 'months', 1)",
+        ((user_id,) for user_id in range(1, users + 1))
+    )
+    db.conn.executemany(
+        "INSERT INTO user_settings (user_id, zodiac_sign) VALUES (?, ?)",
+        ((user_id, rnd.choice(signs)) for user_id in range(1, users + 1) if rnd.random() < 0.8)
+    )
+    db.conn.commit()
+
+
+async def run(args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(str(Path(tmp) / 'users.db'))
+        populate(db, args.users)
+
+        transport = ReplayTransport(
+            args.fixtures, latency=args.latency, jitter=args.jitter,
+            error_rate=args.error_rate, seed=0
+        )
+        services = Services(httpx.AsyncClient(transport=transport))
+        bot = FakeBot(args.send_latency)
+        service = NotificationService(db, FakeApplication(bot), services)
+
+        started = time.perf_counter()
+        service.reload_schedule()
+        await service.prepare_digests(range(1, args.users + 1))
+        prepared = time.perf_counter()
+        await service.send_daily_notifications()
+        finished = time.perf_counter()
+
+        await services.close()
+        db.conn.close()
+
+    send_seconds = finished - prepared
+    return {
+        'users': args.users,
+        'sent': bot.sent,
+        'external_requests': transport.requests,
+        'prepare_s': round(prepared - started, 3),
+        'send_s': round(send_seconds, 3),
+        'messages_per_s': round(bot.sent / send_seconds, 1) if send_seconds else None,
+        'cache': services.cache_stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=100000, help='количество получателей')
+    parser.add_argument('--fixtures', default=str(FIXTURES_DIR), help='каталог записанных ответов')
+    parser.add_argument('--latency', type=float, default=0.05, help='задержка внешних сервисов, с')
+    parser.add_argument('--jitter', type=float, default=0.0, help='случайная добавка к задержке, с')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='доля ответов 503')
+    parser.add_argument('--send-latency', type=float, default=0.0, help='задержка Telegram API, с')
+    parser.add_argument('--json', action='store_true', help='вывести результаты в JSON')
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        for name, value in result.items():
+            print(f"{name:<20}{value}")
+
+
+if __name__ == '__main__':
+    main()
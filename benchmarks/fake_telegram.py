@@ -0,0 +1,401 @@
+"""
+Локальная замена Telegram Bot API для сквозных нагрузочных прогонов main.py.
+
+Сервер отдает боту через getUpdates сообщения сценариев пользователей
+(/start со знаком зодиака, диалог /add, серия /list), принимает sendMessage,
+editMessageText и остальные вызовы с настраиваемой задержкой и долей ответов
+429 (RetryAfter). Каждый пользователь отправляет следующее сообщение после
+ответа бота на предыдущее; по завершении выводится пропускная способность
+и процентили задержки ответа. Шаги без ответа считаются по номеру шага.
+
+Пауза между шагами (--think) по умолчанию - наименьшая, при которой сценарий
+укладывается в RateLimiter бота: иначе он отбрасывает последние шаги диалога
+/add, и запись в базу не попадает в прогон. Предупреждения ограничителя
+считаются отдельно и ответом на шаг не считаются.
+
+Запуск из корня проекта (бот запускается отдельным процессом с нужным окружением):
+    python -m benchmarks.fake_telegram --spawn [--users 200] [--latency 0.05] [--retry-rate 0.01] [--json]
+
+Или вручную: сервер без --spawn, затем в другом терминале
+    TELEGRAM_BOT_TOKEN=1:fake TELEGRAM_BASE_URL=http://127.0.0.1:8081/bot python main.py
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import date
+from pathlib import Path
+from urllib.parse import parse_qsl
+
+from src.bot.rate_limiter import RateLimiter
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+BOT_TOKEN = "1:fake"
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot",
+            "can_join_groups": False, "can_read_all_group_messages": False, "supports_inline_queries": False}
+# Методы, ответ на которые считается ответом бота пользователю
+REPLY_METHODS = {"sendMessage", "editMessageText"}
+
+
+def build_script(list_burst: int) -> list:
+    """
+    Сценарий пользователя: (текст, сколько сообщений бот отправляет в ответ)
+
+    Args:
+        list_burst (int): Сколько раз подряд вызывается /list
+
+    Returns:
+        list: Шаги сценария
+    """
+    return [
+        ("/start", 1),
+        ("овен", 2),
+        ("/add", 1),
+        ("Витамин D", 1),
+        ("1", 1),
+        ("2", 1),
+        (date.today().isoformat(), 1),
+        ("10", 1),
+        ("days", 1),
+        ("5", 1),
+        ("days", 1),
+        ("2", 1),
+    ] + [("/list", 1)] * list_burst
+
+
+def min_think(script: list) -> float:
+    """
+    Наименьшая пауза между шагами, при которой RateLimiter не отбрасывает ни одного шага
+
+    Args:
+        script (list): Шаги сценария
+
+    Returns:
+        float: Пауза в секундах (с запасом 10% на неравномерность ответов)
+    """
+    spent = 0
+    think = 0.0
+    for step, (text, _) in enumerate(script):
+        command = text[1:].split()[0] if text.startswith("/") else None
+        spent += RateLimiter.COMMAND_COSTS.get(command, RateLimiter.DEFAULT_COST)
+        if step and spent > RateLimiter.CAPACITY:
+            think = max(think, (spent - RateLimiter.CAPACITY) / RateLimiter.REFILL_RATE / step)
+    return round(think * 1.1, 2)
+
+
+def percentiles(values: list) -> dict:
+    values = sorted(values)
+    if not values:
+        return {}
+    last = len(values) - 1
+    return {
+        'p50_ms': round(values[round(last * 0.5)] * 1000, 2),
+        'p90_ms': round(values[round(last * 0.9)] * 1000, 2),
+        'p99_ms': round(values[round(last * 0.99)] * 1000, 2),
+        'max_ms': round(values[-1] * 1000, 2),
+    }
+
+
+class FakeTelegram:
+    """
+    HTTP-сервер с подмножеством Bot API и сценарии пользователей
+    """
+    # Сколько обновлений отдается за один getUpdates
+    UPDATES_LIMIT = 100
+
+    def __init__(self, args):
+        self.args = args
+        self.script = build_script(args.list_burst)
+        self.think = min_think(self.script) if args.think is None else args.think
+        self.rnd = random.Random(args.seed)
+        self._updates = []
+        self._next_update_id = 1
+        self._next_message_id = 1
+        self._new_updates = asyncio.Event()
+        self.bot_ready = asyncio.Event()
+        # chat_id -> очередь времен ответов бота
+        self._replies = defaultdict(asyncio.Queue)
+        self.calls = Counter()
+        self.retry_after_sent = 0
+        # Предупреждения RateLimiter: бот отбросил обновление
+        self.rate_limited = 0
+        self.latencies = []
+        # Шаг сценария -> сколько раз бот не ответил (ограничение частоты, 429, ошибки)
+        self.unanswered = Counter()
+        self.steps = 0
+
+    # --- HTTP ---
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Соединение с поддержкой keep-alive (httpx переиспользует соединения)
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                path = request_line.decode("latin-1").split()[1]
+                method = path.rstrip("/").rsplit("/", 1)[-1]
+                status, payload = await self.dispatch(method, self.parse_body(headers, body))
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n\r\n".encode("latin-1") + data
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            # Бот закрыл соединение или сервер останавливается
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def parse_body(headers: dict, body: bytes) -> dict:
+        """
+        Параметры запроса: PTB передает их формой, сложные значения - в JSON
+        """
+        if not body:
+            return {}
+        if headers.get("content-type", "").startswith("application/json"):
+            return json.loads(body)
+        params = {}
+        for key, value in parse_qsl(body.decode("utf-8")):
+            try:
+                params[key] = json.loads(value)
+            except ValueError:
+                params[key] = value
+        return params
+
+    async def dispatch(self, method: str, params: dict) -> tuple:
+        """
+        Ответ на вызов метода Bot API
+
+        Returns:
+            tuple: (HTTP-статус, тело ответа)
+        """
+        self.calls[method] += 1
+        if method == "getUpdates":
+            return "200 OK", {"ok": True, "result": await self.get_updates(params)}
+        if method == "getMe":
+            return "200 OK", {"ok": True, "result": BOT_USER}
+        if method not in REPLY_METHODS and method != "answerCallbackQuery":
+            # deleteWebhook, setMyCommands и прочие служебные вызовы
+            return "200 OK", {"ok": True, "result": True}
+
+        if self.args.latency:
+            await asyncio.sleep(self.rnd.uniform(0.5, 1.5) * self.args.latency)
+        if self.rnd.random() < self.args.retry_rate:
+            self.retry_after_sent += 1
+            retry_after = self.args.retry_after
+            return "429 Too Many Requests", {
+                "ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after {retry_after}",
+                "parameters": {"retry_after": retry_after},
+            }
+        if method == "answerCallbackQuery":
+            return "200 OK", {"ok": True, "result": True}
+
+        chat_id = int(params.get("chat_id", 0))
+        if params.get("text") == RateLimiter.NOTICE:
+            self.rate_limited += 1
+        else:
+            self._replies[chat_id].put_nowait(time.perf_counter())
+        message_id = self._next_message_id
+        self._next_message_id += 1
+        return "200 OK", {"ok": True, "result": {
+            "message_id": params.get("message_id", message_id),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            "text": params.get("text", ""),
+        }}
+
+    async def get_updates(self, params: dict) -> list:
+        """
+        getUpdates с ожиданием новых обновлений до timeout секунд
+        """
+        self.bot_ready.set()
+        offset = int(params.get("offset", 0) or 0)
+        timeout = float(params.get("timeout", 0) or 0)
+        if offset:
+            self._updates = [update for update in self._updates if update["update_id"] >= offset]
+        if not self._updates and timeout:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:self.UPDATES_LIMIT]
+
+    # --- Сценарии ---
+
+    def push_message(self, user_id: int, text: str):
+        """
+        Новое сообщение пользователя в очереди getUpdates
+        """
+        message = {
+            "message_id": self._next_message_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private", "first_name": f"user{user_id}"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+            "text": text,
+        }
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        self._next_message_id += 1
+        self._updates.append({"update_id": self._next_update_id, "message": message})
+        self._next_update_id += 1
+        self._new_updates.set()
+
+    async def run_user(self, user_id: int, delay: float):
+        """
+        Сценарий одного пользователя: шаг за шагом, каждый после ответа бота
+        """
+        await asyncio.sleep(delay)
+        replies = self._replies[user_id]
+        for step, (text, expected) in enumerate(self.script, 1):
+            sent_at = time.perf_counter()
+            self.push_message(user_id, text)
+            self.steps += 1
+            try:
+                first = await asyncio.wait_for(replies.get(), self.args.reply_timeout)
+                self.latencies.append(first - sent_at)
+                for _ in range(expected - 1):
+                    await asyncio.wait_for(replies.get(), self.args.reply_timeout)
+            except asyncio.TimeoutError:
+                self.unanswered[f"{step}:{text}"] += 1
+            # Лишние ответы (например, повторная отправка после 429) не переносим на следующий шаг
+            while not replies.empty():
+                replies.get_nowait()
+            if self.think:
+                await asyncio.sleep(self.think)
+
+    async def run_sessions(self) -> dict:
+        """
+        Запуск всех сценариев после первого getUpdates бота
+
+        Returns:
+            dict: Результаты прогона
+        """
+        await asyncio.wait_for(self.bot_ready.wait(), self.args.startup_timeout)
+        first_user = self.args.first_user_id
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            self.run_user(first_user + index, self.args.ramp * index / max(self.args.users, 1))
+            for index in range(self.args.users)
+        ))
+        elapsed = time.perf_counter() - started
+        return {
+            'users': self.args.users,
+            'steps': self.steps,
+            'answered': len(self.latencies),
+            'unanswered': sum(self.unanswered.values()),
+            'unanswered_by_step': dict(self.unanswered),
+            'elapsed_s': round(elapsed, 3),
+            'updates_per_s': round(self.steps / elapsed, 1) if elapsed else None,
+            'replies_per_s': round(len(self.latencies) / elapsed, 1) if elapsed else None,
+            'reply_latency': percentiles(self.latencies),
+            'retry_after_injected': self.retry_after_sent,
+            'rate_limited_notices': self.rate_limited,
+            'api_calls': dict(self.calls),
+            'settings': {
+                'latency': self.args.latency,
+                'retry_rate': self.args.retry_rate,
+                'list_burst': self.args.list_burst,
+                'think': self.think,
+                'ramp': self.args.ramp,
+            },
+        }
+
+
+def spawn_bot(port: int, workdir: str) -> subprocess.Popen:
+    """
+    Запуск main.py с токеном и адресом фиктивного сервера в отдельном каталоге данных
+
+    Args:
+        port (int): Порт сервера
+        workdir (str): Рабочий каталог бота (data/users.db, лог)
+
+    Returns:
+        subprocess.Popen: Процесс бота
+    """
+    env = dict(
+        os.environ,
+        TELEGRAM_BOT_TOKEN=BOT_TOKEN,
+        TELEGRAM_BASE_URL=f"http://127.0.0.1:{port}/bot",
+        PYTHONPATH=str(PROJECT_ROOT),
+    )
+    Path(workdir, "data").mkdir(exist_ok=True)
+    return subprocess.Popen(
+        [sys.executable, str(PROJECT_ROOT / "main.py")],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+async def run(args) -> dict:
+    fake = FakeTelegram(args)
+    server = await asyncio.start_server(fake.handle_connection, "127.0.0.1", args.port)
+    bot = None
+    workdir = tempfile.TemporaryDirectory() if args.spawn else None
+    try:
+        if args.spawn:
+            bot = spawn_bot(args.port, workdir.name)
+        return await fake.run_sessions()
+    finally:
+        if bot is not None:
+            bot.send_signal(signal.SIGINT)
+            try:
+                bot.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                bot.kill()
+        server.close()
+        await server.wait_closed()
+        if workdir is not None:
+            workdir.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=8081, help='порт сервера')
+    parser.add_argument('--spawn', action='store_true', help='запустить main.py с адресом этого сервера')
+    parser.add_argument('--users', type=int, default=100, help='количество пользователей')
+    parser.add_argument('--first-user-id', type=int, default=100000, help='ID первого пользователя')
+    parser.add_argument('--list-burst', type=int, default=3, help='сколько /list подряд в конце сценария')
+    parser.add_argument('--ramp', type=float, default=1.0, help='за сколько секунд подключаются все пользователи')
+    parser.add_argument('--think', type=float, default=None,
+                        help='пауза пользователя между шагами, с (по умолчанию - без срабатывания RateLimiter)')
+    parser.add_argument('--latency', type=float, default=0.0, help='средняя задержка ответа на отправку, с')
+    parser.add_argument('--retry-rate', type=float, default=0.0, help='доля отправок, отклоняемых с 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='retry_after в ответах 429, с')
+    parser.add_argument('--reply-timeout', type=float, default=10.0, help='сколько ждать ответа бота, с')
+    parser.add_argument('--startup-timeout', type=float, default=60.0, help='сколько ждать подключения бота, с')
+    parser.add_argument('--seed', type=int, default=0, help='зерно генератора')
+    parser.add_argument('--json', action='store_true', help='вывод в JSON')
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+    for key, value in results.items():
+        print(f"{key:<22} {value}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Сравнение извлечения гороскопа: разбор всей страницы против разбора только нужного блока.
+
+Запуск из корня проекта:
+    python -m benchmarks.horoscope_parse [--repeat 50] [--json]
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+from src.utils.services import extract_horoscope_text
+
+FIXTURES_DIR = Path(__file__).parent / 'fixtures'
+
+
+def parse_full_page(content: bytes) -> str:
+    """
+    Прежний способ: дерево всей страницы через html.parser
+
+    Args:
+        content (bytes): Содержимое страницы
+
+    Returns:
+        str: Текст гороскопа или None
+    """
+    soup = BeautifulSoup(content, 'html.parser')
+    main_content = soup.find('main', {'itemprop': 'articleBody'})
+    if main_content:
+        paragraphs = []
+        for div in main_content.find_all('div', class_='b6a5d4949c'):
+            paragraphs.extend(p.text.strip() for p in div.find_all('p'))
+        if paragraphs:
+            return '\n\n'.join(paragraphs)
+    return None
+
+
+def measure(func, content: bytes, repeat: int) -> dict:
+    """
+    Замер среднего времени и пикового объема памяти одного вызова
+
+    Args:
+        func (Callable): Функция извлечения
+        content (bytes): Содержимое страницы
+        repeat (int): Количество повторов для замера времени
+
+    Returns:
+        dict: {'ms': среднее время в мс, 'peak_kib': пиковая память в КиБ}
+    """
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func(content)
+    elapsed = (time.perf_counter() - started) / repeat
+
+    tracemalloc.start()
+    func(content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {'ms': round(elapsed * 1000, 3), 'peak_kib': round(peak / 1024, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=50, help='повторов на каждый замер')
+    parser.add_argument('--json', action='store_true', help='вывести результаты в JSON')
+    args = parser.parse_args()
+
+    results = []
+    for fixture in sorted(FIXTURES_DIR.glob('horoscope_*.html')):
+        content = fixture.read_bytes()
+        expected = parse_full_page(content)
+        actual = extract_horoscope_text(content)
+        if actual != expected:
+            raise SystemExit(f"{fixture.name}: результаты не совпадают")
+
+        results.append({
+            'fixture': fixture.name,
+            'size_kib': round(len(content) / 1024, 1),
+            'full_page': measure(parse_full_page, content, args.repeat),
+            'targeted': measure(extract_horoscope_text, content, args.repeat),
+        })
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+
+    print(f"{'fixture':<26}{'size KiB':>10}{'full ms':>10}{'full KiB':>10}{'fast ms':>10}{'fast KiB':>10}")
+    for row in results:
+        print(
+            f"{row['fixture']:<26}{row['size_kib']:>10}"
+            f"{row['full_page']['ms']:>10}{row['full_page']['peak_kib']:>10}"
+            f"{row['targeted']['ms']:>10}{row['targeted']['peak_kib']:>10}"
+        )
+
+
+if __name__ == '__main__':
+    main()
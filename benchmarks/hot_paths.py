@@ -0,0 +1,346 @@
+"""
+Замеры горячих путей бота на синтетических базах разного размера.
+
+Для каждого размера создается users.db с заданным числом лекарств и смесью
+настроек пользователей, после чего замеряются: загрузка лекарств в память
+и check_medications, get_medications, сборка /list, диалог /add и /add_many,
+подготовка и рассылка ежедневной сводки. Бот и внешние сервисы заменены
+заглушками, результаты выводятся в JSON для сравнения между коммитами.
+
+Запуск из корня проекта:
+    python -m benchmarks.hot_paths [--sizes 1000,100000,1000000] [--output results.json]
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import subprocess
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+
+from benchmarks.digest_load import FakeApplication, FakeBot
+from src.bot.handlers.medication_handlers import MedicationHandlers
+from src.bot.services.medication_list import MedicationListRenderer
+from src.bot.services.notification_service import NotificationService
+from src.bot.services.scheduler_service import SchedulerService
+from src.core.database import Database
+from src.core.logger import logger
+from src.core.medication_store import MedicationStore
+from src.utils.helpers import format_medication_info
+from src.utils.services import ZODIAC_SIGNS
+
+CITIES = ["Moscow", "Brest,BY", "Minsk", "Kazan", "Tbilisi", "Riga", "Almaty"]
+NAMES = ["Витамин D", "Омега-3", "Магний B6", "Цинк", "Железо", "Кальций", "Фолиевая кислота"]
+
+
+class StubServices:
+    """
+    Заглушка внешних источников: фиксированные ответы без сети
+    """
+    def __init__(self, latency: float = 0):
+        self.latency = latency
+        self.requests = 0
+
+    async def _answer(self, text: str) -> str:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return text
+
+    async def get_weather(self, city: str) -> str:
+        return await self._answer(f"🌤 Погода в {city}: +12°C, облачно")
+
+    async def get_exchange_rates(self) -> str:
+        return await self._answer("💵 USD/BYN: 3.25\n₿ BTC: 65000 USD")
+
+    async def get_horoscope(self, sign: str) -> str:
+        return await self._answer(f"♈ Гороскоп ({sign}): удачный день для новых начинаний.")
+
+    @staticmethod
+    def get_daily_quote() -> str:
+        return "💬 Цитата дня"
+
+
+class FakeMessage:
+    """
+    Заглушка входящего сообщения: ответы только считаются
+    """
+    def __init__(self, user_id: int, text: str = ""):
+        self.from_user = SimpleNamespace(id=user_id)
+        self.text = text
+        self.replies = 0
+
+    async def reply_text(self, text, **kwargs):
+        self.replies += 1
+
+
+def fake_update(user_id: int, text: str = ""):
+    """
+    Заглушка Update с сообщением пользователя
+
+    Args:
+        user_id (int): ID пользователя
+        text (str, optional): Текст сообщения. По умолчанию пустой.
+
+    Returns:
+        SimpleNamespace: Объект с полями effective_user и message
+    """
+    return SimpleNamespace(effective_user=SimpleNamespace(id=user_id), message=FakeMessage(user_id, text))
+
+
+def generate_db(path: str, medications: int, args) -> dict:
+    """
+    Синтетическая база: лекарства распределены по пользователям, у части
+    пользователей заданы знак зодиака, города, время сводки и отключены уведомления
+
+    Args:
+        path (str): Путь к файлу базы
+        medications (int): Количество лекарств
+        args: Параметры смеси пользователей (см. main)
+
+    Returns:
+        dict: Сводка по сгенерированной базе
+    """
+    rnd = random.Random(args.seed)
+    users = max(1, round(medications / args.meds_per_user))
+    db = Database(path)
+    today = date.today()
+
+    def medication_rows():
+        for _ in range(medications):
+            start = today - timedelta(days=rnd.randrange(0, 120))
+            yield (
+                rnd.randrange(1, users + 1), rnd.choice(NAMES), rnd.randint(1, 3), rnd.randint(1, 4),
+                start.isoformat(), rnd.randint(1, 6), rnd.choice(("days", "months")),
+                rnd.randint(0, 2), rnd.choice(("days", "months")), rnd.randint(1, 3),
+            )
+
+    db.conn.executemany(
+        "INSERT INTO medications (user_id, name, dose_per_intake, intakes_per_day, start_date, "
+        "duration_value, duration_unit, break_value, break_unit, cycles) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        medication_rows()
+    )
+
+    signs = list(ZODIAC_SIGNS)
+    settings = []
+    for user_id in range(1, users + 1):
+        sign = rnd.choice(signs) if rnd.random() < args.zodiac_share else None
+        cities = ";".join(rnd.sample(CITIES, rnd.randint(1, 3))) if rnd.random() < args.cities_share else None
+        digest_time = f"{rnd.randint(6, 10):02d}:{rnd.choice((0, 15, 30, 45)):02d}" \
+            if rnd.random() < args.custom_time_share else None
+        digest_enabled = int(rnd.random() >= args.opt_out_share)
+        reminders_enabled = int(rnd.random() >= args.opt_out_share)
+        if sign or cities or digest_time or not digest_enabled or not reminders_enabled:
+            settings.append((user_id, sign, cities, digest_time, digest_enabled, reminders_enabled))
+    db.conn.executemany(
+        "INSERT INTO user_settings (user_id, zodiac_sign, cities, digest_time, digest_enabled, reminders_enabled) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        settings
+    )
+    # Журнал изменений заполняется триггерами; в готовой базе он уже вошел бы в снимок
+    db.conn.execute("DELETE FROM medication_changes")
+    db.conn.commit()
+    db.conn.close()
+    return {'medications': medications, 'users': users, 'users_with_settings': len(settings)}
+
+
+def timed(func, *args) -> tuple:
+    """
+    Время выполнения функции
+
+    Returns:
+        tuple: (результат, время в мс)
+    """
+    started = time.perf_counter()
+    result = func(*args)
+    return result, round((time.perf_counter() - started) * 1000, 3)
+
+
+async def timed_async(coro) -> tuple:
+    """
+    Время выполнения корутины
+
+    Returns:
+        tuple: (результат, время в мс)
+    """
+    started = time.perf_counter()
+    result = await coro
+    return result, round((time.perf_counter() - started) * 1000, 3)
+
+
+def first_intake() -> datetime:
+    """
+    09:00 сегодня - время первого приема, чтобы check_medications отправлял напоминания
+    """
+    return datetime.combine(date.today(), datetime.min.time()).replace(hour=9)
+
+
+async def bench_size(medications: int, args, tmp: Path) -> dict:
+    """
+    Все замеры для одного размера базы
+
+    Args:
+        medications (int): Количество лекарств
+        args: Параметры запуска
+        tmp (Path): Каталог для временных файлов
+
+    Returns:
+        dict: Результаты замеров
+    """
+    db_path = str(tmp / f"users_{medications}.db")
+    snapshot_path = tmp / f"medications_{medications}.snapshot"
+    result = {'db': generate_db(db_path, medications, args)}
+    users = result['db']['users']
+    rnd = random.Random(args.seed + 1)
+    sample = [rnd.randint(1, users) for _ in range(args.samples)]
+
+    db = Database(db_path)
+
+    # Загрузка лекарств в память: из таблицы и из снимка
+    store, table_ms = timed(MedicationStore, db, snapshot_path)
+    _, snapshot_save_ms = timed(store.save_snapshot)
+    store, snapshot_ms = timed(MedicationStore, db, snapshot_path)
+    result['store'] = {
+        'load_table_ms': table_ms,
+        'save_snapshot_ms': snapshot_save_ms,
+        'load_snapshot_ms': snapshot_ms,
+        'snapshot_kib': round(snapshot_path.stat().st_size / 1024, 1),
+    }
+
+    # check_medications в момент приема
+    bot = FakeBot()
+    scheduler = SchedulerService(db, FakeApplication(bot), store, clock=first_intake)
+    _, check_ms = await timed_async(scheduler.check_medications())
+    result['check_medications'] = {'ms': check_ms, 'reminders': bot.sent}
+
+    # get_medications и сборка /list для случайных пользователей
+    started = time.perf_counter()
+    fetched = [db.get_medications(user_id) for user_id in sample]
+    get_ms = (time.perf_counter() - started) * 1000
+    meds = [med for user_meds in fetched for med in user_meds]
+    _, format_ms = timed(lambda: [format_medication_info(med) for med in meds])
+    renderer = MedicationListRenderer(db)
+    _, cold_ms = timed(lambda: [renderer.render(user_id) for user_id in sample])
+    _, warm_ms = timed(lambda: [renderer.render(user_id) for user_id in sample])
+    result['get_medications'] = {'calls': len(sample), 'us_per_call': round(get_ms * 1000 / len(sample), 1)}
+    result['format_medication_info'] = {
+        'rows': len(meds), 'us_per_row': round(format_ms * 1000 / len(meds), 2) if meds else None,
+    }
+    result['list_render'] = {
+        'cold_us_per_user': round(cold_ms * 1000 / len(sample), 1),
+        'warm_us_per_user': round(warm_ms * 1000 / len(sample), 1),
+    }
+
+    # Диалог /add из девяти шагов и /add_many на три лекарства
+    handlers = MedicationHandlers(db, logger, renderer)
+    steps = [
+        handlers.set_name, handlers.set_dose, handlers.set_intakes, handlers.set_start_date,
+        handlers.set_duration_value, handlers.set_duration_unit, handlers.set_break_value,
+        handlers.set_break_unit, handlers.set_cycles,
+    ]
+    answers = ["Витамин C", "1", "2", date.today().isoformat(), "10", "days", "5", "days", "2"]
+    started = time.perf_counter()
+    for user_id in sample[:args.add_samples]:
+        context = SimpleNamespace(user_data={})
+        await handlers.add_medication(fake_update(user_id, "/add"), context)
+        for step, answer in zip(steps, answers):
+            await step(fake_update(user_id, answer), context)
+    add_ms = (time.perf_counter() - started) * 1000
+    bulk_text = "/add_many\n" + "\n".join(
+        f"{name}; 1; 2; {date.today().isoformat()}; 10; days; 5; days; 2" for name in NAMES[:3]
+    )
+    started = time.perf_counter()
+    for user_id in sample[:args.add_samples]:
+        await handlers.bulk_add_medications(fake_update(user_id, bulk_text), None)
+    bulk_ms = (time.perf_counter() - started) * 1000
+    add_count = len(sample[:args.add_samples])
+    result['add_flow'] = {
+        'ms_per_medication': round(add_ms / add_count, 3),
+        'updates_per_medication': len(steps) + 1,
+        'add_many_ms_per_medication': round(bulk_ms / (add_count * 3), 3),
+    }
+
+    # Ежедневная сводка всем получателям
+    services = StubServices(args.service_latency)
+    bot = FakeBot(args.send_latency)
+    notifications = NotificationService(db, FakeApplication(bot), services)
+
+    async def prepare():
+        # Как в работе бота: загрузка расписания и подготовка сводки до отправки
+        notifications.reload_schedule()
+        await notifications.prepare_digests(range(1, users + 1))
+
+    _, prepare_ms = await timed_async(prepare())
+    _, send_ms = await timed_async(notifications.send_daily_notifications())
+    result['digest'] = {
+        'recipients': notifications.recipient_count,
+        'sent': bot.sent,
+        'variants': notifications.prepared_count,
+        'service_requests': services.requests,
+        'prepare_ms': prepare_ms,
+        'send_ms': send_ms,
+        'messages_per_s': round(bot.sent / send_ms * 1000, 1) if send_ms else None,
+    }
+
+    db.conn.close()
+    return result
+
+
+def git_revision() -> str:
+    """
+    Текущий коммит для сравнения результатов между версиями
+
+    Returns:
+        str: Хэш коммита или None
+    """
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+async def run(args) -> dict:
+    results = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'sizes': {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            results['sizes'][str(size)] = await bench_size(size, args, Path(tmp))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=lambda value: [int(size) for size in value.split(',')],
+                        default=[1000, 100000], help='количество лекарств в базах через запятую')
+    parser.add_argument('--meds-per-user', type=float, default=3, help='среднее число лекарств на пользователя')
+    parser.add_argument('--zodiac-share', type=float, default=0.8, help='доля пользователей со знаком зодиака')
+    parser.add_argument('--cities-share', type=float, default=0.3, help='доля пользователей со своими городами')
+    parser.add_argument('--custom-time-share', type=float, default=0.5, help='доля пользователей со своим временем сводки')
+    parser.add_argument('--opt-out-share', type=float, default=0.05, help='доля отключивших каждый вид уведомлений')
+    parser.add_argument('--samples', type=int, default=1000, help='пользователей для замеров /list')
+    parser.add_argument('--add-samples', type=int, default=200, help='пользователей для замеров /add')
+    parser.add_argument('--service-latency', type=float, default=0.0, help='задержка внешних сервисов, с')
+    parser.add_argument('--send-latency', type=float, default=0.0, help='задержка Telegram API, с')
+    parser.add_argument('--seed', type=int, default=0, help='зерно генератора')
+    parser.add_argument('--output', help='файл для результатов JSON (по умолчанию stdout)')
+    args = parser.parse_args()
+
+    results = json.dumps(asyncio.run(run(args)), ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(results)
+    else:
+        print(results)
+
+
+if __name__ == '__main__':
+    main()
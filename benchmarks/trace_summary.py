@@ -0,0 +1,181 @@
+"""
+Сводка по трейсам бота (см. src/utils/tracing.py).
+
+Показывает распределение длительности по видам трейсов, самые медленные
+трейсы и разбор их критического пути: сколько времени ушло на sqlite,
+внешние источники, Bot API и собственный код обработчиков.
+
+Запуск из корня проекта:
+    python -m benchmarks.trace_summary [data/traces.jsonl] [--top 10] [--name update] [--json]
+"""
+import argparse
+import json
+from collections import defaultdict
+
+
+def load_traces(path: str, name: str = None) -> list:
+    """
+    Чтение трейсов из JSONL
+
+    Args:
+        path (str): Файл трейсов
+        name (str, optional): Только трейсы с этим именем. По умолчанию все.
+
+    Returns:
+        list: Трейсы
+    """
+    traces = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            trace = json.loads(line)
+            if name is None or trace['name'] == name:
+                traces.append(trace)
+    return traces
+
+
+def percentile(values: list, share: float) -> float:
+    values = sorted(values)
+    return values[round((len(values) - 1) * share)] if values else 0.0
+
+
+def critical_path(trace: dict) -> list:
+    """
+    Критический путь трейса: цепочка спанов, определяющая его длительность.
+
+    От конца родителя назад выбирается дочерний спан, закончившийся последним;
+    время между дочерними спанами относится к самому родителю. Параллельные
+    дочерние спаны (asyncio.gather), перекрытые выбранным, в путь не входят.
+
+    Args:
+        trace (dict): Трейс
+
+    Returns:
+        list: [(индекс спана, собственное время на пути в мс), ...] в порядке начала
+    """
+    spans = trace['spans']
+    children = defaultdict(list)
+    for index, span in enumerate(spans):
+        if span['parent'] is not None and span['duration_ms'] is not None:
+            children[span['parent']].append(index)
+
+    path = []
+
+    def walk(index: int):
+        span = spans[index]
+        start = span['start_ms']
+        cursor = start + span['duration_ms']
+        own = 0.0
+        chosen = []
+        for child in sorted(children[index], key=lambda i: spans[i]['start_ms'] + spans[i]['duration_ms'], reverse=True):
+            child_end = spans[child]['start_ms'] + spans[child]['duration_ms']
+            if child_end > cursor:
+                continue
+            own += cursor - child_end
+            chosen.append(child)
+            cursor = spans[child]['start_ms']
+        own += max(cursor - start, 0.0)
+        path.append((index, round(own, 3)))
+        for child in reversed(chosen):
+            walk(child)
+
+    walk(0)
+    return sorted(path, key=lambda item: spans[item[0]]['start_ms'])
+
+
+def breakdown(trace: dict, path: list) -> dict:
+    """
+    Время критического пути по видам спанов
+
+    Returns:
+        dict: {вид: мс}
+    """
+    totals = defaultdict(float)
+    for index, own in path:
+        totals[trace['spans'][index]['kind']] += own
+    return {kind: round(ms, 3) for kind, ms in sorted(totals.items(), key=lambda item: -item[1])}
+
+
+def summarize(traces: list, top: int) -> dict:
+    """
+    Сводка: распределения по именам трейсов, доли видов спанов и самые медленные трейсы
+
+    Args:
+        traces (list): Трейсы
+        top (int): Сколько медленных трейсов разобрать
+
+    Returns:
+        dict: Сводка
+    """
+    by_name = defaultdict(list)
+    shares = defaultdict(lambda: defaultdict(float))
+    for trace in traces:
+        by_name[trace['name']].append(trace['duration_ms'])
+        for kind, ms in breakdown(trace, critical_path(trace)).items():
+            shares[trace['name']][kind] += ms
+
+    names = {}
+    for name, durations in sorted(by_name.items(), key=lambda item: -sum(item[1])):
+        total = sum(durations) or 1.0
+        names[name] = {
+            'count': len(durations),
+            'p50_ms': round(percentile(durations, 0.5), 3),
+            'p95_ms': round(percentile(durations, 0.95), 3),
+            'max_ms': round(max(durations), 3),
+            'critical_path_share': {
+                kind: round(ms / total, 3) for kind, ms in sorted(shares[name].items(), key=lambda item: -item[1])
+            },
+        }
+
+    slowest = []
+    for trace in sorted(traces, key=lambda item: -item['duration_ms'])[:top]:
+        path = critical_path(trace)
+        spans = trace['spans']
+        slowest.append({
+            'trace_id': trace['trace_id'],
+            'name': trace['name'],
+            'duration_ms': trace['duration_ms'],
+            'attrs': spans[0]['attrs'],
+            'breakdown_ms': breakdown(trace, path),
+            'critical_path': [
+                {'name': spans[index]['name'], 'kind': spans[index]['kind'], 'own_ms': own}
+                for index, own in path if own > 0
+            ],
+        })
+    return {'traces': len(traces), 'by_name': names, 'slowest': slowest}
+
+
+def print_summary(summary: dict):
+    print(f"Трейсов: {summary['traces']}")
+    print()
+    for name, stats in summary['by_name'].items():
+        shares = ", ".join(f"{kind} {share:.0%}" for kind, share in stats['critical_path_share'].items())
+        print(f"{name:<40} n={stats['count']:<6} p50 {stats['p50_ms']:>9.1f} мс  "
+              f"p95 {stats['p95_ms']:>9.1f} мс  max {stats['max_ms']:>9.1f} мс  [{shares}]")
+    for trace in summary['slowest']:
+        print()
+        print(f"{trace['name']} {trace['trace_id']}: {trace['duration_ms']:.1f} мс {trace['attrs'] or ''}")
+        print("  " + ", ".join(f"{kind} {ms:.1f} мс" for kind, ms in trace['breakdown_ms'].items()))
+        for step in trace['critical_path']:
+            print(f"    {step['own_ms']:>9.1f} мс  {step['kind']:<9} {step['name']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('path', nargs='?', default='data/traces.jsonl', help='файл трейсов')
+    parser.add_argument('--top', type=int, default=10, help='сколько медленных трейсов разобрать')
+    parser.add_argument('--name', help='только трейсы с этим именем (update, medications.medication_check, ...)')
+    parser.add_argument('--json', action='store_true', help='вывод в JSON')
+    args = parser.parse_args()
+
+    summary = summarize(load_traces(args.path, args.name), args.top)
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+    else:
+        print_summary(summary)
+
+
+if __name__ == '__main__':
+    main()
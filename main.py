@@ -1,24 +1,41 @@
 import os
 import asyncio
+import signal
+from datetime import datetime
 from dotenv import load_dotenv
 
+from apscheduler.events import EVENT_JOB_MISSED, EVENT_JOB_SUBMITTED
+
+from telegram import Update
 from telegram.ext import (
     Application,
     CommandHandler,
     CallbackQueryHandler,
     ConversationHandler,
     MessageHandler,
+    TypeHandler,
     filters,
 )
 
 from src.core.database import Database
 from src.core.logger import logger
-from src.bot.handlers.medication_handlers import MedicationHandlers, NAME, DOSE, INTAKES, START_DATE, DURATION_VALUE, DURATION_UNIT, BREAK_VALUE, BREAK_UNIT, CYCLES, EDIT_CHOICE, EDIT_FIELD, ZODIAC_SIGN
+from src.bot.application import OrderedApplication
+from src.bot.persistence import SqlitePersistence
+from src.bot.rate_limiter import RateLimiter
+from src.bot.handlers.medication_handlers import MedicationHandlers, EDIT_PREFIX, DELETE_PREFIX, PAGE_MARK, NAME, DOSE, INTAKES, START_DATE, DURATION_VALUE, DURATION_UNIT, BREAK_VALUE, BREAK_UNIT, CYCLES, EDIT_CHOICE, EDIT_FIELD, ZODIAC_SIGN
 from src.bot.handlers.notification_handlers import NotificationHandlers
 from src.bot.services.notification_service import NotificationService
 from src.bot.services.scheduler_service import SchedulerService
+from src.utils.services import Services
+from src.utils.replay import create_client_from_env
+from src.utils.metrics import create_metrics_from_env
+from src.utils.tracing import TracedRequest, create_tracer_from_env
+from src.utils.loop_monitor import LoopMonitor
+
+# Максимальное число одновременно обрабатываемых обновлений
+CONCURRENT_UPDATES = 256
 
-def setup_handlers(application, db, logger):
+def setup_handlers(application, db, logger, notification_service, metrics=None, tracer=None):
     """
     Настройка обработчиков команд
     
@@ -26,11 +43,33 @@ def setup_handlers(application, db, logger):
         application: Экземпляр приложения бота
         db (Database): Экземпляр базы данных
         logger: Логгер
+        notification_service (NotificationService): Сервис уведомлений
+        metrics (Metrics, optional): Метрики. По умолчанию выключены.
+        tracer (Tracer, optional): Трассировка. По умолчанию выключена.
     """
     # Инициализация обработчиков
-    med_handlers = MedicationHandlers(db, logger)
+    med_handlers = MedicationHandlers(db, logger, notification_service.medication_lists)
     notif_handlers = NotificationHandlers(db, logger)
     
+    # Ограничение частоты запросов проверяется до всех остальных обработчиков
+    rate_limiter = RateLimiter()
+    application.add_handler(TypeHandler(Update, rate_limiter.check), group=-1)
+    
+    # Обработчики оборачиваются до регистрации: Application хранит ссылки на методы
+    if metrics is not None:
+        handlers_histogram = metrics.histogram(
+            "bot_handler_seconds", "Длительность обработчиков обновлений", "handler"
+        )
+        metrics.instrument(med_handlers, handlers_histogram)
+        metrics.instrument(notif_handlers, handlers_histogram)
+        metrics.register(
+            "bot_rate_limited_total", "counter", "Обновления, отброшенные ограничителем частоты", (),
+            lambda: {(): rate_limiter.dropped}
+        )
+    if tracer is not None:
+        tracer.instrument(med_handlers, "handler")
+        tracer.instrument(notif_handlers, "handler")
+    
     # Команда /start с обработкой знака зодиака при первом запуске
     start_conv = ConversationHandler(
         entry_points=[CommandHandler("start", med_handlers.start)],
@@ -38,6 +77,8 @@ def setup_handlers(application, db, logger):
             ZODIAC_SIGN: [MessageHandler(filters.TEXT & ~filters.COMMAND, med_handlers.set_user_zodiac)],
         },
         fallbacks=[CommandHandler("cancel", med_handlers.cancel)],
+        name="start",
+        persistent=True,
     )
     application.add_handler(start_conv)
     
@@ -56,18 +97,25 @@ def setup_handlers(application, db, logger):
             CYCLES: [MessageHandler(filters.TEXT & ~filters.COMMAND, med_handlers.set_cycles)],
         },
         fallbacks=[CommandHandler("cancel", med_handlers.cancel)],
+        name="add",
+        persistent=True,
     )
     application.add_handler(add_conv)
     
+    # Добавление нескольких лекарств одним сообщением
+    application.add_handler(CommandHandler("add_many", med_handlers.bulk_add_medications))
+    
     # Редактирование лекарства
     edit_conv = ConversationHandler(
         entry_points=[CommandHandler("edit", med_handlers.edit_medication)],
         states={
-            EDIT_CHOICE: [CallbackQueryHandler(med_handlers.edit_choice)],
+            EDIT_CHOICE: [CallbackQueryHandler(med_handlers.edit_choice, pattern=rf"^{EDIT_PREFIX}({PAGE_MARK})?\d+$")],
             EDIT_FIELD: [MessageHandler(filters.TEXT & ~filters.COMMAND, med_handlers.save_edit)],
         },
         fallbacks=[CommandHandler("cancel", med_handlers.cancel)],
-        allow_reentry=True
+        allow_reentry=True,
+        name="edit",
+        persistent=True,
     )
     application.add_handler(edit_conv)
     
@@ -76,7 +124,8 @@ def setup_handlers(application, db, logger):
     
     # Удаление лекарства
     application.add_handler(CommandHandler("delete", med_handlers.delete_medication))
-    application.add_handler(CallbackQueryHandler(med_handlers.delete_confirm, pattern="^delete_"))
+    application.add_handler(CallbackQueryHandler(med_handlers.delete_confirm, pattern=rf"^{DELETE_PREFIX}\d+$"))
+    application.add_handler(CallbackQueryHandler(med_handlers.delete_page, pattern=rf"^{DELETE_PREFIX}{PAGE_MARK}\d+$"))
     
     # Обработка выбора поля для редактирования
     application.add_handler(
@@ -89,23 +138,31 @@ def setup_handlers(application, db, logger):
     # Установка знака зодиака
     application.add_handler(CommandHandler("set_zodiac", notif_handlers.set_zodiac))
     
+    # Города для погоды в ежедневной сводке
+    application.add_handler(CommandHandler("set_cities", notif_handlers.set_cities))
+    
     # Управление уведомлениями
     application.add_handler(CommandHandler("notifications", notif_handlers.toggle_notifications))
     application.add_handler(CommandHandler("set_time", notif_handlers.set_notification_time))
+    
+    # Кнопки старых клавиатур (в том числе с callback_data до перехода на короткий формат):
+    # регистрируется последним и получает только нажатия, не подошедшие другим обработчикам
+    application.add_handler(CallbackQueryHandler(med_handlers.stale_callback))
 
-def setup_services(application, db):
+def setup_services(application, db, services):
     """
     Настройка сервисов
     
     Args:
         application: Экземпляр приложения бота
         db (Database): Экземпляр базы данных
+        services (Services): Внешние источники данных
     
     Returns:
         tuple: Экземпляры сервисов (notification_service, scheduler_service)
     """
     # Инициализация сервисов
-    notification_service = NotificationService(db, application)
+    notification_service = NotificationService(db, application, services)
     scheduler_service = SchedulerService(db, application)
     
     # Настройка и запуск сервисов
@@ -117,6 +174,123 @@ def setup_services(application, db):
     
     return notification_service, scheduler_service
 
+def setup_metrics(metrics, application, db, services, notification_service, scheduler_service):
+    """
+    Подключение метрик к базе, внешним источникам, отправке сообщений и планировщикам
+    
+    Args:
+        metrics (Metrics): Метрики
+        application: Экземпляр приложения бота
+        db (Database): Экземпляр базы данных
+        services (Services): Внешние источники данных
+        notification_service (NotificationService): Сервис уведомлений
+        scheduler_service (SchedulerService): Сервис планировщика
+    """
+    metrics.instrument(db, metrics.histogram("bot_db_seconds", "Длительность методов Database", "method"))
+    metrics.instrument(
+        services,
+        metrics.histogram("bot_service_fetch_seconds", "Длительность запросов к внешним источникам", "source"),
+        methods={
+            "_fetch_weather": "weather",
+            "_fetch_fiat_rate": "fiat",
+            "_fetch_crypto_rates": "crypto",
+            "_fetch_horoscope": "horoscope",
+        },
+    )
+    sends = metrics.histogram("bot_send_seconds", "Длительность отправки сообщений", "sender")
+    metrics.instrument(notification_service, sends, methods=("_send_message",))
+    metrics.instrument(scheduler_service, sends, methods=("send_medication_reminder",))
+    
+    # Задержка запуска заданий относительно расписания
+    schedulers = {
+        "notifications": notification_service.scheduler,
+        "medications": scheduler_service.scheduler,
+    }
+    lags = {}
+    missed = {}
+    
+    def listener(name):
+        def on_event(event):
+            if event.code == EVENT_JOB_MISSED:
+                missed[(name, event.job_id)] = missed.get((name, event.job_id), 0) + 1
+                return
+            scheduled = max(event.scheduled_run_times)
+            lags[(name, event.job_id)] = round((datetime.now(scheduled.tzinfo) - scheduled).total_seconds(), 3)
+        return on_event
+    
+    for name, scheduler in schedulers.items():
+        scheduler.add_listener(listener(name), EVENT_JOB_SUBMITTED | EVENT_JOB_MISSED)
+    
+    metrics.register(
+        "bot_scheduler_lag_seconds", "gauge", "Задержка последнего запуска задания", ("scheduler", "job"),
+        lambda: dict(lags)
+    )
+    metrics.register(
+        "bot_scheduler_missed_total", "counter", "Пропущенные запуски заданий", ("scheduler", "job"),
+        lambda: dict(missed)
+    )
+    metrics.register(
+        "bot_scheduler_jobs", "gauge", "Количество заданий планировщика", ("scheduler",),
+        lambda: {(name,): len(scheduler.get_jobs()) for name, scheduler in schedulers.items()}
+    )
+    metrics.register(
+        "bot_update_queue_depth", "gauge", "Обновления Telegram, ожидающие обработки", (),
+        lambda: {(): application.update_queue.qsize()}
+    )
+    metrics.register(
+        "bot_medications_in_memory", "gauge", "Лекарств в MedicationStore", (),
+        lambda: {(): len(scheduler_service.store)}
+    )
+    
+    def cache_requests():
+        values = {}
+        for source, counters in services.cache_stats().items():
+            for result, count in counters.items():
+                values[(source, result)] = count
+        lists = notification_service.medication_lists
+        values[("medication_list", "hits")] = lists.hits
+        values[("medication_list", "misses")] = lists.misses
+        return values
+    
+    def cache_hit_ratio():
+        ratios = {}
+        for (source, result), count in cache_requests().items():
+            hits, total = ratios.get((source,), (0, 0))
+            ratios[(source,)] = (hits + (count if result == "hits" else 0), total + count)
+        return {source: round(hits / total, 4) if total else None for source, (hits, total) in ratios.items()}
+    
+    metrics.register(
+        "bot_cache_requests_total", "counter", "Обращения к кэшам по результату", ("cache", "result"),
+        cache_requests
+    )
+    metrics.register("bot_cache_hit_ratio", "gauge", "Доля попаданий в кэш", ("cache",), cache_hit_ratio)
+    metrics.register(
+        "bot_cache_entries", "gauge", "Записей в кэше внешних источников", (), lambda: {(): len(services.cache)}
+    )
+    metrics.register(
+        "bot_cache_evicted_total", "counter", "Записей, удаленных из кэша внешних источников", (),
+        lambda: {(): services.cache.evicted}
+    )
+
+def setup_tracing(tracer, application, db, services, notification_service, scheduler_service):
+    """
+    Спаны вокруг методов базы и внешних источников, трейсы для заданий планировщиков
+    (обработчики оборачиваются в setup_handlers, вызовы Bot API - в TracedRequest)
+    
+    Args:
+        tracer (Tracer): Трассировка
+        application: Экземпляр приложения бота
+        db (Database): Экземпляр базы данных
+        services (Services): Внешние источники данных
+        notification_service (NotificationService): Сервис уведомлений
+        scheduler_service (SchedulerService): Сервис планировщика
+    """
+    application.tracer = tracer
+    tracer.instrument(db, "db")
+    tracer.instrument(services, "service", methods=("get_weather", "get_exchange_rates", "get_horoscope"))
+    tracer.trace_jobs(notification_service.scheduler, "notifications")
+    tracer.trace_jobs(scheduler_service.scheduler, "medications")
+
 async def main():
     """
     Основная функция запуска бота
@@ -130,26 +304,94 @@ async def main():
     # Инициализация базы данных
     db = Database("data/users.db")
     
-    # Инициализация приложения
-    application = Application.builder().token(TOKEN).build()
+    # Трассировка включается переменной окружения TRACE_SAMPLE_RATE
+    tracer = create_tracer_from_env()
+    
+    # Инициализация приложения: обновления разных пользователей обрабатываются параллельно,
+    # обновления одного пользователя - по очереди (см. OrderedApplication).
+    # Состояние диалогов и user_data переживают перезапуск (см. SqlitePersistence)
+    builder = (
+        Application.builder()
+        .token(TOKEN)
+        .application_class(OrderedApplication)
+        .concurrent_updates(CONCURRENT_UPDATES)
+        .persistence(SqlitePersistence(db))
+    )
+    # Адрес Bot API можно заменить, например на локальный сервер нагрузочных прогонов
+    # (benchmarks/fake_telegram.py)
+    base_url = os.getenv("TELEGRAM_BASE_URL")
+    if base_url:
+        builder = builder.base_url(base_url)
+    if tracer is not None:
+        # Размер пула как у запроса, который ApplicationBuilder создает по умолчанию
+        builder = builder.request(TracedRequest(tracer, connection_pool_size=256))
+    application = builder.build()
     
     # Настройка обработчиков и сервисов
-    setup_handlers(application, db, logger)
-    notification_service, scheduler_service = setup_services(application, db)
+    services = Services(client=create_client_from_env(), store=db)
+    notification_service, scheduler_service = setup_services(application, db, services)
+    
+    # Метрики включаются переменной окружения METRICS_PORT
+    metrics_config = create_metrics_from_env()
+    metrics = None
+    if metrics_config is not None:
+        metrics, metrics_host, metrics_port = metrics_config
+        setup_metrics(metrics, application, db, services, notification_service, scheduler_service)
+        await metrics.start_server(metrics_host, metrics_port)
+    if tracer is not None:
+        setup_tracing(tracer, application, db, services, notification_service, scheduler_service)
+    setup_handlers(application, db, logger, notification_service, metrics, tracer)
+    
+    # Сторож цикла событий: задержки и стеки блокирующих вызовов в логе
+    loop_monitor = LoopMonitor(threshold=float(os.getenv("LOOP_BLOCK_THRESHOLD", "0")) or None)
+    loop_monitor.start()
+    if metrics is not None:
+        metrics.register(
+            "bot_loop_lag_seconds", "gauge", "Задержка цикла событий за последние 10 минут", ("quantile",),
+            lambda: {(quantile,): round(value, 6) for quantile, value in loop_monitor.percentiles().items()}
+        )
+        metrics.register(
+            "bot_loop_blocked_total", "counter", "Блокировки цикла событий дольше порога", (),
+            lambda: {(): loop_monitor.blocked}
+        )
     
-    # Запуск бота
-    await application.initialize()
-    await application.start()
-    await application.updater.start_polling()
+    # Сигналы завершения только выставляют событие; останов идет ниже, в finally.
+    # Без этого SIGINT приходит в asyncio.run как отмена задачи, которую опрос
+    # обновлений PTB не пропускает, а SIGTERM завершает процесс без очистки
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            # Windows: остается KeyboardInterrupt
+            pass
     
     try:
-        # Бесконечный цикл для поддержания работы бота
-        while True:
-            await asyncio.sleep(1)
-    except (KeyboardInterrupt, SystemExit):
-        # Корректное завершение работы
-        await application.stop()
-        await application.updater.stop()
+        # Запуск бота
+        await application.initialize()
+        await application.start()
+        await application.updater.start_polling()
+        await stop_event.wait()
+        logger.info("Получен сигнал завершения, останавливаем бота")
+    finally:
+        # Корректное завершение работы: сначала прекращаем получать обновления,
+        # затем дожидаемся обработки уже полученных
+        if application.updater.running:
+            await application.updater.stop()
+        if application.running:
+            await application.stop()
+        await application.shutdown()
+        for service in (notification_service, scheduler_service):
+            if service.scheduler.running:
+                service.scheduler.shutdown(wait=False)
+        scheduler_service.store.save_snapshot()
+        await services.close()
+        if metrics is not None:
+            await metrics.stop_server()
+        await loop_monitor.stop()
+        if tracer is not None:
+            tracer.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
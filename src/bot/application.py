@@ -0,0 +1,141 @@
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from telegram import Update
+from telegram.ext import Application
+
+from ..core.logger import logger
+
+
+class OrderedApplication(Application):
+    """
+    Приложение бота с параллельной обработкой обновлений разных пользователей.
+
+    Обновления одного пользователя выполняются строго по очереди: ConversationHandler
+    в диалогах /add и /edit рассчитывает на последовательную обработку.
+
+    Очередь пользователя выполняет тот вызов, который застал ее пустой; остальные
+    добавляют в нее обновление и ждут, пока оно будет обработано. Так слот
+    concurrent_updates, task_done очереди обновлений и остановка приложения
+    по-прежнему относятся к завершенной обработке. Очередь пользователя ограничена
+    MAX_PENDING, поэтому пользователь, присылающий обновления пачками, не займет
+    ожиданием больше MAX_PENDING + 1 слотов.
+    """
+    # Сколько обновлений пользователя может ждать своей очереди; остальные отбрасываются
+    MAX_PENDING = 10
+
+    def __init__(self, **kwargs):
+        """
+        Инициализация приложения
+
+        Args:
+            **kwargs: Аргументы telegram.ext.Application (передаются ApplicationBuilder)
+        """
+        super().__init__(**kwargs)
+        self.logger = logger.getChild('OrderedApplication')
+        # Ожидающие обновления пользователей, чья очередь сейчас выполняется:
+        # [(обновление, время постановки, future завершения обработки)]
+        self._user_queues: Dict[int, Deque[tuple]] = {}
+        # Количество отброшенных обновлений (переполнение или отмена очереди)
+        self.dropped_updates = 0
+        # Трассировка обновлений (Tracer), если включена
+        self.tracer = None
+
+    @staticmethod
+    def _ordering_key(update: object) -> Optional[int]:
+        """
+        Определяет ключ упорядочивания обновления
+
+        Args:
+            update (object): Обновление
+
+        Returns:
+            int: ID пользователя (или чата), None если обновление не привязано к пользователю
+        """
+        if not isinstance(update, Update):
+            return None
+        if update.effective_user:
+            return update.effective_user.id
+        if update.effective_chat:
+            return update.effective_chat.id
+        return None
+
+    async def process_update(self, update: object) -> None:
+        """
+        Обрабатывает обновление после завершения предыдущих обновлений того же пользователя
+
+        Args:
+            update (object): Обновление
+        """
+        key = self._ordering_key(update)
+        if key is None:
+            await self._process(update)
+            return
+
+        pending = self._user_queues.get(key)
+        if pending is not None:
+            # Очередь пользователя уже выполняется: обновление будет обработано в ней,
+            # вызов ждет завершения обработки
+            if len(pending) >= self.MAX_PENDING:
+                self.dropped_updates += 1
+                self.logger.warning(
+                    f"Очередь пользователя {key} переполнена ({len(pending)}), обновление отброшено"
+                )
+                return
+            done = asyncio.get_running_loop().create_future()
+            pending.append((update, time.perf_counter(), done))
+            await done
+            return
+
+        pending = self._user_queues[key] = deque()
+        try:
+            await self._process_safely(update, key)
+            while pending:
+                update, queued_at, done = pending[0]
+                if done.cancelled():
+                    # Ожидавший вызов отменен, пока обновление стояло в очереди
+                    self.dropped_updates += 1
+                    self.logger.warning(f"Обновление пользователя {key} отменено до обработки")
+                else:
+                    await self._process_safely(update, key, time.perf_counter() - queued_at)
+                pending.popleft()
+                if not done.done():
+                    done.set_result(None)
+        finally:
+            del self._user_queues[key]
+            if pending:
+                # Выполнение очереди отменено: ожидающие обновления не будут обработаны
+                self.dropped_updates += len(pending)
+                self.logger.warning(
+                    f"Обработка очереди пользователя {key} отменена, отброшено обновлений: {len(pending)}"
+                )
+                for _, _, done in pending:
+                    done.cancel()
+
+    async def _process_safely(self, update: object, key: int, waited: float = 0.0) -> None:
+        """
+        Обработка обновления из очереди пользователя: ошибка одного обновления
+        не должна терять следующие за ним
+        """
+        try:
+            await self._process(update, key, waited)
+        except Exception as e:
+            self.logger.error(f"Ошибка обработки обновления пользователя {key}: {e}")
+
+    async def _process(self, update: object, key: int = None, waited: float = 0.0) -> None:
+        """
+        Обработка обновления, при включенной трассировке - в отдельном трейсе
+
+        Args:
+            update (object): Обновление
+            key (int, optional): Ключ упорядочивания. По умолчанию None.
+            waited (float, optional): Сколько секунд обновление ждало предыдущих. По умолчанию 0.
+        """
+        if self.tracer is None:
+            await super().process_update(update)
+            return
+        kind = "callback_query" if isinstance(update, Update) and update.callback_query else "message"
+        with self.tracer.span("update", "update", root=True, type=kind, user=key, waited_ms=round(waited * 1000, 3)):
+            await super().process_update(update)
@@ -1,13 +1,12 @@
 import re
 import logging
-from datetime import datetime, timedelta
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
 
 from ...core.database import Database
 from ...utils.validators import validate_date, validate_number, validate_unit, validate_zodiac_sign
-from ...utils.helpers import format_medication_info
+from ..services.medication_list import MedicationListRenderer
 
 # Состояния для ConversationHandler
 (
@@ -19,19 +18,50 @@ from ...utils.helpers import format_medication_info
 ) = range(12)
 
 
+# Поля редактирования, которые называются в таблице иначе
+EDIT_COLUMNS = {
+    "dose": "dose_per_intake",
+    "intakes": "intakes_per_day",
+}
+
+# Префиксы callback_data в клавиатурах выбора лекарства: "e42" - лекарство 42,
+# "ep1" - вторая страница списка. Короткие данные не зависят от названия лекарства.
+EDIT_PREFIX = "e"
+DELETE_PREFIX = "d"
+PAGE_MARK = "p"
+
+
 class MedicationHandlers:
     """
     Обработчики команд для управления лекарствами
     """
-    def __init__(self, db: Database, logger):
+    # Количество лекарств на одной странице клавиатуры выбора
+    PAGE_SIZE = 8
+    # Максимальное количество лекарств в одной команде /add_many
+    MAX_BULK_LINES = 20
+    BULK_USAGE = (
+        "Отправьте команду и лекарства, по одному на строке:\n"
+        "/add_many\n"
+        "Витамин D; 1; 1; 2025-01-01; 3; months; 1; months; 2\n"
+        "Омега-3; 2; 2; 2025-01-15; 30; days; 0; days\n\n"
+        "Поля через ';': название; доза; приемов в день; дата начала; "
+        "длительность; единицы (days/months); перерыв; единицы; курсы (по умолчанию 1)"
+    )
+    # Ответ на кнопку клавиатуры, которую больше никто не обрабатывает
+    # (старый формат callback_data "edit_42"/"delete_42" или завершенный диалог)
+    STALE_KEYBOARD = "Список устарел, откройте /list заново"
+
+    def __init__(self, db: Database, logger, medication_lists: MedicationListRenderer = None):
         """
         Инициализация обработчиков
         
         Args:
             db (Database): Экземпляр базы данных
             logger: Логгер
+            medication_lists (MedicationListRenderer, optional): Кэш текстов /list. По умолчанию создается новый.
         """
         self.db = db
+        self.medication_lists = medication_lists or MedicationListRenderer(db)
         self.logger = logger.getChild('MedicationHandlers')
     
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -321,6 +351,100 @@ class MedicationHandlers:
 
         return ConversationHandler.END
     
+    # Добавление нескольких лекарств одним сообщением
+    async def bulk_add_medications(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """
+        Обработчик команды /add_many: каждая строка после команды - одно лекарство
+        
+        Args:
+            update (Update): Объект обновления
+            context (ContextTypes.DEFAULT_TYPE): Контекст
+        """
+        # Первое слово - сама команда, остальное - строки с лекарствами
+        parts = update.message.text.split(maxsplit=1)
+        body = parts[1] if len(parts) > 1 else ""
+        lines = [(number, line.strip()) for number, line in enumerate(body.splitlines(), 1) if line.strip()]
+        
+        if not lines:
+            await update.message.reply_text(self.BULK_USAGE)
+            return
+        if len(lines) > self.MAX_BULK_LINES:
+            await update.message.reply_text(f"❌ Можно добавить не больше {self.MAX_BULK_LINES} лекарств за раз.")
+            return
+        
+        medications = []
+        errors = []
+        for number, line in lines:
+            medication, error = self._parse_bulk_line(line)
+            if error:
+                errors.append(f"Строка {number}: {error}")
+            else:
+                medications.append(medication)
+        
+        if errors:
+            await update.message.reply_text(
+                "❌ Лекарства не добавлены, исправьте ошибки и отправьте снова:\n" + "\n".join(errors)
+            )
+            return
+        
+        try:
+            saved = self.db.add_medications(update.effective_user.id, medications)
+            await update.message.reply_text(
+                f"✅ Добавлено лекарств: {len(saved)}\n" + "\n".join(f"• {med.name} (ID: {med.id})" for med in saved)
+            )
+        except Exception as e:
+            self.logger.error(f"Ошибка при сохранении: {e}")
+            await update.message.reply_text("❌ Произошла ошибка при сохранении. Попробуйте снова.")
+    
+    @staticmethod
+    def _parse_bulk_line(line: str):
+        """
+        Разбор и проверка строки /add_many с теми же правилами, что и в пошаговом /add
+        
+        Args:
+            line (str): Строка "название; доза; приемов; дата; длительность; единицы; перерыв; единицы[; курсы]"
+        
+        Returns:
+            tuple: (поля лекарства, None) или (None, текст ошибки)
+        """
+        fields = [field.strip() for field in line.split(";")]
+        if len(fields) not in (8, 9):
+            return None, f"ожидается 8 или 9 полей через ';', получено {len(fields)}"
+        if len(fields) == 8:
+            fields.append("1")
+        name, dose, intakes, start_date, duration_value, duration_unit, break_value, break_unit, cycles = fields
+        
+        if not name or len(name) > 50:
+            return None, "название должно быть от 1 до 50 символов"
+        if not validate_number(dose):
+            return None, "доза должна быть целым числом больше 0"
+        if not validate_number(intakes, 1, 24):
+            return None, "приемов в день должно быть от 1 до 24"
+        if not validate_date(start_date):
+            return None, "дата начала должна быть в формате ГГГГ-ММ-ДД"
+        if not validate_number(duration_value):
+            return None, "длительность должна быть целым числом больше 0"
+        if not validate_unit(duration_unit):
+            return None, "единицы длительности: days или months"
+        if not validate_number(break_value, 0):
+            return None, "перерыв должен быть целым числом 0 или больше"
+        if not validate_unit(break_unit):
+            return None, "единицы перерыва: days или months"
+        if not validate_number(cycles):
+            return None, "количество курсов должно быть целым числом больше 0"
+        
+        return {
+            "name": name,
+            "dose_per_intake": int(dose),
+            "intakes_per_day": int(intakes),
+            "start_date": start_date,
+            "duration_value": int(duration_value),
+            "duration_unit": duration_unit.lower(),
+            "break_value": int(break_value),
+            "break_unit": break_unit.lower(),
+            "cycles": int(cycles),
+        }, None
+    
     # Методы для редактирования лекарств
     async def edit_medication(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
@@ -333,32 +457,75 @@ class MedicationHandlers:
         Returns:
             int: Следующее состояние разговора
         """
-        self.logger.info(f"Начало команды /edit от пользователя {update.effective_user.id}")
+        self.logger.debug("Начало команды /edit от пользователя %s", update.effective_user.id)
 
         # Очищаем предыдущие данные
         context.user_data.pop("edit_id", None)
         context.user_data.pop("edit_field", None)
 
-        meds = self.db.get_medications(update.effective_user.id)
-        self.logger.info(f"Найдено лекарств: {len(meds)}")
+        reply_markup = self._medications_keyboard(update.effective_user.id, EDIT_PREFIX, 0)
 
-        if not meds:
+        if reply_markup is None:
             self.logger.warning("Нет лекарств для редактирования")
             await update.message.reply_text("ℹ️ Нет лекарств для редактирования.")
             return ConversationHandler.END
 
-        keyboard = [
-            [InlineKeyboardButton(f"{med[2]} (ID: {med[0]})", callback_data=f"edit_{med[0]}")]
-            for med in meds
-        ]
-
-        self.logger.info("Отправка списка лекарств для выбора")
+        self.logger.debug("Отправка списка лекарств для выбора")
         await update.message.reply_text(
             "Выберите лекарство для редактирования:",
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            reply_markup=reply_markup
         )
         return EDIT_CHOICE
     
+    def _medications_keyboard(self, user_id: int, prefix: str, page: int):
+        """
+        Клавиатура выбора лекарства: одна страница из базы и кнопки перехода между страницами
+        
+        Args:
+            user_id (int): ID пользователя
+            prefix (str): Префикс callback_data (EDIT_PREFIX или DELETE_PREFIX)
+            page (int): Номер страницы с нуля
+        
+        Returns:
+            InlineKeyboardMarkup: Клавиатура или None, если лекарств нет
+        """
+        page = max(page, 0)
+        meds, has_next = self.db.get_medications_page(user_id, page, self.PAGE_SIZE)
+        if not meds and page:
+            # Страница опустела после удаления - показываем первую
+            page = 0
+            meds, has_next = self.db.get_medications_page(user_id, page, self.PAGE_SIZE)
+        if not meds:
+            return None
+
+        keyboard = [
+            [InlineKeyboardButton(f"{name} (ID: {med_id})", callback_data=f"{prefix}{med_id}")]
+            for med_id, name in meds
+        ]
+        navigation = []
+        if page:
+            navigation.append(InlineKeyboardButton("◀️", callback_data=f"{prefix}{PAGE_MARK}{page - 1}"))
+        if has_next:
+            navigation.append(InlineKeyboardButton("▶️", callback_data=f"{prefix}{PAGE_MARK}{page + 1}"))
+        if navigation:
+            keyboard.append(navigation)
+        return InlineKeyboardMarkup(keyboard)
+    
+    async def _show_page(self, query, prefix: str):
+        """
+        Переход на другую страницу клавиатуры выбора лекарства
+        
+        Args:
+            query (CallbackQuery): Запрос с callback_data вида "ep1"
+            prefix (str): Префикс callback_data
+        """
+        page = int(query.data[len(prefix) + len(PAGE_MARK):])
+        reply_markup = self._medications_keyboard(query.from_user.id, prefix, page)
+        if reply_markup is None:
+            await query.edit_message_text("ℹ️ Список лекарств пуст.")
+        else:
+            await query.edit_message_reply_markup(reply_markup=reply_markup)
+    
     async def edit_choice(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
         Обработка выбора лекарства для редактирования
@@ -373,11 +540,15 @@ class MedicationHandlers:
         query = update.callback_query
         await query.answer()
 
-        self.logger.info(f"Получен callback: {query.data}")
+        self.logger.debug("Получен callback: %s", query.data)
 
-        if query.data.startswith("edit_"):
-            med_id = int(query.data.split("_")[1])
-            self.logger.info(f"Выбрано лекарство ID: {med_id}")
+        if query.data.startswith(EDIT_PREFIX + PAGE_MARK):
+            await self._show_page(query, EDIT_PREFIX)
+            return EDIT_CHOICE
+
+        if query.data.startswith(EDIT_PREFIX):
+            med_id = int(query.data[len(EDIT_PREFIX):])
+            self.logger.debug("Выбрано лекарство ID: %s", med_id)
 
             # Проверяем существование лекарства
             med = self.db.get_medication_by_id(med_id)
@@ -388,7 +559,6 @@ class MedicationHandlers:
 
             context.user_data["edit_id"] = med_id
 
-            self.logger.info("Создаем клавиатуру для выбора поля")
             keyboard = [
                 [InlineKeyboardButton("Название", callback_data="name")],
                 [InlineKeyboardButton("Дозу", callback_data="dose")],
@@ -402,12 +572,10 @@ class MedicationHandlers:
             ]
 
             try:
-                self.logger.info("Пытаемся отредактировать сообщение")
                 await query.edit_message_text(
                     "Что именно хотите изменить?",
                     reply_markup=InlineKeyboardMarkup(keyboard)
                 )
-                self.logger.info("Сообщение успешно отредактировано")
                 return EDIT_FIELD
             except Exception as e:
                 self.logger.error(f"Ошибка при редактировании сообщения: {str(e)}")
@@ -428,7 +596,7 @@ class MedicationHandlers:
         await query.answer()
 
         field = query.data
-        self.logger.info(f"Выбрано поле для редактирования: {field}")
+        self.logger.debug("Выбрано поле для редактирования: %s", field)
 
         # Сохраняем выбранное поле в контексте
         context.user_data["edit_field"] = field
@@ -462,85 +630,71 @@ class MedicationHandlers:
         Returns:
             int: Следующее состояние разговора
         """
-        self.logger.info(f"Начало сохранения. Контекст: {context.user_data}")
-        self.logger.info("Начало обработки выбранного поля")
-
         user_id = update.effective_user.id
-        self.logger.info(f"Начало сохранения редактирования для user_id={user_id}")
+        # Контекст форматируется только при включенном DEBUG
+        self.logger.debug("Сохранение редактирования для user_id=%s, контекст: %s", user_id, context.user_data)
 
         if "edit_id" not in context.user_data or "edit_field" not in context.user_data:
             self.logger.error("Нет данных для редактирования в context.user_data")
             await update.message.reply_text("❌ Сессия редактирования устарела. Начните заново.")
             return ConversationHandler.END
 
-        self.logger.info(f"Данные контекста: {context.user_data}")
-
         med_id = context.user_data["edit_id"]
         field = context.user_data["edit_field"]
         new_value = update.message.text.strip()
 
-        self.logger.info(f"Попытка изменить medication_id={med_id}, поле={field}, значение='{new_value}'")
+        self.logger.debug("Попытка изменить medication_id=%s, поле=%s, значение=%r", med_id, field, new_value)
+
+        # Валидация до обращения к базе: при ошибке сессия редактирования сохраняется
+        if field == "name":
+            if len(new_value) > 50:
+                error_msg = "Название слишком длинное (макс. 50 символов)"
+                self.logger.warning(error_msg)
+                await update.message.reply_text(f"❌ {error_msg}")
+                return EDIT_FIELD
+
+        elif field in ["dose", "intakes", "duration_value", "break_value", "cycles"]:
+            if not new_value.isdigit():
+                error_msg = "Должно быть целое число"
+                self.logger.warning(error_msg)
+                await update.message.reply_text(f"❌ {error_msg}")
+                return EDIT_FIELD
+            if int(new_value) <= 0:
+                error_msg = "Число должно быть больше 0"
+                self.logger.warning(error_msg)
+                await update.message.reply_text(f"❌ {error_msg}")
+                return EDIT_FIELD
+
+        elif field in ["duration_unit", "break_unit"]:
+            if new_value.lower() not in ["days", "months"]:
+                error_msg = "Допустимые значения: 'days' или 'months'"
+                self.logger.warning(error_msg)
+                await update.message.reply_text(f"❌ {error_msg}")
+                return EDIT_FIELD
+            new_value = new_value.lower()
+
+        elif field == "start_date":
+            if not validate_date(new_value):
+                error_msg = "Неверный формат даты (требуется ГГГГ-ММ-ДД)"
+                self.logger.warning(error_msg)
+                await update.message.reply_text(f"❌ {error_msg}")
+                return EDIT_FIELD
+
+        # Преобразуем тип
+        update_value = int(new_value) if field in ["dose", "intakes", "duration_value", "break_value",
+                                                 "cycles"] else new_value
 
         try:
-            # Проверяем существование записи
-            med = self.db.get_medication_by_id(med_id)
-            if not med:
+            # Один запрос: UPDATE ... RETURNING проверяет существование и возвращает новые данные
+            updated_med = self.db.update_medication(
+                med_id, user_id=user_id, **{EDIT_COLUMNS.get(field, field): update_value}
+            )
+            if updated_med is None:
                 self.logger.error(f"Лекарство {med_id} не найдено")
                 await update.message.reply_text("❌ Лекарство не найдено в базе данных")
-                return ConversationHandler.END
-
-            self.logger.debug(f"Текущие данные лекарства: {med}")
-
-            # Валидация
-            if field == "name":
-                if len(new_value) > 50:
-                    error_msg = "Название слишком длинное (макс. 50 символов)"
-                    self.logger.warning(error_msg)
-                    await update.message.reply_text(f"❌ {error_msg}")
-                    return EDIT_FIELD
-
-            elif field in ["dose", "intakes", "duration_value", "break_value", "cycles"]:
-                if not new_value.isdigit():
-                    error_msg = "Должно быть целое число"
-                    self.logger.warning(error_msg)
-                    await update.message.reply_text(f"❌ {error_msg}")
-                    return EDIT_FIELD
-                if int(new_value) <= 0:
-                    error_msg = "Число должно быть больше 0"
-                    self.logger.warning(error_msg)
-                    await update.message.reply_text(f"❌ {error_msg}")
-                    return EDIT_FIELD
-
-            elif field in ["duration_unit", "break_unit"]:
-                if new_value.lower() not in ["days", "months"]:
-                    error_msg = "Допустимые значения: 'days' или 'months'"
-                    self.logger.warning(error_msg)
-                    await update.message.reply_text(f"❌ {error_msg}")
-                    return EDIT_FIELD
-
-            elif field == "start_date":
-                if not validate_date(new_value):
-                    error_msg = "Неверный формат даты (требуется ГГГГ-ММ-ДД)"
-                    self.logger.warning(error_msg)
-                    await update.message.reply_text(f"❌ {error_msg}")
-                    return EDIT_FIELD
-
-            # Преобразуем тип
-            update_value = int(new_value) if field in ["dose", "intakes", "duration_value", "break_value",
-                                                     "cycles"] else new_value
-            self.logger.info(f"Подготовлено значение для обновления: {update_value} ({type(update_value)})")
-
-            # Обновляем в БД
-            self.logger.info(f"Попытка обновления БД...")
-            self.db.update_medication(med_id, **{field: update_value})
-
-            # Проверяем обновление
-            updated_med = self.db.get_medication_by_id(med_id)
-            if not updated_med:
-                self.logger.error("Не удалось получить обновленные данные")
-                await update.message.reply_text("❌ Не удалось подтвердить изменение")
             else:
-                self.logger.info(f"Успешно обновлено. Новые данные: {updated_med}")
+                self.logger.info("Лекарство %s пользователя %s: обновлено поле %s", med_id, user_id, field)
+                self.logger.debug("Новые данные: %s", updated_med)
                 await update.message.reply_text(f"✅ Поле '{field}' успешно обновлено!")
 
         except Exception as e:
@@ -551,7 +705,6 @@ class MedicationHandlers:
             # Очищаем сессию
             context.user_data.pop("edit_id", None)
             context.user_data.pop("edit_field", None)
-            self.logger.info("Сессия редактирования очищена")
 
         return ConversationHandler.END
     
@@ -564,20 +717,28 @@ class MedicationHandlers:
             update (Update): Объект обновления
             context (ContextTypes.DEFAULT_TYPE): Контекст
         """
-        meds = self.db.get_medications(update.message.from_user.id)
-        if not meds:
+        reply_markup = self._medications_keyboard(update.message.from_user.id, DELETE_PREFIX, 0)
+        if reply_markup is None:
             await update.message.reply_text("ℹ️ Нет лекарств для удаления.")
             return
 
-        keyboard = [
-            [InlineKeyboardButton(f"{med[2]} (ID: {med[0]})", callback_data=f"delete_{med[0]}")]
-            for med in meds
-        ]
         await update.message.reply_text(
             "Выберите лекарство для удаления:",
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            reply_markup=reply_markup
         )
     
+    async def delete_page(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """
+        Переход на другую страницу списка лекарств для удаления
+        
+        Args:
+            update (Update): Объект обновления
+            context (ContextTypes.DEFAULT_TYPE): Контекст
+        """
+        query = update.callback_query
+        await query.answer()
+        await self._show_page(query, DELETE_PREFIX)
+    
     async def delete_confirm(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
         Подтверждение удаления лекарства
@@ -588,9 +749,23 @@ class MedicationHandlers:
         """
         query = update.callback_query
         await query.answer()
-        med_id = int(query.data.split("_")[1])
-        self.db.delete_medication(med_id)
-        await query.edit_message_text("✅ Лекарство удалено!")
+        med_id = int(query.data[len(DELETE_PREFIX):])
+        med = self.db.delete_medication(med_id, user_id=query.from_user.id)
+        if med is None:
+            await query.edit_message_text("ℹ️ Лекарство не найдено или уже удалено.")
+            return
+        await query.edit_message_text(f"✅ Лекарство «{med.name}» удалено!")
+    
+    async def stale_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """
+        Ответ на нажатие кнопки, для которой не нашлось обработчика
+        
+        Args:
+            update (Update): Объект обновления
+            context (ContextTypes.DEFAULT_TYPE): Контекст
+        """
+        # Без ответа у пользователя останется индикатор загрузки на кнопке
+        await update.callback_query.answer(self.STALE_KEYBOARD, show_alert=True)
     
     # Метод для просмотра списка лекарств
     async def list_medications(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -602,22 +777,13 @@ class MedicationHandlers:
             context (ContextTypes.DEFAULT_TYPE): Контекст
         """
         try:
-            meds = self.db.get_medications(update.message.from_user.id)
-            if not meds:
-                await update.message.reply_text("ℹ️ У вас пока нет добавленных лекарств.")
+            messages = self.medication_lists.render(update.message.from_user.id)
+            if not messages:
+                await update.message.reply_text(MedicationListRenderer.EMPTY)
                 return
 
-            text = "💊 Ваши лекарства:\n\n"
-            current_date = datetime.now().date()
-
-            for med in meds:
-                try:
-                    text += format_medication_info(med) + "\n\n"
-                except Exception as e:
-                    self.logger.error(f"Ошибка обработки лекарства ID {med[0]}: {e}")
-                    text += f"⚠️ Лекарство ID {med[0]} - ошибка данных\n\n"
-
-            await update.message.reply_text(text, parse_mode="HTML")
+            for text in messages:
+                await update.message.reply_text(text, parse_mode="HTML")
 
         except Exception as e:
             self.logger.error(f"Ошибка при получении списка: {e}")
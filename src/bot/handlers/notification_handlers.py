@@ -3,13 +3,35 @@ from telegram import Update
 from telegram.ext import ContextTypes
 
 from ...core.database import Database
-from ...utils.validators import validate_zodiac_sign
+from ...utils.helpers import minutes_to_time, time_to_minutes
+from ...utils.validators import validate_zodiac_sign, validate_city, validate_time, normalize_city
 
 
 class NotificationHandlers:
     """
     Обработчики команд для управления уведомлениями
     """
+    # Максимальное количество городов в погоде ежедневной сводки
+    MAX_CITIES = 3
+    # Аргументы /notifications: вид уведомлений -> поля настроек
+    NOTIFICATION_KINDS = {
+        "digest": ("digest",),
+        "сводка": ("digest",),
+        "reminders": ("reminders",),
+        "напоминания": ("reminders",),
+    }
+    NOTIFICATION_STATES = {"on": True, "вкл": True, "off": False, "выкл": False}
+    DIGEST_NOT_SCHEDULED = (
+        "Ежедневная сводка приходит, когда у вас есть лекарства или задано время сводки. "
+        "Добавьте лекарство (/add) или укажите время (/set_time 08:00)."
+    )
+    NOTIFICATIONS_USAGE = (
+        "Использование:\n"
+        "/notifications on|off - все уведомления\n"
+        "/notifications digest on|off - ежедневная сводка\n"
+        "/notifications reminders on|off - напоминания о лекарствах"
+    )
+
     def __init__(self, db: Database, logger):
         """
         Инициализация обработчиков
@@ -54,19 +76,92 @@ class NotificationHandlers:
             self.logger.error(f"Error saving zodiac: {e}")
             await update.message.reply_text("Произошла ошибка при сохранении.")
     
+    async def set_cities(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """
+        Обработчик команды /set_cities для выбора городов в погоде ежедневной сводки
+        
+        Args:
+            update (Update): Объект обновления
+            context (ContextTypes.DEFAULT_TYPE): Контекст
+        """
+        if not context.args:
+            cities = self.db.get_user_cities(update.effective_user.id)
+            current = "; ".join(cities) if cities else "по умолчанию (Moscow; Brest,BY)"
+            await update.message.reply_text(
+                f"🏙 Ваши города: {current}\n\n"
+                "Укажите до трех городов через точку с запятой:\n"
+                "/set_cities Moscow; Brest,BY"
+            )
+            return
+
+        cities = [normalize_city(city) for city in ' '.join(context.args).split(';') if city.strip()]
+        
+        if len(cities) > self.MAX_CITIES:
+            await update.message.reply_text(f"Можно указать не больше {self.MAX_CITIES} городов.")
+            return
+        invalid = [city for city in cities if not validate_city(city)]
+        if invalid:
+            await update.message.reply_text(f"Неверное название города: {', '.join(invalid)}")
+            return
+
+        try:
+            self.db.set_user_cities(update.effective_user.id, cities)
+            await update.message.reply_text(f"🏙 Города для погоды сохранены: {'; '.join(cities)}")
+        except Exception as e:
+            self.logger.error(f"Error saving cities: {e}")
+            await update.message.reply_text("Произошла ошибка при сохранении.")
+    
     async def toggle_notifications(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
         Обработчик команды /notifications для включения/выключения уведомлений
         
+        Примеры: /notifications off, /notifications digest on, /notifications reminders off
+        
         Args:
             update (Update): Объект обновления
             context (ContextTypes.DEFAULT_TYPE): Контекст
         """
-        # Здесь будет логика включения/выключения уведомлений
-        # Пока заглушка
-        await update.message.reply_text(
-            "🔔 Уведомления включены!\n"
-            "Вы будете получать напоминания о приеме лекарств и ежедневную сводку."
+        user_id = update.effective_user.id
+        args = [arg.lower() for arg in context.args or []]
+        
+        if not args:
+            await update.message.reply_text(self._notifications_status(user_id) + "\n\n" + self.NOTIFICATIONS_USAGE)
+            return
+        
+        state = self.NOTIFICATION_STATES.get(args[-1])
+        kinds = self.NOTIFICATION_KINDS.get(args[0]) if len(args) == 2 else self.db.NOTIFICATION_KINDS
+        if state is None or kinds is None or len(args) > 2:
+            await update.message.reply_text(self.NOTIFICATIONS_USAGE)
+            return
+        
+        try:
+            for kind in kinds:
+                self.db.set_notifications_enabled(user_id, kind, state)
+            text = self._notifications_status(user_id)
+            # Включение не делает пользователя получателем: сводка приходит только
+            # пользователям с лекарствами или заданным временем (get_digest_recipients)
+            if state and "digest" in kinds and self.db.get_digest_recipient(user_id) is None:
+                text += "\n\n" + self.DIGEST_NOT_SCHEDULED
+            await update.message.reply_text(text)
+        except Exception as e:
+            self.logger.error(f"Error saving notification settings: {e}")
+            await update.message.reply_text("Произошла ошибка при сохранении.")
+    
+    def _notifications_status(self, user_id: int) -> str:
+        """
+        Текст с текущими настройками уведомлений пользователя
+        
+        Args:
+            user_id (int): ID пользователя
+        
+        Returns:
+            str: Текст сообщения
+        """
+        def mark(kind):
+            return "включены ✅" if self.db.is_notification_enabled(user_id, kind) else "выключены 🔕"
+        return (
+            f"🔔 Напоминания о лекарствах: {mark('reminders')}\n"
+            f"🌅 Ежедневная сводка: {mark('digest')}"
         )
     
     async def set_notification_time(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -77,8 +172,29 @@ class NotificationHandlers:
             update (Update): Объект обновления
             context (ContextTypes.DEFAULT_TYPE): Контекст
         """
-        # Здесь будет логика установки времени уведомлений
-        # Пока заглушка
-        await update.message.reply_text(
-            "⏰ Время ежедневных уведомлений установлено на 9:00."
-        )
+        user_id = update.effective_user.id
+        
+        if not context.args:
+            current = self.db.get_user_digest_time(user_id) or "08:00"
+            await update.message.reply_text(
+                f"⏰ Ежедневная сводка приходит в {current}.\n"
+                "Укажите новое время после команды:\n"
+                "/set_time 07:30"
+            )
+            return
+        
+        digest_time = context.args[0]
+        if not validate_time(digest_time):
+            await update.message.reply_text("Неверный формат времени! Укажите время в формате ЧЧ:ММ, например 07:30.")
+            return
+        digest_time = minutes_to_time(time_to_minutes(digest_time))
+        
+        try:
+            # Расписание сводки обновляет NotificationService через Database.settings_listeners
+            self.db.set_user_digest_time(user_id, digest_time)
+            await update.message.reply_text(
+                f"⏰ Время ежедневных уведомлений установлено на {digest_time}."
+            )
+        except Exception as e:
+            self.logger.error(f"Error saving digest time: {e}")
+            await update.message.reply_text("Произошла ошибка при сохранении.")
@@ -4,6 +4,12 @@ class Medication:
     """
     Модель лекарства
     """
+    # Поля в порядке столбцов таблицы medications
+    __slots__ = (
+        'id', 'user_id', 'name', 'dose_per_intake', 'intakes_per_day', 'start_date',
+        'duration_value', 'duration_unit', 'break_value', 'break_unit', 'cycles'
+    )
+
     def __init__(
         self,
         id: int = None,
@@ -46,6 +52,24 @@ class Medication:
         self.break_unit = break_unit
         self.cycles = cycles
     
+    def __repr__(self):
+        return f"Medication({', '.join(f'{field}={getattr(self, field)!r}' for field in self.__slots__)})"
+
+    @classmethod
+    def row_factory(cls, cursor, row: tuple):
+        """
+        Фабрика строк sqlite: объект создается прямо из строки курсора.
+        Запрос должен выбирать столбцы в порядке __slots__.
+
+        Args:
+            cursor (sqlite3.Cursor): Курсор
+            row (tuple): Строка результата
+
+        Returns:
+            Medication: Объект лекарства
+        """
+        return cls(*row)
+
     def to_dict(self):
         """
         Преобразование в словарь для сохранения
@@ -2,16 +2,56 @@ class User:
     """
     Модель пользователя бота
     """
-    def __init__(self, user_id: int, zodiac_sign: str = None):
+    # Поля в порядке столбцов запросов настроек (см. Database.USER_COLUMNS)
+    __slots__ = ('user_id', 'zodiac_sign', 'cities', 'digest_time')
+    # Разделитель городов в столбце user_settings.cities (запятая занята кодом страны: "Brest,BY")
+    CITIES_SEPARATOR = ";"
+
+    def __init__(self, user_id: int, zodiac_sign: str = None, cities: list = None, digest_time: str = None):
         """
         Инициализация пользователя
         
         Args:
             user_id (int): ID пользователя в Telegram
             zodiac_sign (str, optional): Знак зодиака пользователя. По умолчанию None.
+            cities (list, optional): Города для погоды в ежедневной сводке. По умолчанию None.
+            digest_time (str, optional): Время ежедневной сводки ЧЧ:ММ. По умолчанию None.
         """
         self.user_id = user_id
         self.zodiac_sign = zodiac_sign
+        self.cities = cities
+        self.digest_time = digest_time
+    
+    def __repr__(self):
+        return f"User({', '.join(f'{field}={getattr(self, field)!r}' for field in self.__slots__)})"
+    
+    @classmethod
+    def split_cities(cls, cities: str):
+        """
+        Разбор столбца с городами
+        
+        Args:
+            cities (str): Города через CITIES_SEPARATOR или None
+        
+        Returns:
+            list: Список городов или None
+        """
+        return cities.split(cls.CITIES_SEPARATOR) if cities else None
+    
+    @classmethod
+    def row_factory(cls, cursor, row: tuple):
+        """
+        Фабрика строк sqlite: (user_id, zodiac_sign, cities, digest_time) -> User
+        
+        Args:
+            cursor (sqlite3.Cursor): Курсор
+            row (tuple): Строка результата
+        
+        Returns:
+            User: Объект пользователя
+        """
+        user_id, zodiac_sign, cities, digest_time = row
+        return cls(user_id, zodiac_sign, cls.split_cities(cities), digest_time)
     
     def to_dict(self):
         """
@@ -22,7 +62,9 @@ class User:
         """
         return {
             'user_id': self.user_id,
-            'zodiac_sign': self.zodiac_sign
+            'zodiac_sign': self.zodiac_sign,
+            'cities': self.cities,
+            'digest_time': self.digest_time
         }
     
     @classmethod
@@ -38,5 +80,7 @@ class User:
         """
         return cls(
             user_id=data.get('user_id'),
-            zodiac_sign=data.get('zodiac_sign')
+            zodiac_sign=data.get('zodiac_sign'),
+            cities=data.get('cities'),
+            digest_time=data.get('digest_time')
         )
@@ -0,0 +1,127 @@
+import asyncio
+import json
+from typing import Dict, Optional, Tuple
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from ..core.database import Database
+from ..core.logger import logger
+
+
+class SqlitePersistence(BasePersistence):
+    """
+    Хранение состояния диалогов ConversationHandler и context.user_data в базе бота.
+
+    Application раз в UPDATE_INTERVAL секунд передает изменения, накопленные
+    с прошлого раза. Они складываются в память и записываются одной транзакцией,
+    поэтому обработка сообщений не ждет записи на диск.
+    """
+    # Как часто Application передает изменения, в секундах
+    UPDATE_INTERVAL = 10
+    # Задержка записи после получения изменений, в секундах
+    FLUSH_DELAY = 1
+
+    def __init__(self, db: Database):
+        """
+        Инициализация хранилища
+
+        Args:
+            db (Database): Экземпляр базы данных
+        """
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=self.UPDATE_INTERVAL,
+        )
+        self.db = db
+        self.logger = logger.getChild('SqlitePersistence')
+        # Изменения, ожидающие записи
+        self._conversations: Dict[Tuple[str, str], Optional[str]] = {}
+        self._user_data: Dict[int, Optional[str]] = {}
+        self._flush_handle = None
+
+    def _mark_dirty(self):
+        """
+        Планирует запись накопленных изменений
+        """
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.FLUSH_DELAY, self._write)
+
+    def _write(self):
+        """
+        Запись накопленных изменений одной транзакцией
+        """
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._conversations and not self._user_data:
+            return
+        conversations, self._conversations = self._conversations, {}
+        user_data, self._user_data = self._user_data, {}
+        try:
+            self.db.save_persistence(
+                [(name, key, state) for (name, key), state in conversations.items() if state is not None],
+                [(name, key) for (name, key), state in conversations.items() if state is None],
+                [(user_id, data) for user_id, data in user_data.items() if data is not None],
+                [user_id for user_id, data in user_data.items() if data is None],
+            )
+        except Exception as e:
+            self.logger.error(f"Ошибка сохранения состояния диалогов: {e}")
+
+    async def get_conversations(self, name: str) -> dict:
+        return {
+            tuple(json.loads(key)): json.loads(state)
+            for key, state in self.db.get_conversations(name)
+        }
+
+    async def update_conversation(self, name: str, key: tuple, new_state: Optional[object]) -> None:
+        self._conversations[(name, json.dumps(list(key)))] = None if new_state is None else json.dumps(new_state)
+        self._mark_dirty()
+
+    async def get_user_data(self) -> dict:
+        return {user_id: json.loads(data) for user_id, data in self.db.get_all_user_data()}
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        try:
+            self._user_data[user_id] = json.dumps(data, ensure_ascii=False)
+        except (TypeError, ValueError) as e:
+            self.logger.error(f"user_data пользователя {user_id} не сохранены: {e}")
+            return
+        self._mark_dirty()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._user_data[user_id] = None
+        self._mark_dirty()
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    async def flush(self) -> None:
+        self._write()
+
+    # chat_data, bot_data и callback_data бот не использует
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_callback_data(self, data) -> None:
+        pass
@@ -0,0 +1,155 @@
+import time
+from typing import Dict, List
+
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, ContextTypes
+
+from ..core.logger import logger
+
+
+class RateLimiter:
+    """
+    Ограничение частоты запросов пользователя (token bucket).
+
+    Регистрируется как TypeHandler в группе -1 и проверяет каждое обновление до
+    основных обработчиков: у пользователя есть запас токенов, который
+    восполняется со временем, команда списывает свою стоимость. При нехватке
+    токенов обновление отбрасывается (ApplicationHandlerStop), а пользователь
+    получает не больше одного предупреждения за NOTICE_INTERVAL.
+    """
+    # Запас токенов пользователя (сколько запросов подряд можно отправить)
+    CAPACITY = 10
+    # Скорость восполнения, токенов в секунду
+    REFILL_RATE = 0.5
+    # Стоимость команд, которые обращаются к базе и форматируют данные
+    COMMAND_COSTS = {
+        "list": 2,
+        "edit": 2,
+        "delete": 2,
+        "add_many": 5,
+    }
+    DEFAULT_COST = 1
+    # Через сколько секунд без запросов счетчик пользователя удаляется
+    IDLE_TTL = 10 * 60
+    # Как часто просматриваются счетчики для удаления, в секундах
+    EVICT_INTERVAL = 60
+    # Не чаще одного предупреждения за этот интервал, в секундах
+    NOTICE_INTERVAL = 30
+    NOTICE = "⏳ Слишком много запросов. Подождите немного и попробуйте снова."
+
+    def __init__(self, capacity: float = None, refill_rate: float = None, command_costs: Dict[str, float] = None):
+        """
+        Инициализация ограничителя
+
+        Args:
+            capacity (float, optional): Запас токенов. По умолчанию CAPACITY.
+            refill_rate (float, optional): Токенов в секунду. По умолчанию REFILL_RATE.
+            command_costs (dict, optional): Стоимость команд {команда: токены}. По умолчанию COMMAND_COSTS.
+        """
+        self.capacity = capacity or self.CAPACITY
+        self.refill_rate = refill_rate or self.REFILL_RATE
+        self.command_costs = command_costs or self.COMMAND_COSTS
+        self.logger = logger.getChild('RateLimiter')
+        # user_id -> [токены, время последнего запроса, время последнего предупреждения]
+        self._buckets: Dict[int, List[float]] = {}
+        self._last_evict = time.monotonic()
+        self.dropped = 0
+
+    def __len__(self):
+        # Количество пользователей со счетчиками
+        return len(self._buckets)
+
+    def cost(self, update: Update) -> float:
+        """
+        Стоимость обновления в токенах
+
+        Args:
+            update (Update): Объект обновления
+
+        Returns:
+            float: Стоимость
+        """
+        message = update.effective_message
+        if update.callback_query is None and message is not None and message.text and message.text.startswith("/"):
+            command = message.text.split(maxsplit=1)[0][1:].split("@")[0].lower()
+            return self.command_costs.get(command, self.DEFAULT_COST)
+        return self.DEFAULT_COST
+
+    def allow(self, user_id: int, cost: float, now: float = None) -> bool:
+        """
+        Списывает токены пользователя, если их хватает
+
+        Args:
+            user_id (int): ID пользователя
+            cost (float): Стоимость запроса
+            now (float, optional): Текущее время (time.monotonic). По умолчанию текущее.
+
+        Returns:
+            bool: True если запрос разрешен
+        """
+        now = time.monotonic() if now is None else now
+        if now - self._last_evict >= self.EVICT_INTERVAL:
+            self._evict(now)
+
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = [self.capacity, now, 0.0]
+        else:
+            bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.refill_rate)
+            bucket[1] = now
+
+        if bucket[0] < cost:
+            return False
+        bucket[0] -= cost
+        return True
+
+    def _evict(self, now: float):
+        """
+        Удаляет счетчики пользователей, давно не отправлявших запросов
+        (за IDLE_TTL их запас все равно восполнился бы полностью)
+
+        Args:
+            now (float): Текущее время (time.monotonic)
+        """
+        self._last_evict = now
+        idle = [user_id for user_id, bucket in self._buckets.items() if now - bucket[1] >= self.IDLE_TTL]
+        for user_id in idle:
+            del self._buckets[user_id]
+
+    async def check(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """
+        Обработчик группы -1: пропускает обновление дальше или останавливает его обработку
+
+        Args:
+            update (Update): Объект обновления
+            context (ContextTypes.DEFAULT_TYPE): Контекст
+
+        Raises:
+            ApplicationHandlerStop: Лимит пользователя исчерпан
+        """
+        if not isinstance(update, Update) or update.effective_user is None:
+            return
+        user_id = update.effective_user.id
+        now = time.monotonic()
+        if self.allow(user_id, self.cost(update), now):
+            return
+
+        self.dropped += 1
+        bucket = self._buckets[user_id]
+        if now - bucket[2] >= self.NOTICE_INTERVAL:
+            bucket[2] = now
+            self.logger.warning(f"Превышен лимит запросов пользователем {user_id}")
+            try:
+                if update.callback_query is not None:
+                    await update.callback_query.answer(self.NOTICE)
+                elif update.effective_message is not None:
+                    await update.effective_message.reply_text(self.NOTICE)
+            except Exception as e:
+                self.logger.error(f"Ошибка отправки предупреждения: {e}")
+        elif update.callback_query is not None:
+            # Запрос кнопки нужно закрыть, иначе у пользователя останется индикатор загрузки
+            try:
+                await update.callback_query.answer()
+            except Exception:
+                pass
+        raise ApplicationHandlerStop
@@ -0,0 +1,86 @@
+from collections import defaultdict
+from typing import Dict, Set
+
+# Количество минут в сутках
+MINUTES_PER_DAY = 24 * 60
+
+
+class DigestSchedule:
+    """
+    Индекс времени ежедневной сводки: минута суток -> множество пользователей.
+
+    Планировщик раз в минуту забирает пользователей текущей минуты, поэтому не
+    нужна отдельная задача на каждого пользователя, а перенос времени
+    выполняется за O(1).
+    """
+    def __init__(self):
+        """
+        Инициализация пустого индекса
+        """
+        self._buckets: Dict[int, Set[int]] = defaultdict(set)
+        self._minutes: Dict[int, int] = {}
+
+    def __len__(self):
+        return len(self._minutes)
+
+    def load(self, minutes: Dict[int, int]):
+        """
+        Полная перезагрузка индекса
+
+        Args:
+            minutes (dict): {user_id: минута суток}
+        """
+        self._buckets = defaultdict(set)
+        self._minutes = {}
+        for user_id, minute in minutes.items():
+            self.set_minute(user_id, minute)
+
+    def set_minute(self, user_id: int, minute: int):
+        """
+        Устанавливает время сводки пользователя
+
+        Args:
+            user_id (int): ID пользователя
+            minute (int): Минута суток (0..1439)
+        """
+        self.remove(user_id)
+        self._minutes[user_id] = minute
+        self._buckets[minute].add(user_id)
+
+    def remove(self, user_id: int):
+        """
+        Удаляет пользователя из индекса
+
+        Args:
+            user_id (int): ID пользователя
+        """
+        minute = self._minutes.pop(user_id, None)
+        if minute is not None:
+            bucket = self._buckets[minute]
+            bucket.discard(user_id)
+            if not bucket:
+                del self._buckets[minute]
+
+    def minute_of(self, user_id: int):
+        """
+        Время сводки пользователя
+
+        Args:
+            user_id (int): ID пользователя
+
+        Returns:
+            int: Минута суток или None
+        """
+        return self._minutes.get(user_id)
+
+    def users_at(self, minute: int) -> Set[int]:
+        """
+        Пользователи, которым сводка отправляется в указанную минуту
+
+        Args:
+            minute (int): Минута суток
+
+        Returns:
+            set: Копия множества ID пользователей
+        """
+        return set(self._buckets.get(minute % MINUTES_PER_DAY, ()))
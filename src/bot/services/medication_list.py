@@ -0,0 +1,77 @@
+from collections import OrderedDict
+from datetime import datetime
+
+from ...core.database import Database
+from ...core.logger import logger
+from ...utils.helpers import format_medication_info, split_message
+
+
+class MedicationListRenderer:
+    """
+    Готовые тексты /list по пользователям.
+
+    Список форматируется один раз и хранится до изменения лекарств
+    пользователя или до смены дня (в тексте есть "осталось N дней").
+    Длинный список разбивается на несколько сообщений по границам записей.
+    """
+    HEADER = "💊 Ваши лекарства:"
+    EMPTY = "ℹ️ У вас пока нет добавленных лекарств."
+    # Сколько пользователей хранится в кэше
+    MAX_USERS = 10000
+
+    def __init__(self, db: Database):
+        """
+        Инициализация кэша списков
+
+        Args:
+            db (Database): Экземпляр базы данных
+        """
+        self.db = db
+        self.logger = logger.getChild('MedicationListRenderer')
+        # user_id -> (дата сборки, сообщения)
+        self._lists = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        db.medication_listeners.append(self.invalidate)
+
+    def invalidate(self, user_id: int):
+        """
+        Сбрасывает готовый список пользователя
+
+        Args:
+            user_id (int): ID пользователя
+        """
+        self._lists.pop(user_id, None)
+
+    def render(self, user_id: int) -> list:
+        """
+        Список лекарств пользователя в виде сообщений не длиннее лимита Telegram
+
+        Args:
+            user_id (int): ID пользователя
+
+        Returns:
+            list: Тексты сообщений (HTML) или пустой список, если лекарств нет
+        """
+        today = datetime.now().date()
+        cached = self._lists.get(user_id)
+        if cached is not None and cached[0] == today:
+            self._lists.move_to_end(user_id)
+            self.hits += 1
+            return cached[1]
+
+        self.misses += 1
+        parts = [self.HEADER]
+        for med in self.db.get_medications(user_id):
+            try:
+                parts.append(format_medication_info(med))
+            except Exception as e:
+                self.logger.error(f"Ошибка форматирования лекарства {med.id}: {e}")
+                parts.append(f"⚠️ Лекарство ID {med.id} - ошибка данных")
+        messages = split_message(parts) if len(parts) > 1 else []
+
+        self._lists[user_id] = (today, messages)
+        self._lists.move_to_end(user_id)
+        if len(self._lists) > self.MAX_USERS:
+            self._lists.popitem(last=False)
+        return messages
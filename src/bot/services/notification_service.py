@@ -1,23 +1,68 @@
+import asyncio
+from typing import Callable
+
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from datetime import datetime, timedelta
 from ...core.database import Database
-from ...utils.helpers import calculate_next_notification
+from ...core.logger import logger
+from ...utils.helpers import calculate_next_notification, time_to_minutes
+from ...utils.services import Services
+from ...utils.validators import validate_time
+from .digest_schedule import MINUTES_PER_DAY, DigestSchedule
+from .medication_list import MedicationListRenderer
 
 class NotificationService:
     """
     Сервис для отправки уведомлений пользователям
     """
-    def __init__(self, db: Database, bot_application):
+    # Знак зодиака для пользователей, которые его не указали
+    DEFAULT_SIGN = "овен"
+    # Города для погоды у пользователей, которые их не указали
+    DEFAULT_CITIES = ("Moscow", "Brest,BY")
+    # Время сводки для пользователей, которые его не указали
+    DEFAULT_DIGEST_TIME = "08:00"
+    # За сколько минут до отправки готовится сводка
+    PREPARE_AHEAD = 15
+    # Сколько минут пропущенных тактов планировщика досылается
+    MAX_CATCH_UP = 10
+    # Сколько секунд подготовленный вариант сводки считается актуальным
+    DIGEST_MAX_AGE = 30 * 60
+    # Сколько сообщений ежедневной сводки отправляется одновременно
+    SEND_CONCURRENCY = 10
+
+    def __init__(self, db: Database, bot_application, services: Services = None,
+                 clock: Callable[[], datetime] = None):
         """
         Инициализация сервиса уведомлений
         
         Args:
             db (Database): Экземпляр базы данных
             bot_application: Экземпляр приложения бота
+            services (Services, optional): Внешние источники данных. По умолчанию создается новый экземпляр.
+            clock (Callable, optional): Текущее время с часовым поясом. По умолчанию время в часовом поясе планировщика.
         """
         self.db = db
+        self.clock = clock
         self.app = bot_application
+        self.services = services or Services()
+        self.logger = logger.getChild('NotificationService')
+        # Готовые тексты списка лекарств, общие с обработчиками /list
+        self.medication_lists = MedicationListRenderer(db)
         self.scheduler = AsyncIOScheduler(timezone="Europe/Moscow")
+        # Время сводки: минута суток -> пользователи
+        self.schedule = DigestSchedule()
+        self._schedule_date = None
+        # Последняя обработанная минута, считая от начала эпохи (минуты не сбрасываются в полночь)
+        self._last_tick = None
+        # Подготовленные варианты сводки: (знак зодиака, города) -> (текст, время сборки)
+        self._digests = {}
+        # Получатели сводки: user_id -> (знак зодиака, города)
+        self._recipients = {}
+        self._quote = None
+        self._quote_date = None
+        # Состав получателей меняется при записи лекарств и настроек, а не только при перезагрузке
+        db.medication_listeners.append(self.refresh_recipient)
+        db.settings_listeners.append(self.refresh_recipient)
     
     def start(self):
         """
@@ -27,42 +72,277 @@ class NotificationService:
     
     def setup_daily_notifications(self):
         """
-        Настройка ежедневных утренних уведомлений
+        Настройка ежедневных уведомлений: один такт планировщика в минуту
+        отправляет сводку пользователям этой минуты
         """
-        for user_id in self.db.get_all_users():
-            self.scheduler.add_job(
-                self.send_daily_notification,
-                'cron',
-                hour=8,
-                minute=0,
-                args=[user_id],
-                id=f"daily_{user_id}"
-            )
+        self.reload_schedule()
+        self.scheduler.add_job(
+            self.dispatch_digests,
+            'cron',
+            second=0,
+            id="digest_tick",
+            coalesce=True,
+            misfire_grace_time=30
+        )
+    
+    def _now(self) -> datetime:
+        """
+        Текущее время в часовом поясе планировщика
+        
+        Returns:
+            datetime: Текущее время
+        """
+        if self.clock is not None:
+            return self.clock()
+        return datetime.now(self.scheduler.timezone)
+    
+    @property
+    def recipient_count(self) -> int:
+        """
+        Количество загруженных получателей сводки
+        
+        Returns:
+            int: Получателей
+        """
+        return len(self._recipients)
     
-    async def send_daily_notification(self, user_id: int):
+    @property
+    def prepared_count(self) -> int:
         """
-        Отправка ежедневного утреннего уведомления
+        Количество подготовленных вариантов сводки
+        
+        Returns:
+            int: Вариантов (знак зодиака, города)
+        """
+        return len(self._digests)
+    
+    def _digest_minute(self, digest_time: str) -> int:
+        """
+        Минута суток для отправки сводки
         
+        Args:
+            digest_time (str): Время ЧЧ:ММ или None
+        
+        Returns:
+            int: Минута суток
+        """
+        if not digest_time or not validate_time(digest_time):
+            digest_time = self.DEFAULT_DIGEST_TIME
+        return time_to_minutes(digest_time)
+    
+    def reload_schedule(self):
+        """
+        Загрузка получателей, их настроек и времени сводки одним запросом
+        """
+        recipients = self.db.get_digest_recipients()
+        self.schedule.load({
+            user_id: self._digest_minute(user.digest_time)
+            for user_id, user in recipients.items()
+        })
+        self._recipients = {
+            user_id: self._digest_variant(user.zodiac_sign, user.cities)
+            for user_id, user in recipients.items()
+        }
+        self._schedule_date = self._now().date()
+        self.logger.info(f"Загружено получателей сводки: {len(recipients)}")
+    
+    def refresh_recipient(self, user_id: int):
+        """
+        Обновление пользователя в расписании после изменения его лекарств или настроек:
+        первое лекарство добавляет его в получатели сразу, а не после перезагрузки
+
         Args:
             user_id (int): ID пользователя
         """
+        user = self.db.get_digest_recipient(user_id)
+        if user is None:
+            self.schedule.remove(user_id)
+            self._recipients.pop(user_id, None)
+            return
+        self.schedule.set_minute(user_id, self._digest_minute(user.digest_time))
+        self._recipients[user_id] = self._digest_variant(user.zodiac_sign, user.cities)
+    
+    @staticmethod
+    def _render_digest(weather: list, rates: str, horoscope: str, quote: str) -> str:
+        """
+        Сборка текста ежедневной сводки
+
+        Args:
+            weather (list): Погода в городах пользователя
+            rates (str): Курсы валют
+            horoscope (str): Гороскоп
+            quote (str): Цитата дня
+
+        Returns:
+            str: Текст сообщения
+        """
+        return "\n\n".join(["🌅 Доброе утро!", *weather, rates, horoscope, quote])
+    
+    def _digest_variant(self, sign: str, cities) -> tuple:
+        """
+        Ключ варианта сводки с подстановкой значений по умолчанию
+
+        Args:
+            sign (str): Знак зодиака или None
+            cities (list): Города или None
+
+        Returns:
+            tuple: (знак зодиака, кортеж городов)
+        """
+        return sign or self.DEFAULT_SIGN, tuple(cities) if cities else self.DEFAULT_CITIES
+    
+    def _daily_quote(self) -> str:
+        """
+        Цитата дня: одна на всех пользователей в течение суток
+        
+        Returns:
+            str: Цитата
+        """
+        today = self._now().date()
+        if self._quote_date != today:
+            self._quote = Services.get_daily_quote()
+            self._quote_date = today
+        return self._quote
+    
+    def _is_digest_fresh(self, variant: tuple) -> bool:
+        """
+        Проверяет, что вариант сводки собран сегодня и не устарел
+        
+        Args:
+            variant (tuple): Вариант (знак зодиака, города)
+        
+        Returns:
+            bool: True если вариант можно отправлять без повторной сборки
+        """
+        digest = self._digests.get(variant)
+        if digest is None:
+            return False
+        rendered_at = digest[1]
+        now = self._now()
+        return rendered_at.date() == now.date() and (now - rendered_at).total_seconds() < self.DIGEST_MAX_AGE
+    
+    async def _render_variants(self, variants: set):
+        """
+        Сборка устаревших и отсутствующих вариантов сводки. Каждый город и знак
+        запрашивается один раз, сколько бы пользователей его ни выбрали.
+
+        Args:
+            variants (set): Варианты (знак зодиака, города)
+        """
+        variants = {variant for variant in variants if not self._is_digest_fresh(variant)}
+        if not variants:
+            return
+        
+        signs = sorted({sign for sign, _ in variants})
+        cities = sorted({city for _, variant_cities in variants for city in variant_cities})
+        
+        # Все внешние источники запрашиваем параллельно
+        rates, *results = await asyncio.gather(
+            self.services.get_exchange_rates(),
+            *(self.services.get_weather(city) for city in cities),
+            *(self.services.get_horoscope(sign) for sign in signs),
+        )
+        weather = dict(zip(cities, results[:len(cities)]))
+        horoscopes = dict(zip(signs, results[len(cities):]))
+        quote = self._daily_quote()
+        rendered_at = self._now()
+        
+        for sign, variant_cities in variants:
+            text = self._render_digest([weather[city] for city in variant_cities], rates, horoscopes[sign], quote)
+            self._digests[(sign, variant_cities)] = (text, rendered_at)
+    
+    def _enabled_recipients(self, user_ids) -> list:
+        """
+        Отсеивает пользователей, отключивших ежедневную сводку
+        
+        Args:
+            user_ids (Iterable[int]): ID пользователей
+        
+        Returns:
+            list: ID пользователей с включенной сводкой
+        """
+        opted_out = self.db.opted_out["digest"]
+        return [user_id for user_id in user_ids if user_id not in opted_out]
+    
+    async def prepare_digests(self, user_ids):
+        """
+        Подготовка сводки для пользователей до отправки.
+        
+        Перечитывает настройки пользователей одним запросом и собирает нужные
+        варианты текста, чтобы при отправке не было других обращений, кроме Telegram.
+        
+        Args:
+            user_ids (Iterable[int]): ID пользователей
+        """
+        user_ids = self._enabled_recipients(user_ids)
+        if not user_ids:
+            return
+        for user_id, user in self.db.get_digest_settings(user_ids).items():
+            self._recipients[user_id] = self._digest_variant(user.zodiac_sign, user.cities)
+        await self._render_variants({self._recipients.get(user_id, self._digest_variant(None, None)) for user_id in user_ids})
+    
+    async def send_daily_notifications(self, user_ids=None):
+        """
+        Рассылка ежедневной сводки
+        
+        Args:
+            user_ids (Iterable[int], optional): ID получателей. По умолчанию все получатели.
+        """
+        # Отключивших сводку отсеиваем до загрузки настроек и сборки текста
+        user_ids = self._enabled_recipients(self._recipients if user_ids is None else user_ids)
+        missing = [user_id for user_id in user_ids if user_id not in self._recipients]
+        if missing:
+            for user_id, user in self.db.get_digest_settings(missing).items():
+                self._recipients[user_id] = self._digest_variant(user.zodiac_sign, user.cities)
+        variants = {user_id: self._recipients.get(user_id, self._digest_variant(None, None)) for user_id in user_ids}
         try:
-            from ...utils.services import Services
-            
-            sign = self.db.get_user_zodiac(user_id) or "овен"  # Значение по умолчанию
-            
-            message = (
-                "🌅 Доброе утро!\n\n" +
-                Services.get_weather("Moscow") + "\n\n" +
-                Services.get_weather("Brest,BY") + "\n\n" +
-                Services.get_exchange_rates() + "\n\n" +
-                Services.get_horoscope(sign) + "\n\n" +
-                Services.get_daily_quote()
-            )
-            
-            await self._send_message(user_id, message)
+            await self._render_variants(set(variants.values()))
+        except Exception as e:
+            self.logger.error(f"Ошибка подготовки ежедневной сводки: {e}")
+            return
+        
+        semaphore = asyncio.Semaphore(self.SEND_CONCURRENCY)
+        
+        async def send(user_id: int, variant: tuple):
+            async with semaphore:
+                await self._send_message(user_id, self._digests[variant][0])
+        
+        await asyncio.gather(*(send(user_id, variant) for user_id, variant in variants.items()))
+    
+    async def dispatch_digests(self):
+        """
+        Такт планировщика: отправка сводки пользователям текущей минуты
+        и подготовка сводки для пользователей через PREPARE_AHEAD минут
+        """
+        now = self._now()
+        today = now.date()
+        minute = now.hour * 60 + now.minute
+        
+        if self._schedule_date != today:
+            self.reload_schedule()
+        
+        # Досылаем минуты, пропущенные из-за задержек цикла событий, в том числе
+        # минуты прошлых суток, если такт после полуночи пришел с опозданием
+        tick = today.toordinal() * MINUTES_PER_DAY + minute
+        if self._last_tick is not None:
+            if self._last_tick >= tick:
+                return
+            first = max(self._last_tick + 1, tick - self.MAX_CATCH_UP)
+        else:
+            first = tick
+        self._last_tick = tick
+        
+        due = set()
+        for tick_minute in range(first, tick + 1):
+            due |= self.schedule.users_at(tick_minute % MINUTES_PER_DAY)
+        if due:
+            self.logger.info(f"Отправка сводки: {len(due)} получателей")
+            await self.send_daily_notifications(due)
+        
+        try:
+            await self.prepare_digests(self.schedule.users_at(minute + self.PREPARE_AHEAD))
         except Exception as e:
-            self.app.logger.error(f"Ошибка отправки ежедневного уведомления: {e}")
+            self.logger.error(f"Ошибка подготовки ежедневной сводки: {e}")
     
     async def send_medication_reminder(self, user_id: int, med_name: str, dose: int):
         """
@@ -84,24 +364,15 @@ class NotificationService:
             user_id (int): ID пользователя
         """
         try:
-            meds = self.db.get_medications(user_id)
-            if not meds:
-                await self._send_message(user_id, "ℹ️ У вас пока нет добавленных лекарств.")
+            messages = self.medication_lists.render(user_id)
+            if not messages:
+                await self._send_message(user_id, MedicationListRenderer.EMPTY)
                 return
             
-            from ...utils.helpers import format_medication_info
-            
-            text = "💊 Ваши лекарства:\n\n"
-            for med in meds:
-                try:
-                    text += format_medication_info(med) + "\n\n"
-                except Exception as e:
-                    self.app.logger.error(f"Ошибка форматирования лекарства {med[0]}: {e}")
-                    text += f"⚠️ Лекарство ID {med[0]} - ошибка данных\n\n"
-            
-            await self._send_message(user_id, text, parse_mode="HTML")
+            for text in messages:
+                await self._send_message(user_id, text, parse_mode="HTML")
         except Exception as e:
-            self.app.logger.error(f"Ошибка отправки списка лекарств: {e}")
+            self.logger.error(f"Ошибка отправки списка лекарств: {e}")
             await self._send_message(user_id, "❌ Произошла ошибка при загрузке данных. Попробуйте позже.")
     
     async def _send_message(self, user_id: int, text: str, parse_mode=None):
@@ -120,4 +391,4 @@ class NotificationService:
                 parse_mode=parse_mode
             )
         except Exception as e:
-            self.app.logger.error(f"Ошибка отправки сообщения: {e}")
+            self.logger.error(f"Ошибка отправки сообщения: {e}")
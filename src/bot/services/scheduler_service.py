@@ -1,22 +1,34 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from datetime import datetime, timedelta
+from typing import Callable
 from ...core.database import Database
+from ...core.logger import logger
+from ...core.medication_store import MedicationStore
 from ...utils.helpers import calculate_next_notification
 
 class SchedulerService:
     """
     Сервис для работы с планировщиком задач
     """
-    def __init__(self, db: Database, bot_application):
+    # Как часто сохраняется снимок лекарств, в минутах
+    SNAPSHOT_INTERVAL = 10
+
+    def __init__(self, db: Database, bot_application, store: MedicationStore = None,
+                 clock: Callable[[], datetime] = None):
         """
         Инициализация сервиса планировщика
         
         Args:
             db (Database): Экземпляр базы данных
             bot_application: Экземпляр приложения бота
+            store (MedicationStore, optional): Лекарства в памяти. По умолчанию загружаются при создании сервиса.
+            clock (Callable, optional): Текущее время для проверки приемов. По умолчанию datetime.now.
         """
         self.db = db
+        self.clock = clock or datetime.now
         self.app = bot_application
+        self.store = store or MedicationStore(db)
+        self.logger = logger.getChild('SchedulerService')
         self.scheduler = AsyncIOScheduler(timezone="Europe/Moscow")
     
     def start(self):
@@ -35,39 +47,48 @@ class SchedulerService:
             minutes=30,
             id="medication_check"
         )
+        self.scheduler.add_job(
+            self.save_snapshot,
+            "interval",
+            minutes=self.SNAPSHOT_INTERVAL,
+            id="medication_snapshot"
+        )
     
+    async def save_snapshot(self):
+        """
+        Сохранение снимка лекарств.
+
+        Задание объявлено корутиной, чтобы APScheduler выполнял его в цикле
+        событий: синхронное задание ушло бы в пул потоков, а соединение sqlite
+        можно использовать только из создавшего его потока.
+        """
+        try:
+            self.store.save_snapshot()
+        except Exception as e:
+            self.logger.error(f"Ошибка сохранения снимка лекарств: {e}")
+
     async def check_medications(self):
         """
         Проверка лекарств и отправка уведомлений
         """
-        now = datetime.now()
+        now = self.clock()
         current_hour = now.hour
         current_minute = now.minute
         
-        # Получаем все лекарства из БД
-        all_meds = self.db.get_all_medications()
+        # Идущие сегодня курсы берем из памяти, без запроса к БД
+        active = self.store.active_on(now.date())
+        # Пользователи, отключившие напоминания, отсеиваются до расчета времени приема
+        opted_out = self.db.opted_out["reminders"]
+        # Время приема зависит только от количества приемов в день
+        times_by_intakes = {}
         
-        for med in all_meds:
+        for user_id, name, dose, intakes in active:
+            if user_id in opted_out:
+                continue
             try:
-                med_id, user_id, name, dose, intakes, start_date, duration_val, duration_unit, break_val, break_unit, cycles = med
-                
-                # Проверяем, активен ли прием лекарства сейчас
-                if not start_date:
-                    continue
-                
-                start_date_obj = datetime.strptime(start_date, "%Y-%m-%d").date()
-                current_date = now.date()
-                
-                # Рассчитываем дату окончания приема
-                duration_days = duration_val if duration_unit == "days" else duration_val * 30
-                end_date = start_date_obj + timedelta(days=duration_days)
-                
-                # Если курс еще не начался или уже закончился, пропускаем
-                if current_date < start_date_obj or current_date > end_date:
-                    continue
-                
-                # Рассчитываем времена приема в течение дня
-                notification_times = calculate_next_notification(start_date_obj, intakes)
+                notification_times = times_by_intakes.get(intakes)
+                if notification_times is None:
+                    notification_times = times_by_intakes[intakes] = calculate_next_notification(now.date(), intakes)
                 
                 # Проверяем, совпадает ли текущее время с временем приема
                 for notification_time in notification_times:
@@ -77,7 +98,7 @@ class SchedulerService:
                         break
             
             except Exception as e:
-                self.app.logger.error(f"Ошибка при проверке лекарства {med[0]}: {e}")
+                self.logger.error(f"Ошибка при проверке лекарства {name} пользователя {user_id}: {e}")
     
     async def send_medication_reminder(self, user_id: int, med_name: str, dose: int):
         """
@@ -92,4 +113,4 @@ class SchedulerService:
             message = f"💊 Напоминание: примите {dose} капсул(ы) {med_name}"
             await self.app.bot.send_message(chat_id=user_id, text=message)
         except Exception as e:
-            self.app.logger.error(f"Ошибка отправки напоминания: {e}")
+            self.logger.error(f"Ошибка отправки напоминания: {e}")
@@ -1,13 +1,34 @@
 import sqlite3
 from sqlite3 import Error
 from ..core.logger import logger
+from ..bot.models.medication import Medication
+from ..bot.models.user import User
 
 class Database:
+    # Виды уведомлений, которые пользователь может отключить
+    NOTIFICATION_KINDS = ("digest", "reminders")
+    # Столбцы таблицы medications в порядке полей Medication
+    MEDICATION_COLUMNS = Medication.__slots__
+    # Столбцы настроек в порядке User.row_factory
+    USER_COLUMNS = ("user_id", "zodiac_sign", "cities", "digest_time")
+    # Столбцы, которые можно менять через update_medication
+    EDITABLE_COLUMNS = frozenset(MEDICATION_COLUMNS) - {"id", "user_id"}
+
     def __init__(self, db_file):
         self.logger = logger.getChild('Database')
         self.conn = self.create_connection(db_file)
         self.create_table()
         self.create_user_settings_table()  # Создаем таблицу настроек при инициализации
+        self.create_external_cache_table()
+        self.create_persistence_tables()
+        # Пользователи, отключившие уведомления: {вид уведомлений: множество user_id}
+        self.opted_out = self.load_opted_out()
+        # Подписчики на изменение лекарств пользователя: callback(user_id)
+        self.medication_listeners = []
+        # Подписчики на изменение настроек пользователя (знак, города, время сводки): callback(user_id)
+        self.settings_listeners = []
+        # Копия таблицы лекарств в памяти (MedicationStore), обновляется при каждой записи
+        self.medication_store = None
 
     def create_connection(self, db_file):
         conn = None
@@ -35,6 +56,22 @@ class Database:
         );
         """
         self.conn.execute(sql)
+        # Выборка лекарств пользователя и постраничный вывод по порядку id
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_medications_user ON medications(user_id, id)")
+        # Журнал изменений лекарств: по нему MedicationStore догоняет базу после загрузки снимка
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS medication_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            med_id INTEGER NOT NULL
+        );
+        """)
+        for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+            self.conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS medications_log_{event.lower()} AFTER {event} ON medications
+            BEGIN
+                INSERT INTO medication_changes (med_id) VALUES ({row}.id);
+            END;
+            """)
         self.conn.commit()
 
     def create_user_settings_table(self):
@@ -47,78 +84,295 @@ class Database:
         """
         self.conn.execute(sql)
         self.conn.commit()
+        self.add_column_if_missing("user_settings", "cities", "TEXT")
+        self.add_column_if_missing("user_settings", "digest_time", "TEXT")
+        for kind in self.NOTIFICATION_KINDS:
+            self.add_column_if_missing("user_settings", f"{kind}_enabled", "INTEGER NOT NULL DEFAULT 1")
+
+    def add_column_if_missing(self, table: str, column: str, definition: str):
+        """Добавляет столбец в существующую таблицу (миграция старых баз)"""
+        cursor = self.conn.cursor()
+        cursor.execute(f"PRAGMA table_info({table})")
+        if column not in [row[1] for row in cursor.fetchall()]:
+            self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            self.conn.commit()
+
+    def create_external_cache_table(self):
+        """Создает таблицу для сохраненных ответов внешних сервисов, если её нет"""
+        sql = """
+        CREATE TABLE IF NOT EXISTS external_cache (
+            source TEXT NOT NULL,
+            param TEXT NOT NULL,
+            value TEXT NOT NULL,
+            fetched_at REAL NOT NULL,
+            PRIMARY KEY (source, param)
+        );
+        """
+        self.conn.execute(sql)
+        self.conn.commit()
+
+    def create_persistence_tables(self):
+        """Создает таблицы состояния диалогов и user_data бота, если их нет"""
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS conversations (
+            name TEXT NOT NULL,
+            key TEXT NOT NULL,
+            state TEXT NOT NULL,
+            PRIMARY KEY (name, key)
+        );
+        """)
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS user_data (
+            user_id INTEGER PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+        """)
+        self.conn.commit()
 
     def add_medication(self, user_id, name, dose_per_intake, intakes_per_day, start_date,
                       duration_value, duration_unit, break_value, break_unit, cycles=1):
-        sql = """
+        """Добавляет лекарство и возвращает сохраненную запись (Medication) одним запросом"""
+        sql = f"""
         INSERT INTO medications(
             user_id, name, dose_per_intake, intakes_per_day, start_date,
             duration_value, duration_unit, break_value, break_unit, cycles
         ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        RETURNING {", ".join(self.MEDICATION_COLUMNS)}
         """
-        self.conn.execute(sql, (
+        medication = self._medication_cursor().execute(sql, (
             user_id, name, dose_per_intake, intakes_per_day, start_date,
             duration_value, duration_unit, break_value, break_unit, cycles
-        ))
+        )).fetchone()
         self.conn.commit()
+        if self.medication_store is not None:
+            self.medication_store.put(medication)
+        self._medications_changed(user_id)
+        return medication
 
-    def get_medications(self, user_id):
+    def _medication_cursor(self):
+        """Курсор, строки которого сразу создаются как Medication"""
+        cursor = self.conn.cursor()
+        cursor.row_factory = Medication.row_factory
+        return cursor
+
+    def _user_cursor(self):
+        """Курсор, строки которого сразу создаются как User"""
         cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM medications WHERE user_id=?", (user_id,))
+        cursor.row_factory = User.row_factory
+        return cursor
+
+    def add_medications(self, user_id, medications):
+        """Добавляет несколько лекарств пользователя одной транзакцией и возвращает сохраненные записи
+
+        Args:
+            user_id: ID пользователя
+            medications: Словари с полями add_medication (без user_id)
+        """
+        sql = f"""
+        INSERT INTO medications(
+            user_id, name, dose_per_intake, intakes_per_day, start_date,
+            duration_value, duration_unit, break_value, break_unit, cycles
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        RETURNING {", ".join(self.MEDICATION_COLUMNS)}
+        """
+        cursor = self._medication_cursor()
+        try:
+            saved = [
+                cursor.execute(sql, (
+                    user_id, med["name"], med["dose_per_intake"], med["intakes_per_day"], med["start_date"],
+                    med["duration_value"], med["duration_unit"], med["break_value"], med["break_unit"],
+                    med.get("cycles", 1)
+                )).fetchone()
+                for med in medications
+            ]
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+        if self.medication_store is not None:
+            for medication in saved:
+                self.medication_store.put(medication)
+        self._medications_changed(user_id)
+        return saved
+
+    def _medications_changed(self, user_id):
+        """Сообщает подписчикам, что лекарства пользователя изменились"""
+        for listener in self.medication_listeners:
+            listener(user_id)
+
+    def _settings_changed(self, user_id):
+        """Сообщает подписчикам, что настройки пользователя изменились"""
+        for listener in self.settings_listeners:
+            listener(user_id)
+
+    def get_medications(self, user_id):
+        cursor = self._medication_cursor()
+        cursor.execute(f"SELECT {', '.join(self.MEDICATION_COLUMNS)} FROM medications WHERE user_id=?", (user_id,))
         return cursor.fetchall()
 
-    def get_medication_by_id(self, med_id):
+    def get_medications_page(self, user_id: int, page: int, page_size: int):
+        """Возвращает страницу лекарств пользователя [(id, name), ...] и признак следующей страницы"""
         cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM medications WHERE id=?", (med_id,))
+        cursor.execute(
+            "SELECT id, name FROM medications WHERE user_id=? ORDER BY id LIMIT ? OFFSET ?",
+            (user_id, page_size + 1, page * page_size)
+        )
+        rows = cursor.fetchall()
+        return rows[:page_size], len(rows) > page_size
+
+    def get_medication_by_id(self, med_id):
+        cursor = self._medication_cursor()
+        cursor.execute(f"SELECT {', '.join(self.MEDICATION_COLUMNS)} FROM medications WHERE id=?", (med_id,))
         return cursor.fetchone()
 
-    def update_medication(self, med_id: int, **kwargs):
-        """Обновляет данные лекарства с проверкой полей"""
+    def update_medication(self, med_id: int, user_id: int = None, **kwargs):
+        """Обновляет поля лекарства и возвращает измененную запись (Medication) или None, если запись не найдена.
+        Если указан user_id, изменяется только лекарство этого пользователя."""
         if not kwargs:
             raise ValueError("Нет данных для обновления")
 
-        # Получаем допустимые поля
-        allowed_fields = self.get_medication_field_names()
         for field in kwargs.keys():
-            if field not in allowed_fields:
+            if field not in self.EDITABLE_COLUMNS:
                 raise ValueError(f"Недопустимое поле: {field}")
 
         # Формируем SQL-запрос
         set_clause = ", ".join([f"{field} = ?" for field in kwargs.keys()])
         values = list(kwargs.values())
         values.append(med_id)
+        where = "id = ?"
+        if user_id is not None:
+            where += " AND user_id = ?"
+            values.append(user_id)
 
-        sql = f"UPDATE medications SET {set_clause} WHERE id = ?"
+        sql = f"UPDATE medications SET {set_clause} WHERE {where} RETURNING {', '.join(self.MEDICATION_COLUMNS)}"
 
         # Выполняем с транзакцией
         try:
-            cursor = self.conn.cursor()
-            cursor.execute(sql, values)
+            medication = self._medication_cursor().execute(sql, values).fetchone()
             self.conn.commit()
-
-            # Проверяем количество обновленных строк
-            if cursor.rowcount == 0:
-                raise ValueError("Запись не найдена или данные не изменились")
-
         except sqlite3.Error as e:
             self.conn.rollback()
             raise Exception(f"Ошибка базы данных: {str(e)}")
 
-    def delete_medication(self, med_id):
-        self.conn.execute("DELETE FROM medications WHERE id=?", (med_id,))
-        self.conn.commit()
+        if medication is not None:
+            if self.medication_store is not None:
+                self.medication_store.put(medication)
+            self._medications_changed(medication.user_id)
+        return medication
+
+    def delete_medication(self, med_id: int, user_id: int = None):
+        """Удаляет лекарство и возвращает удаленную запись (Medication) или None, если запись не найдена.
+        Если указан user_id, удаляется только лекарство этого пользователя."""
+        sql = "DELETE FROM medications WHERE id = ?"
+        values = [med_id]
+        if user_id is not None:
+            sql += " AND user_id = ?"
+            values.append(user_id)
+        # Удаление и запись в журнал изменений (триггер) - одна транзакция:
+        # при ошибке откатываются обе, и соединение не остается в открытой транзакции
+        with self.conn:
+            medication = self._medication_cursor().execute(
+                f"{sql} RETURNING {', '.join(self.MEDICATION_COLUMNS)}", values
+            ).fetchone()
+
+        if medication is not None:
+            if self.medication_store is not None:
+                self.medication_store.remove(medication.id)
+            self._medications_changed(medication.user_id)
+        return medication
 
     def get_all_medications(self):
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM medications")
+        cursor = self._medication_cursor()
+        cursor.execute(f"SELECT {', '.join(self.MEDICATION_COLUMNS)} FROM medications")
         return cursor.fetchall()
 
+    def get_medications_by_ids(self, med_ids):
+        """Возвращает лекарства с указанными ID (отсутствующие в базе не попадают в результат)"""
+        med_ids = list(med_ids)
+        result = []
+        cursor = self._medication_cursor()
+        # Пачками, чтобы не упереться в ограничение sqlite на число параметров
+        for i in range(0, len(med_ids), 500):
+            chunk = med_ids[i:i + 500]
+            cursor.execute(
+                f"SELECT {', '.join(self.MEDICATION_COLUMNS)} FROM medications "
+                f"WHERE id IN ({', '.join('?' * len(chunk))})",
+                chunk
+            )
+            result.extend(cursor.fetchall())
+        return result
+
+    def get_last_medication_change(self) -> int:
+        """Возвращает номер последней записи журнала изменений лекарств (0, если записей не было).
+        Берется из sqlite_sequence, поэтому не уменьшается после очистки журнала"""
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'medication_changes'")
+        result = cursor.fetchone()
+        return result[0] if result else 0
+
+    def get_medication_changes(self, after_seq: int):
+        """Возвращает изменения лекарств после after_seq: (номер последнего изменения, множество ID лекарств)"""
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT seq, med_id FROM medication_changes WHERE seq > ? ORDER BY seq", (after_seq,))
+        rows = cursor.fetchall()
+        return (rows[-1][0] if rows else after_seq), {med_id for _, med_id in rows}
+
+    def trim_medication_changes(self, upto_seq: int):
+        """Удаляет из журнала изменения, уже вошедшие в снимок MedicationStore"""
+        self.conn.execute("DELETE FROM medication_changes WHERE seq <= ?", (upto_seq,))
+        self.conn.commit()
+
     def get_all_users(self):
         """Возвращает список ID пользователей (чисел), которые добавили лекарства"""
         cursor = self.conn.cursor()
         cursor.execute("SELECT DISTINCT user_id FROM medications")
         return [user_id for (user_id,) in cursor.fetchall()]  # Явное распаковывание кортежа
 
+    def get_digest_recipients(self):
+        """Возвращает получателей ежедневной сводки и их настройки одним запросом:
+        {user_id: User}. Получатели - пользователи с лекарствами и пользователи, задавшие время сводки"""
+        cursor = self._user_cursor()
+        cursor.execute("""
+            SELECT u.user_id, s.zodiac_sign, s.cities, s.digest_time
+            FROM (
+                SELECT user_id FROM medications
+                UNION
+                SELECT user_id FROM user_settings WHERE digest_time IS NOT NULL
+            ) AS u
+            LEFT JOIN user_settings AS s ON s.user_id = u.user_id
+        """)
+        return {user.user_id: user for user in cursor.fetchall()}
+
+    def get_digest_recipient(self, user_id: int):
+        """Возвращает настройки пользователя (User), если он получатель ежедневной сводки
+        по правилам get_digest_recipients, иначе None"""
+        cursor = self._user_cursor()
+        cursor.execute("""
+            SELECT ?, s.zodiac_sign, s.cities, s.digest_time
+            FROM (SELECT 1) AS one
+            LEFT JOIN user_settings AS s ON s.user_id = ?
+            WHERE EXISTS (SELECT 1 FROM medications WHERE user_id = ?) OR s.digest_time IS NOT NULL
+        """, (user_id, user_id, user_id))
+        return cursor.fetchone()
+
+    def get_digest_settings(self, user_ids):
+        """Возвращает настройки сводки для указанных пользователей:
+        {user_id: User}; пользователи без настроек не попадают в результат"""
+        user_ids = list(user_ids)
+        result = {}
+        cursor = self._user_cursor()
+        # Пачками, чтобы не упереться в ограничение sqlite на число параметров
+        for i in range(0, len(user_ids), 500):
+            chunk = user_ids[i:i + 500]
+            cursor.execute(
+                f"SELECT {', '.join(self.USER_COLUMNS)} FROM user_settings "
+                f"WHERE user_id IN ({', '.join('?' * len(chunk))})",
+                chunk
+            )
+            for user in cursor.fetchall():
+                result[user.user_id] = user
+        return result
+
     def get_medication_field_names(self):
         """Возвращает список полей лекарства"""
         cursor = self.conn.cursor()
@@ -128,11 +382,13 @@ class Database:
     def add_user_settings(self, user_id: int, zodiac_sign: str):
         """Сохраняет настройки пользователя"""
         sql = """
-        INSERT OR REPLACE INTO user_settings (user_id, zodiac_sign)
+        INSERT INTO user_settings (user_id, zodiac_sign)
         VALUES (?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET zodiac_sign = excluded.zodiac_sign
         """
         self.conn.execute(sql, (user_id, zodiac_sign))
         self.conn.commit()
+        self._settings_changed(user_id)
 
     def get_user_zodiac(self, user_id: int) -> str:
         """Возвращает знак зодиака пользователя"""
@@ -143,3 +399,127 @@ class Database:
         )
         result = cursor.fetchone()
         return result[0] if result else None
+
+    def set_user_cities(self, user_id: int, cities: list):
+        """Сохраняет города для погоды в ежедневной сводке"""
+        sql = """
+        INSERT INTO user_settings (user_id, cities)
+        VALUES (?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET cities = excluded.cities
+        """
+        self.conn.execute(sql, (user_id, User.CITIES_SEPARATOR.join(cities)))
+        self.conn.commit()
+        self._settings_changed(user_id)
+
+    def get_user_cities(self, user_id: int):
+        """Возвращает города пользователя для ежедневной сводки или None, если не заданы"""
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT cities FROM user_settings WHERE user_id = ?", (user_id,))
+        result = cursor.fetchone()
+        return User.split_cities(result[0]) if result else None
+
+    def set_user_digest_time(self, user_id: int, digest_time: str):
+        """Сохраняет время ежедневной сводки (ЧЧ:ММ)"""
+        sql = """
+        INSERT INTO user_settings (user_id, digest_time)
+        VALUES (?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET digest_time = excluded.digest_time
+        """
+        self.conn.execute(sql, (user_id, digest_time))
+        self.conn.commit()
+        self._settings_changed(user_id)
+
+    def get_user_digest_time(self, user_id: int):
+        """Возвращает время ежедневной сводки пользователя (ЧЧ:ММ) или None, если не задано"""
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT digest_time FROM user_settings WHERE user_id = ?", (user_id,))
+        result = cursor.fetchone()
+        return result[0] if result else None
+
+    def load_opted_out(self):
+        """Возвращает пользователей, отключивших уведомления: {вид: множество user_id}"""
+        cursor = self.conn.cursor()
+        opted_out = {}
+        for kind in self.NOTIFICATION_KINDS:
+            cursor.execute(f"SELECT user_id FROM user_settings WHERE {kind}_enabled = 0")
+            opted_out[kind] = {user_id for (user_id,) in cursor.fetchall()}
+        return opted_out
+
+    def set_notifications_enabled(self, user_id: int, kind: str, enabled: bool):
+        """Включает или отключает вид уведомлений (digest/reminders) для пользователя"""
+        if kind not in self.NOTIFICATION_KINDS:
+            raise ValueError(f"Недопустимый вид уведомлений: {kind}")
+        sql = f"""
+        INSERT INTO user_settings (user_id, {kind}_enabled)
+        VALUES (?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET {kind}_enabled = excluded.{kind}_enabled
+        """
+        self.conn.execute(sql, (user_id, int(enabled)))
+        self.conn.commit()
+        if enabled:
+            self.opted_out[kind].discard(user_id)
+        else:
+            self.opted_out[kind].add(user_id)
+
+    def is_notification_enabled(self, user_id: int, kind: str) -> bool:
+        """Проверяет без обращения к базе, включен ли вид уведомлений у пользователя"""
+        return user_id not in self.opted_out[kind]
+
+    def get_external_cache(self, min_fetched_at: float = 0):
+        """Возвращает сохраненные ответы внешних сервисов не старше min_fetched_at:
+        [(source, param, value, fetched_at)]"""
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "SELECT source, param, value, fetched_at FROM external_cache WHERE fetched_at >= ?",
+            (min_fetched_at,)
+        )
+        return cursor.fetchall()
+
+    def prune_external_cache(self, min_fetched_at: float) -> int:
+        """Удаляет сохраненные ответы внешних сервисов старше min_fetched_at и возвращает их количество"""
+        deleted = self.conn.execute("DELETE FROM external_cache WHERE fetched_at < ?", (min_fetched_at,)).rowcount
+        self.conn.commit()
+        return deleted
+
+    def save_external_cache(self, rows):
+        """Сохраняет ответы внешних сервисов одной транзакцией: rows = [(source, param, value, fetched_at)]"""
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO external_cache (source, param, value, fetched_at) VALUES (?, ?, ?, ?)",
+            rows
+        )
+        self.conn.commit()
+
+    def get_conversations(self, name: str):
+        """Возвращает сохраненные состояния диалога: [(key, state), ...] в JSON"""
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT key, state FROM conversations WHERE name = ?", (name,))
+        return cursor.fetchall()
+
+    def get_all_user_data(self):
+        """Возвращает сохраненные user_data: [(user_id, data), ...] в JSON"""
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT user_id, data FROM user_data")
+        return cursor.fetchall()
+
+    def save_persistence(self, conversations, finished_conversations, user_data, dropped_user_ids):
+        """Сохраняет накопленные изменения состояния бота одной транзакцией
+
+        Args:
+            conversations: [(name, key, state), ...] - новые состояния диалогов
+            finished_conversations: [(name, key), ...] - завершенные диалоги
+            user_data: [(user_id, data), ...] - измененные user_data
+            dropped_user_ids: [user_id, ...] - удаленные user_data
+        """
+        try:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO conversations (name, key, state) VALUES (?, ?, ?)", conversations
+            )
+            self.conn.executemany(
+                "DELETE FROM conversations WHERE name = ? AND key = ?", finished_conversations
+            )
+            self.conn.executemany("INSERT OR REPLACE INTO user_data (user_id, data) VALUES (?, ?)", user_data)
+            self.conn.executemany("DELETE FROM user_data WHERE user_id = ?", ((user_id,) for user_id in dropped_user_ids))
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
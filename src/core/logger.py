@@ -1,14 +1,67 @@
+import atexit
+import copy
 import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Файл лога и его ротация: при достижении LOG_MAX_BYTES файл переименовывается,
+# хранится не больше LOG_BACKUP_COUNT старых файлов
+LOG_FILE = 'medication_bot.log'
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# Библиотеки, которые пишут по строке на каждый HTTP-запрос (в том числе опрос getUpdates)
+QUIET_LOGGERS = ('httpx', 'httpcore', 'apscheduler.executors')
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    Передача записей в очередь без форматирования в потоке цикла событий.
+
+    Стандартный QueueHandler форматирует запись целиком (время, трассировка
+    исключения) до постановки в очередь. Здесь в вызывающем потоке только
+    подставляются аргументы сообщения, чтобы изменяемые объекты попали в лог
+    в своем текущем состоянии; остальное делают обработчики QueueListener.
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
 
 def setup_logger():
+    """
+    Настройка логирования: обработчики вызываются в отдельном потоке QueueListener,
+    поэтому запись в файл и консоль не блокирует цикл событий.
+
+    Переменные окружения:
+        LOG_LEVEL: уровень логирования (по умолчанию INFO)
+
+    Returns:
+        logging.Logger: Логгер бота
+    """
+    formatter = logging.Formatter(LOG_FORMAT)
+    file_handler = RotatingFileHandler(
+        LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'
+    )
+    stream_handler = logging.StreamHandler()
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+    listener.start()
+    # Дописываем очередь при завершении процесса
+    atexit.register(listener.stop)
+
     logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('medication_bot.log'),
-            logging.StreamHandler()
-        ]
+        level=os.getenv('LOG_LEVEL', 'INFO').upper(),
+        handlers=[LazyQueueHandler(log_queue)]
     )
+    for name in QUIET_LOGGERS:
+        logging.getLogger(name).setLevel(logging.WARNING)
     return logging.getLogger(__name__)
 
 logger = setup_logger()
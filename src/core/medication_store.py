@@ -0,0 +1,291 @@
+import mmap
+import os
+import struct
+import time
+from array import array
+from datetime import date
+from pathlib import Path
+from typing import Dict, List
+
+from ..bot.models.medication import Medication
+from .database import Database
+from .logger import logger
+
+
+class MedicationStore:
+    """
+    Копия таблицы лекарств в памяти, по столбцам.
+
+    Database обновляет ее при каждой записи, поэтому планировщик проверяет
+    курсы без обращения к sqlite. Даты хранятся как порядковые номера дней,
+    а дата окончания курса считается один раз при записи.
+
+    Состояние периодически сохраняется в файл снимка. При запуске снимок
+    читается через mmap, после чего применяются только изменения из журнала
+    medication_changes, сделанные после снимка.
+    """
+    # Числовые столбцы и их типы array
+    COLUMNS = (
+        ("id", "q"),
+        ("user_id", "q"),
+        ("dose_per_intake", "i"),
+        ("intakes_per_day", "i"),
+        ("start", "i"),
+        ("end", "i"),
+        ("duration_value", "i"),
+        ("break_value", "i"),
+        ("cycles", "i"),
+        ("duration_unit", "b"),
+        ("break_unit", "b"),
+    )
+    # Коды единиц длительности
+    UNIT_CODES = {"days": 0, "months": 1}
+    # Заголовок снимка: сигнатура, число строк, номер изменения в журнале, размер блока названий.
+    # После числовых столбцов идут длины названий в байтах и сами названия подряд
+    SNAPSHOT_MAGIC = b"MEDSNAP2"
+    HEADER = struct.Struct("<8sQQQ")
+    DEFAULT_SNAPSHOT = "data/medications.snapshot"
+
+    def __init__(self, db: Database, snapshot_path=DEFAULT_SNAPSHOT):
+        """
+        Инициализация хранилища: загрузка снимка или всей таблицы и подключение к Database
+
+        Args:
+            db (Database): Экземпляр базы данных
+            snapshot_path (str | Path, optional): Файл снимка. По умолчанию data/medications.snapshot.
+        """
+        self.db = db
+        self.snapshot_path = Path(snapshot_path)
+        self.logger = logger.getChild('MedicationStore')
+        self._clear()
+        # Номер последнего примененного изменения из журнала
+        self.seq = 0
+        # Номер изменения, на котором сохранен последний снимок
+        self.snapshot_seq = None
+        self.load()
+        db.medication_store = self
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, med_id: int):
+        return med_id in self._positions
+
+    def _clear(self):
+        """
+        Пустые столбцы
+        """
+        self.columns: Dict[str, array] = {name: array(code) for name, code in self.COLUMNS}
+        self.names: List[str] = []
+        # id лекарства -> номер строки
+        self._positions: Dict[int, int] = {}
+
+    @classmethod
+    def _unit_code(cls, unit: str) -> int:
+        return cls.UNIT_CODES.get(unit, 0)
+
+    @staticmethod
+    def _days(value: int, unit_code: int) -> int:
+        # Как и в остальном боте, месяц считается за 30 дней
+        return value * 30 if unit_code else value
+
+    def _row(self, medication: Medication) -> tuple:
+        """
+        Значения числовых столбцов для лекарства в порядке COLUMNS
+
+        Args:
+            medication (Medication): Лекарство
+
+        Returns:
+            tuple: Значения столбцов
+        """
+        duration_unit = self._unit_code(medication.duration_unit)
+        try:
+            start = date.fromisoformat(medication.start_date).toordinal()
+            end = start + self._days(medication.duration_value, duration_unit)
+        except (TypeError, ValueError):
+            # Курс без корректной даты начала никогда не считается активным
+            start, end = 0, -1
+        return (
+            medication.id, medication.user_id, medication.dose_per_intake, medication.intakes_per_day,
+            start, end, medication.duration_value, medication.break_value, medication.cycles or 1,
+            duration_unit, self._unit_code(medication.break_unit),
+        )
+
+    def put(self, medication: Medication):
+        """
+        Добавляет или заменяет лекарство
+
+        Args:
+            medication (Medication): Лекарство
+        """
+        row = self._row(medication)
+        position = self._positions.get(medication.id)
+        if position is None:
+            self._positions[medication.id] = len(self.names)
+            for (name, _), value in zip(self.COLUMNS, row):
+                self.columns[name].append(value)
+            self.names.append(medication.name)
+        else:
+            for (name, _), value in zip(self.COLUMNS, row):
+                self.columns[name][position] = value
+            self.names[position] = medication.name
+
+    def remove(self, med_id: int):
+        """
+        Удаляет лекарство: на его место переносится последняя строка
+
+        Args:
+            med_id (int): ID лекарства
+        """
+        position = self._positions.pop(med_id, None)
+        if position is None:
+            return
+        last = len(self.names) - 1
+        if position != last:
+            for column in self.columns.values():
+                column[position] = column[last]
+            self.names[position] = self.names[last]
+            self._positions[self.columns["id"][position]] = position
+        for column in self.columns.values():
+            column.pop()
+        self.names.pop()
+
+    def active_on(self, day: date) -> list:
+        """
+        Курсы, которые идут в указанный день
+
+        Args:
+            day (date): День
+
+        Returns:
+            list: [(user_id, название, доза, приемов в день), ...]
+        """
+        day = day.toordinal()
+        starts, ends = self.columns["start"], self.columns["end"]
+        user_ids, doses, intakes = self.columns["user_id"], self.columns["dose_per_intake"], self.columns["intakes_per_day"]
+        names = self.names
+        return [
+            (user_ids[i], names[i], doses[i], intakes[i])
+            for i in range(len(names))
+            if starts[i] <= day <= ends[i]
+        ]
+
+    def sync(self):
+        """
+        Применяет изменения из журнала, сделанные после последнего примененного
+        (в том числе записи в базу в обход Database)
+        """
+        last_seq, med_ids = self.db.get_medication_changes(self.seq)
+        if not med_ids:
+            return
+        found = self.db.get_medications_by_ids(med_ids)
+        for medication in found:
+            self.put(medication)
+        for med_id in med_ids - {medication.id for medication in found}:
+            self.remove(med_id)
+        self.seq = last_seq
+
+    def load(self):
+        """
+        Загрузка из снимка с догрузкой изменений или, если снимка нет, из всей таблицы
+        """
+        started = time.perf_counter()
+        source = "снимок"
+        try:
+            loaded = self._load_snapshot()
+        except Exception as e:
+            self.logger.error(f"Не удалось прочитать снимок {self.snapshot_path}: {e}")
+            loaded = False
+
+        if loaded:
+            self.sync()
+        else:
+            source = "таблица"
+            # Номер берем до чтения таблицы: изменения во время чтения применятся повторно, а не потеряются
+            self.seq = self.db.get_last_medication_change()
+            self._load_table(self.db.get_all_medications())
+        self.logger.info(
+            f"Загружено лекарств: {len(self)} ({source}) за {(time.perf_counter() - started) * 1000:.1f} мс"
+        )
+
+    def _load_table(self, medications: list):
+        """
+        Заполнение столбцов целиком, без построчных вставок
+
+        Args:
+            medications (list): Все лекарства
+        """
+        self._clear()
+        rows = [self._row(medication) for medication in medications]
+        for (name, code), values in zip(self.COLUMNS, zip(*rows)):
+            self.columns[name] = array(code, values)
+        self.names = [medication.name for medication in medications]
+        self._positions = {med_id: position for position, med_id in enumerate(self.columns["id"])}
+
+    def _load_snapshot(self) -> bool:
+        """
+        Чтение снимка через mmap
+
+        Returns:
+            bool: True если снимок прочитан
+        """
+        if not self.snapshot_path.exists():
+            return False
+        with open(self.snapshot_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            magic, count, seq, names_size = self.HEADER.unpack_from(data, 0)
+            if magic != self.SNAPSHOT_MAGIC:
+                raise ValueError("неизвестный формат")
+            if seq > self.db.get_last_medication_change():
+                # Снимок новее журнала - он от другой базы
+                raise ValueError("снимок не соответствует базе")
+
+            self._clear()
+            offset = self.HEADER.size
+            for name, code in self.COLUMNS:
+                column = self.columns[name]
+                size = count * column.itemsize
+                column.frombytes(data[offset:offset + size])
+                offset += size
+            lengths = array("I")
+            size = count * lengths.itemsize
+            lengths.frombytes(data[offset:offset + size])
+            offset += size
+            if sum(lengths) != names_size:
+                raise ValueError("поврежден блок названий")
+            names = []
+            for length in lengths:
+                names.append(data[offset:offset + length].decode("utf-8"))
+                offset += length
+            self.names = names
+
+        self._positions = {med_id: position for position, med_id in enumerate(self.columns["id"])}
+        self.seq = self.snapshot_seq = seq
+        return True
+
+    def save_snapshot(self):
+        """
+        Сохранение снимка (если были изменения) и очистка вошедшей в него части журнала
+        """
+        self.sync()
+        if self.snapshot_seq == self.seq and self.snapshot_path.exists():
+            return
+        started = time.perf_counter()
+        # Названия хранятся с длинами, а не через разделитель: в названии может быть любой символ
+        encoded = [name.encode("utf-8") for name in self.names]
+        lengths = array("I", map(len, encoded))
+        names = b"".join(encoded)
+        self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.snapshot_path.with_name(self.snapshot_path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(self.HEADER.pack(self.SNAPSHOT_MAGIC, len(self), self.seq, len(names)))
+            for name, _ in self.COLUMNS:
+                self.columns[name].tofile(f)
+            lengths.tofile(f)
+            f.write(names)
+        os.replace(tmp_path, self.snapshot_path)
+        self.snapshot_seq = self.seq
+        self.db.trim_medication_changes(self.seq)
+        self.logger.info(
+            f"Снимок лекарств сохранен: {len(self)} строк за {(time.perf_counter() - started) * 1000:.1f} мс"
+        )
@@ -0,0 +1,185 @@
+import asyncio
+import itertools
+import time
+from collections import namedtuple
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+# Значение в кэше и время его получения (unix time)
+CacheEntry = namedtuple('CacheEntry', ['value', 'fetched_at'])
+
+
+class TTLCache:
+    """
+    Кэш с ограниченным временем жизни записей и объединением параллельных промахов.
+
+    Ключи имеют вид (источник, параметр). Если несколько корутин одновременно
+    запрашивают отсутствующий ключ, загрузка выполняется один раз, а остальные
+    ждут ее результата.
+
+    Устаревшие записи не удаляются сразу: они нужны как запасное значение, когда
+    источник недоступен. Записи старше max_age удаляются при сохранении новых
+    (не чаще раза в PURGE_INTERVAL), а сверх max_entries вытесняются давно
+    сохраненные.
+    """
+    # Сколько записей хранится не дольше; параметры ключей (города, даты) не ограничены
+    MAX_ENTRIES = 10000
+    # Возраст записи, после которого она удаляется даже как запасное значение, в секундах
+    MAX_AGE = 2 * 24 * 60 * 60
+    # Как часто удаляются старые записи, в секундах
+    PURGE_INTERVAL = 60
+
+    def __init__(self, default_ttl: float = 600, on_store: Callable[[Hashable, CacheEntry], None] = None,
+                 max_entries: int = MAX_ENTRIES, max_age: float = MAX_AGE):
+        """
+        Инициализация кэша
+
+        Args:
+            default_ttl (float, optional): Время жизни записи в секундах. По умолчанию 600.
+            on_store (Callable, optional): Вызывается для каждого загруженного значения. По умолчанию None.
+            max_entries (int, optional): Максимальное число записей. По умолчанию MAX_ENTRIES.
+            max_age (float, optional): Возраст удаления записи в секундах. По умолчанию MAX_AGE.
+        """
+        self.default_ttl = default_ttl
+        self.on_store = on_store
+        self.max_entries = max_entries
+        self.max_age = max_age
+        # Записи в порядке сохранения: первые - самые давние
+        self._entries: Dict[Hashable, CacheEntry] = {}
+        self._ttls: Dict[Hashable, float] = {}
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._purged_at = 0.0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_entry(self, key: Hashable):
+        """
+        Возвращает запись кэша независимо от ее срока жизни
+
+        Args:
+            key (Hashable): Ключ (источник, параметр)
+
+        Returns:
+            CacheEntry: Запись или None
+        """
+        return self._entries.get(key)
+
+    def is_fresh(self, key: Hashable) -> bool:
+        """
+        Проверяет, что запись есть в кэше и не устарела
+
+        Args:
+            key (Hashable): Ключ (источник, параметр)
+
+        Returns:
+            bool: True если запись актуальна
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return False
+        return time.time() - entry.fetched_at < self._ttls.get(key, self.default_ttl)
+
+    def set(self, key: Hashable, value: Any, ttl: float = None, fetched_at: float = None):
+        """
+        Сохраняет значение в кэш
+
+        Args:
+            key (Hashable): Ключ (источник, параметр)
+            value (Any): Значение
+            ttl (float, optional): Время жизни в секундах. По умолчанию default_ttl.
+            fetched_at (float, optional): Время получения значения. По умолчанию текущее.
+        """
+        now = time.time()
+        # Перестановка в конец: порядок словаря - порядок сохранения
+        self._entries.pop(key, None)
+        self._entries[key] = CacheEntry(value, now if fetched_at is None else fetched_at)
+        if ttl is not None:
+            self._ttls[key] = ttl
+        if now - self._purged_at >= self.PURGE_INTERVAL or len(self._entries) > self.max_entries:
+            self.purge(now)
+
+    def _remove(self, key: Hashable):
+        del self._entries[key]
+        self._ttls.pop(key, None)
+        self.evicted += 1
+
+    def purge(self, now: float = None):
+        """
+        Удаляет записи старше max_age и, если записей больше max_entries, самые давние
+
+        Args:
+            now (float, optional): Текущее время (unix time). По умолчанию текущее.
+        """
+        now = time.time() if now is None else now
+        self._purged_at = now
+        cutoff = now - self.max_age
+        for key in [key for key, entry in self._entries.items() if entry.fetched_at < cutoff]:
+            self._remove(key)
+        excess = len(self._entries) - self.max_entries
+        if excess > 0:
+            for key in list(itertools.islice(self._entries, excess)):
+                self._remove(key)
+
+    async def get_or_fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]], ttl: float = None) -> Any:
+        """
+        Возвращает значение из кэша или загружает его
+
+        Args:
+            key (Hashable): Ключ (источник, параметр)
+            fetch (Callable): Корутинная функция загрузки значения
+            ttl (float, optional): Время жизни в секундах. По умолчанию default_ttl.
+
+        Returns:
+            Any: Значение
+
+        Raises:
+            Exception: Ошибка загрузки (ошибки в кэш не попадают)
+        """
+        stats = self._stats.setdefault(key[0], {'hits': 0, 'misses': 0, 'coalesced': 0})
+
+        if self.is_fresh(key):
+            stats['hits'] += 1
+            return self._entries[key].value
+
+        pending = self._pending.get(key)
+        if pending is None:
+            stats['misses'] += 1
+            pending = asyncio.ensure_future(self._load(key, fetch, ttl))
+            self._pending[key] = pending
+        else:
+            stats['coalesced'] += 1
+
+        # shield: отмена одного ожидающего не должна прерывать общую загрузку
+        return await asyncio.shield(pending)
+
+    async def _load(self, key: Hashable, fetch: Callable[[], Awaitable[Any]], ttl: float = None) -> Any:
+        """
+        Загружает значение и сохраняет его в кэш
+
+        Args:
+            key (Hashable): Ключ (источник, параметр)
+            fetch (Callable): Корутинная функция загрузки значения
+            ttl (float, optional): Время жизни в секундах. По умолчанию default_ttl.
+
+        Returns:
+            Any: Значение
+        """
+        try:
+            value = await fetch()
+            self.set(key, value, ttl)
+            if self.on_store is not None:
+                self.on_store(key, self._entries[key])
+            return value
+        finally:
+            del self._pending[key]
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Статистика попаданий и промахов по источникам
+
+        Returns:
+            dict: {источник: {'hits': ..., 'misses': ..., 'coalesced': ...}}
+        """
+        return {source: dict(counters) for source, counters in self._stats.items()}
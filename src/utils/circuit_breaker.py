@@ -0,0 +1,79 @@
+import time
+
+
+class SourceUnavailableError(Exception):
+    """
+    Источник данных отключен предохранителем и закэшированного значения нет
+    """
+
+
+class CircuitBreaker:
+    """
+    Предохранитель для внешнего источника данных.
+
+    После failure_threshold ошибок подряд размыкается, и запросы к источнику
+    не выполняются. Через reset_timeout секунд пропускает один пробный запрос:
+    удача замыкает предохранитель, ошибка снова размыкает его. Если пробный
+    запрос не завершился (отмена), предохранитель возвращается в разомкнутое
+    состояние и пропускает следующий пробный запрос.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 60):
+        """
+        Инициализация предохранителя
+
+        Args:
+            failure_threshold (int, optional): Ошибок подряд до размыкания. По умолчанию 3.
+            reset_timeout (float, optional): Пауза перед пробным запросом в секундах. По умолчанию 60.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+
+    def allow_request(self) -> bool:
+        """
+        Проверяет, можно ли обращаться к источнику.
+
+        В разомкнутом состоянии по истечении reset_timeout переводит предохранитель
+        в полуоткрытое состояние и разрешает ровно один пробный запрос.
+
+        Returns:
+            bool: True если запрос можно выполнить
+        """
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            return True
+        return False
+
+    def record_success(self):
+        """
+        Учет удачного запроса
+        """
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        """
+        Учет неудачного запроса
+        """
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def record_cancelled(self):
+        """
+        Учет запроса, прерванного без результата (отмена задачи)
+        """
+        if self.state == self.HALF_OPEN:
+            # Пробный запрос ничего не показал: следующий запрос снова будет пробным
+            self.state = self.OPEN
+            self.opened_at = time.monotonic() - self.reset_timeout
@@ -1,3 +1,4 @@
+import re
 from datetime import datetime, timedelta
 
 def calculate_next_notification(start_date, intakes_per_day):
@@ -48,30 +49,175 @@ def format_medication_info(medication):
     Форматирует информацию о лекарстве для отображения
     
     Args:
-        medication (tuple): Данные о лекарстве из БД
+        medication (Medication): Лекарство из БД
     
     Returns:
         str: Отформатированная строка с информацией
     """
-    med_id, user_id, name, dose, intakes, start_date, duration_val, duration_unit, break_val, break_unit, cycles = medication
-    
     current_date = datetime.now().date()
-    start_date_obj = datetime.strptime(start_date, "%Y-%m-%d").date()
+    start_date_obj = datetime.strptime(medication.start_date, "%Y-%m-%d").date()
     
-    duration_days = duration_val if duration_unit == "days" else duration_val * 30
+    duration_days = medication.duration_value if medication.duration_unit == "days" else medication.duration_value * 30
     end_date = start_date_obj + timedelta(days=duration_days)
     days_left = (end_date - current_date).days
     
     if days_left > 0:
         status = f"⏳ Осталось: {days_left} дней"
     else:
-        break_days = break_val if break_unit == "days" else break_val * 30
+        break_days = medication.break_value if medication.break_unit == "days" else medication.break_value * 30
         next_cycle = end_date + timedelta(days=break_days)
         status = f"⏸️ Перерыв до {next_cycle.strftime('%d.%m.%Y')}"
     
     return (
-        f"• <b>{name}</b> (ID: {med_id})\n"
-        f"  🟢 {dose} капс. × {intakes} р/день\n"
-        f"  📅 Начало: {start_date}\n"
+        f"• <b>{medication.name}</b> (ID: {medication.id})\n"
+        f"  🟢 {medication.dose_per_intake} капс. × {medication.intakes_per_day} р/день\n"
+        f"  📅 Начало: {medication.start_date}\n"
         f"  {status}"
     )
+
+def time_to_minutes(time_str: str) -> int:
+    """
+    Переводит время ЧЧ:ММ в минуту суток
+    
+    Args:
+        time_str (str): Время в формате ЧЧ:ММ
+    
+    Returns:
+        int: Минута суток (0..1439)
+    """
+    hours, minutes = map(int, time_str.split(':'))
+    return hours * 60 + minutes
+
+def minutes_to_time(minute: int) -> str:
+    """
+    Переводит минуту суток во время ЧЧ:ММ
+    
+    Args:
+        minute (int): Минута суток
+    
+    Returns:
+        str: Время в формате ЧЧ:ММ
+    """
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+# Максимальная длина сообщения Telegram
+MESSAGE_LIMIT = 4096
+# Открывающий или закрывающий HTML-тег
+HTML_TAG = re.compile(r'<(/?)([a-zA-Z][\w-]*)[^>]*>')
+# Самая длинная HTML-сущность, которую может встретить разбиение (&#x10FFFF;)
+MAX_ENTITY_LENGTH = 10
+
+def _safe_cut(text: str, limit: int) -> int:
+    """
+    Позиция разрыва строки не дальше limit и не внутри HTML-тега или сущности,
+    по возможности на пробеле
+    
+    Args:
+        text (str): Строка длиннее limit
+        limit (int): Максимальная длина первой части
+    
+    Returns:
+        int: Позиция разрыва
+    """
+    cut = limit
+    tag_start = text.rfind('<', 0, cut)
+    if tag_start != -1 and text.find('>', tag_start, cut) == -1:
+        cut = tag_start
+    entity_start = text.rfind('&', max(0, cut - MAX_ENTITY_LENGTH), cut)
+    if entity_start != -1 and text.find(';', entity_start, cut) == -1:
+        cut = entity_start
+    space = text.rfind(' ', 0, cut)
+    if space > cut // 2:
+        cut = space + 1
+    # Тег или сущность в самом начале строки длиннее лимита - разбиваем как есть
+    return cut or limit
+
+def _open_tags(text: str) -> list:
+    """
+    Теги, которые остаются открытыми в конце text
+    
+    Args:
+        text (str): Часть HTML-текста
+    
+    Returns:
+        list: Открытые теги [(имя, открывающий тег), ...]
+    """
+    tags = []
+    for match in HTML_TAG.finditer(text):
+        closing, name = match.group(1), match.group(2).lower()
+        if not closing:
+            tags.append((name, match.group(0)))
+        elif tags and tags[-1][0] == name:
+            tags.pop()
+    return tags
+
+def _split_long(part: str, limit: int) -> list:
+    """
+    Разбивает часть длиннее limit по строкам, а строку длиннее limit - не внутри
+    тега или сущности. Теги, открытые на месте разрыва, закрываются в конце
+    сообщения и открываются заново в начале следующего.
+    
+    Args:
+        part (str): HTML-текст
+        limit (int): Максимальная длина сообщения
+    
+    Returns:
+        list: Тексты сообщений
+    """
+    pieces = []
+    text = part
+    while len(text) > limit:
+        reserve = 0
+        while True:
+            room = limit - reserve
+            newline = text.rfind('\n', 0, room + 1)
+            if newline > 0:
+                piece, rest = text[:newline], text[newline + 1:]
+            else:
+                cut = _safe_cut(text, room)
+                piece, rest = text[:cut], text[cut:]
+            open_after = _open_tags(piece)
+            closing = ''.join(f'</{name}>' for name, _ in reversed(open_after))
+            if len(piece) + len(closing) <= limit or reserve >= limit // 2:
+                break
+            reserve = len(closing)
+        pieces.append(piece + closing)
+        # Заново открытые теги входят в текст следующего сообщения и учитываются при его разборе
+        text = ''.join(tag for _, tag in open_after) + rest
+    if text:
+        pieces.append(text)
+    return pieces
+
+def split_message(parts, separator: str = "\n\n", limit: int = MESSAGE_LIMIT) -> list:
+    """
+    Собирает части текста в сообщения не длиннее limit, разрывая только между частями
+    
+    Args:
+        parts (Iterable[str]): Части текста (заголовок, записи списка) в HTML-разметке
+        separator (str, optional): Разделитель частей. По умолчанию две новые строки.
+        limit (int, optional): Максимальная длина сообщения. По умолчанию MESSAGE_LIMIT.
+    
+    Returns:
+        list: Тексты сообщений
+    """
+    messages = []
+    chunk = []
+    length = 0
+    for part in parts:
+        if len(part) > limit:
+            # Часть длиннее лимита занимает отдельные сообщения (см. _split_long)
+            if chunk:
+                messages.append(separator.join(chunk))
+                chunk, length = [], 0
+            *head, part = _split_long(part, limit)
+            messages.extend(head)
+        added = len(part) + (len(separator) if chunk else 0)
+        if chunk and length + added > limit:
+            messages.append(separator.join(chunk))
+            chunk, length = [], 0
+            added = len(part)
+        chunk.append(part)
+        length += added
+    if chunk:
+        messages.append(separator.join(chunk))
+    return messages
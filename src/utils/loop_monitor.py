@@ -0,0 +1,238 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Dict, Optional
+
+from ..core.logger import logger
+
+# Корень проекта: по нему в стеке отличаются кадры бота от кадров библиотек
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Служебные обертки, которые не нужно показывать в цепочке вызовов
+SKIPPED_FILES = {os.path.abspath(__file__), os.path.join(PROJECT_ROOT, "src", "utils", "metrics.py")}
+
+
+def _qualname(code) -> str:
+    # co_qualname появился только в Python 3.11
+    return getattr(code, "co_qualname", code.co_name)
+
+
+class LoopMonitor:
+    """
+    Сторож цикла событий: задержка цикла и поиск блокирующих вызовов.
+
+    Корутина-пульс раз в INTERVAL засыпает и замеряет, насколько позже
+    положенного проснулась; замеры хранятся в скользящем окне для процентилей.
+    Отдельный поток следит за пульсом: если цикл не отвечает дольше порога,
+    снимает стек потока цикла и записывает в лог, какой обработчик или задание
+    его занимает (синхронный sqlite, запись лога, долгий расчет).
+    """
+    # Период пульса, в секундах
+    INTERVAL = 0.5
+    # Сколько последних замеров хранится для процентилей (10 минут)
+    WINDOW = 1200
+    # Задержка, начиная с которой цикл считается заблокированным, в секундах
+    THRESHOLD = 0.25
+    # Как часто в лог пишется сводка по задержкам, в секундах
+    REPORT_INTERVAL = 5 * 60
+    # Сколько кадров стека попадает в лог
+    STACK_LIMIT = 15
+
+    def __init__(self, threshold: float = None, interval: float = None):
+        """
+        Инициализация сторожа
+
+        Args:
+            threshold (float, optional): Порог блокировки в секундах. По умолчанию THRESHOLD.
+            interval (float, optional): Период пульса в секундах. По умолчанию INTERVAL.
+        """
+        self.threshold = threshold or self.THRESHOLD
+        self.interval = interval or self.INTERVAL
+        self.logger = logger.getChild('LoopMonitor')
+        self._lags = deque(maxlen=self.WINDOW)
+        self._loop = None
+        self._loop_thread_id = None
+        self._task = None
+        self._watchdog = None
+        self._stop = threading.Event()
+        # Номер и время последнего пульса (читаются потоком-сторожем)
+        self._beats = 0
+        self._last_beat = time.monotonic()
+        # Номер пульса, после которого уже снят стек текущей блокировки
+        self._reported_beat = None
+        # Где была поймана текущая блокировка
+        self._blocked_in = None
+        # Имена задач цикла по id кадра их корутины (обновляет пульс)
+        self._task_names: Dict[int, str] = {}
+        self.blocked = 0
+        self.max_lag = 0.0
+
+    def start(self):
+        """
+        Запуск пульса и потока-сторожа (вызывается из работающего цикла событий)
+        """
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._task = self._loop.create_task(self._heartbeat(), name="loop_monitor")
+        self._watchdog = threading.Thread(target=self._watch, name="loop_monitor", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        """
+        Остановка пульса и потока-сторожа
+        """
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _heartbeat(self):
+        """
+        Пульс: замер задержки цикла и периодическая сводка
+        """
+        loop = self._loop
+        last_report = loop.time()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            now = loop.time()
+            lag = max(now - expected, 0.0)
+            self._lags.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            self._beats += 1
+            self._last_beat = time.monotonic()
+            self._task_names = self._snapshot_tasks()
+
+            if lag >= self.threshold:
+                self.blocked += 1
+                where = self._blocked_in or "неизвестно (блокировка короче периода проверки)"
+                self.logger.warning(f"Цикл событий был заблокирован {lag * 1000:.0f} мс: {where}")
+                self._blocked_in = None
+
+            if now - last_report >= self.REPORT_INTERVAL:
+                last_report = now
+                stats = self.percentiles()
+                self.logger.info(
+                    f"Задержка цикла событий: p50 {stats['p50'] * 1000:.1f} мс, "
+                    f"p99 {stats['p99'] * 1000:.1f} мс, max {stats['max'] * 1000:.1f} мс, "
+                    f"блокировок: {self.blocked}"
+                )
+
+    def _watch(self):
+        """
+        Поток-сторож: снимает стек цикла, если пульс запаздывает дольше порога
+        """
+        check_interval = max(self.threshold / 2, 0.05)
+        while not self._stop.wait(check_interval):
+            silent = time.monotonic() - self._last_beat - self.interval
+            beat = self._beats
+            if silent < self.threshold or self._reported_beat == beat:
+                continue
+            self._reported_beat = beat
+            try:
+                self._report_stack(silent)
+            except Exception as e:
+                self.logger.error(f"Не удалось снять стек цикла событий: {e}")
+
+    def _report_stack(self, silent: float):
+        """
+        Запись в лог стека потока цикла событий во время блокировки
+
+        Args:
+            silent (float): Сколько секунд цикл уже не отвечает
+        """
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return
+        self._blocked_in = self._describe(frame)
+        self.logger.warning(
+            f"Цикл событий не отвечает {silent * 1000:.0f} мс, {self._blocked_in}\n"
+            + "".join(traceback.format_stack(frame, limit=self.STACK_LIMIT))
+        )
+
+    def _describe(self, frame) -> str:
+        """
+        Задача, обработчик или задание и место блокировки по стеку
+
+        Args:
+            frame (FrameType): Текущий кадр потока цикла событий
+
+        Returns:
+            str: Описание
+        """
+        own = []
+        stack = []
+        while frame is not None:
+            stack.append(frame)
+            filename = frame.f_code.co_filename
+            if filename.startswith(PROJECT_ROOT) and filename not in SKIPPED_FILES:
+                own.append(frame)
+            frame = frame.f_back
+        parts = []
+        task_name = self._task_name(stack)
+        if task_name is not None:
+            parts.append(f"задача {task_name}")
+        if own:
+            # Цепочка вызовов бота от обработчика или задания до места блокировки
+            parts.append("в " + " -> ".join(_qualname(frame.f_code) for frame in reversed(own)))
+            parts.append(f"{os.path.relpath(own[0].f_code.co_filename, PROJECT_ROOT)}:{own[0].f_lineno}")
+        return ", ".join(parts) or "вне кода бота"
+
+    @staticmethod
+    def _snapshot_tasks() -> Dict[int, str]:
+        """
+        Имена задач цикла по кадрам их корутин (вызывается внутри цикла)
+
+        Returns:
+            dict: {id кадра корутины: имя задачи}
+        """
+        names = {}
+        for task in asyncio.all_tasks():
+            frame = getattr(task.get_coro(), "cr_frame", None)
+            if frame is not None:
+                names[id(frame)] = task.get_name()
+        return names
+
+    def _task_name(self, stack) -> Optional[str]:
+        """
+        Задача, которой принадлежит стек: внешний кадр корутины из снимка пульса
+
+        Args:
+            stack (list): Кадры потока цикла событий от текущего к внешнему
+
+        Returns:
+            str: Имя задачи или None, если задача не найдена
+        """
+        names = self._task_names
+        for frame in reversed(stack):
+            name = names.get(id(frame))
+            if name is not None:
+                return name
+        return None
+
+    def percentiles(self) -> Dict[str, float]:
+        """
+        Процентили задержки цикла по скользящему окну
+
+        Returns:
+            dict: {'p50': ..., 'p90': ..., 'p99': ..., 'max': ...} в секундах
+        """
+        lags = sorted(self._lags)
+        if not lags:
+            return {'p50': 0.0, 'p90': 0.0, 'p99': 0.0, 'max': 0.0}
+        last = len(lags) - 1
+        return {
+            'p50': lags[round(last * 0.5)],
+            'p90': lags[round(last * 0.9)],
+            'p99': lags[round(last * 0.99)],
+            'max': lags[-1],
+        }
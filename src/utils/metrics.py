@@ -0,0 +1,287 @@
+import asyncio
+import functools
+import inspect
+import logging
+import os
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, Tuple
+
+
+class Histogram:
+    """
+    Гистограмма длительностей в формате Prometheus с одной меткой.
+
+    Наблюдение - поиск корзины и три сложения, без блокировок: все вызовы
+    идут из одного цикла событий.
+    """
+    def __init__(self, name: str, help_text: str, label: str, buckets: Tuple[float, ...]):
+        """
+        Инициализация гистограммы
+
+        Args:
+            name (str): Имя метрики
+            help_text (str): Описание
+            label (str): Имя метки
+            buckets (tuple): Верхние границы корзин в секундах по возрастанию
+        """
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        # значение метки -> [счетчики корзин (последняя +Inf), сумма, количество]
+        self._series: Dict[str, list] = {}
+        # значение метки -> вызовов в процессе выполнения
+        self.in_progress: Dict[str, int] = {}
+
+    def observe(self, label_value: str, seconds: float):
+        """
+        Учитывает одно наблюдение
+
+        Args:
+            label_value (str): Значение метки
+            seconds (float): Длительность в секундах
+        """
+        series = self._series.get(label_value)
+        if series is None:
+            series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, seconds)] += 1
+        series[1] += seconds
+        series[2] += 1
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} histogram"
+        for label_value, (counts, total, count) in sorted(self._series.items()):
+            label = f'{self.label}="{_escape(label_value)}"'
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}'
+            yield f'{self.name}_bucket{{{label},le="+Inf"}} {count}'
+            yield f"{self.name}_sum{{{label}}} {total:.6f}"
+            yield f"{self.name}_count{{{label}}} {count}"
+
+
+def method_labels(obj, methods: Iterable[str] = None, label_prefix: str = None) -> Dict[str, str]:
+    """
+    Методы экземпляра для оборачивания и их подписи
+
+    Args:
+        obj: Экземпляр
+        methods (Iterable[str] | dict, optional): Имена методов или {имя метода: подпись}.
+            По умолчанию все публичные методы.
+        label_prefix (str, optional): Префикс подписи. По умолчанию имя класса.
+
+    Returns:
+        dict: {имя метода: подпись}
+    """
+    if isinstance(methods, dict):
+        return methods
+    prefix = type(obj).__name__ if label_prefix is None else label_prefix
+    if methods is None:
+        methods = [
+            name for name, value in inspect.getmembers(type(obj), inspect.isfunction)
+            if not name.startswith("_")
+        ]
+    return {name: f"{prefix}.{name}" if prefix else name for name in methods}
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """
+    Метрики бота и HTTP-сервер для их чтения Prometheus.
+
+    Длительности собираются обертками над методами экземпляров (instrument),
+    поэтому без включенных метрик код бота не меняется и ничего не теряет.
+    Остальные значения (очереди, задания, кэши) считываются функциями-сборщиками
+    только в момент запроса /metrics.
+    """
+    # Границы корзин гистограмм, в секундах
+    BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    PATH = "/metrics"
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self):
+        self.histograms: Dict[str, Histogram] = {}
+        # имя -> (тип, описание, метки, функция, возвращающая {значения меток: значение})
+        self._collectors: Dict[str, tuple] = {}
+        self._server = None
+
+    def histogram(self, name: str, help_text: str, label: str) -> Histogram:
+        """
+        Гистограмма по имени (создается при первом обращении)
+
+        Args:
+            name (str): Имя метрики
+            help_text (str): Описание
+            label (str): Имя метки
+
+        Returns:
+            Histogram: Гистограмма
+        """
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram(name, help_text, label, self.BUCKETS)
+        return histogram
+
+    def register(self, name: str, kind: str, help_text: str, labels: Tuple[str, ...], collect: Callable[[], dict]):
+        """
+        Регистрирует метрику, значение которой считывается при запросе
+
+        Args:
+            name (str): Имя метрики
+            kind (str): gauge или counter
+            help_text (str): Описание
+            labels (tuple): Имена меток
+            collect (Callable): Возвращает {кортеж значений меток: значение}
+        """
+        self._collectors[name] = (kind, help_text, labels, collect)
+
+    def instrument(self, obj, histogram: Histogram, methods: Iterable[str] = None, label_prefix: str = None):
+        """
+        Заменяет методы экземпляра обертками, измеряющими длительность вызова
+
+        Args:
+            obj: Экземпляр
+            histogram (Histogram): Гистограмма для наблюдений
+            methods (Iterable[str] | dict, optional): Имена методов или {имя метода: значение метки}.
+                По умолчанию все публичные методы.
+            label_prefix (str, optional): Префикс значения метки. По умолчанию имя класса.
+        """
+        for name, label_value in method_labels(obj, methods, label_prefix).items():
+            setattr(obj, name, self._timed(getattr(obj, name), histogram, label_value))
+
+    @staticmethod
+    def _timed(method: Callable, histogram: Histogram, label_value: str) -> Callable:
+        """
+        Обертка, измеряющая длительность вызова
+
+        Args:
+            method (Callable): Метод
+            histogram (Histogram): Гистограмма
+            label_value (str): Значение метки
+
+        Returns:
+            Callable: Обертка
+        """
+        observe = histogram.observe
+        in_progress = histogram.in_progress
+        in_progress.setdefault(label_value, 0)
+        clock = time.perf_counter
+
+        if inspect.iscoroutinefunction(method):
+            @functools.wraps(method)
+            async def timed(*args, **kwargs):
+                in_progress[label_value] += 1
+                started = clock()
+                try:
+                    return await method(*args, **kwargs)
+                finally:
+                    observe(label_value, clock() - started)
+                    in_progress[label_value] -= 1
+        else:
+            @functools.wraps(method)
+            def timed(*args, **kwargs):
+                started = clock()
+                try:
+                    return method(*args, **kwargs)
+                finally:
+                    observe(label_value, clock() - started)
+        return timed
+
+    def render(self) -> str:
+        """
+        Все метрики в текстовом формате Prometheus
+
+        Returns:
+            str: Текст ответа /metrics
+        """
+        lines = []
+        for histogram in self.histograms.values():
+            lines.extend(histogram.render())
+            # Длительные вызовы видны по числу выполняющихся (например, очередь отправки)
+            running = {value: count for value, count in histogram.in_progress.items() if count}
+            if running:
+                name = histogram.name.rsplit("_seconds", 1)[0] + "_in_progress"
+                lines.append(f"# TYPE {name} gauge")
+                lines.extend(f'{name}{{{histogram.label}="{_escape(value)}"}} {count}' for value, count in sorted(running.items()))
+        for name, (kind, help_text, labels, collect) in self._collectors.items():
+            try:
+                values = collect()
+            except Exception as e:
+                logging.error(f"Ошибка сбора метрики {name}: {e}")
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for label_values, value in values.items():
+                if value is None:
+                    continue
+                label_text = ",".join(f'{label}="{_escape(v)}"' for label, v in zip(labels, label_values))
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+        lines.append("")
+        return "\n".join(lines)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Обработка HTTP-запроса: GET /metrics, остальное - 404
+        """
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # Заголовки запроса не нужны, но их нужно дочитать
+            while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == self.PATH:
+                status, body = "200 OK", self.render().encode("utf-8")
+            else:
+                status, body = "404 Not Found", b"not found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {self.CONTENT_TYPE}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body
+            )
+            await writer.drain()
+        except Exception as e:
+            logging.warning(f"Ошибка обработки запроса метрик: {e}")
+        finally:
+            writer.close()
+
+    async def start_server(self, host: str, port: int):
+        """
+        Запуск HTTP-сервера метрик в текущем цикле событий
+
+        Args:
+            host (str): Адрес
+            port (int): Порт
+        """
+        self._server = await asyncio.start_server(self._handle, host, port)
+        logging.info(f"Метрики доступны на http://{host}:{port}{self.PATH}")
+
+    async def stop_server(self):
+        """
+        Остановка HTTP-сервера метрик
+        """
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+
+def create_metrics_from_env():
+    """
+    Метрики, если они включены.
+
+    Переменные окружения:
+        METRICS_PORT: порт HTTP-сервера метрик (без него метрики выключены)
+        METRICS_HOST: адрес сервера (по умолчанию 127.0.0.1)
+
+    Returns:
+        tuple: (Metrics, адрес, порт) или None
+    """
+    port = os.getenv("METRICS_PORT")
+    if not port:
+        return None
+    return Metrics(), os.getenv("METRICS_HOST", "127.0.0.1"), int(port)
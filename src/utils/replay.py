@@ -0,0 +1,192 @@
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+import random
+from pathlib import Path
+
+import httpx
+
+from .services import Services
+
+# Параметры запроса, которые не попадают в записи (ключи API)
+SECRET_PARAMS = ('appid',)
+# Заголовки, описывающие тело в том виде, как оно шло по сети. Тело записывается
+# уже распакованным, и с ними httpx попытался бы распаковать его повторно
+ENCODING_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding')
+
+
+def fixture_key(request: httpx.Request) -> str:
+    """
+    Ключ записи для запроса: метод и адрес без секретных параметров
+
+    Args:
+        request (httpx.Request): Запрос
+
+    Returns:
+        str: Ключ записи
+    """
+    url = request.url
+    for param in SECRET_PARAMS:
+        url = url.copy_remove_param(param)
+    return f"{request.method} {url}"
+
+
+def decoded_headers(headers) -> dict:
+    """
+    Заголовки ответа для распакованного тела
+
+    Args:
+        headers: Заголовки ответа
+
+    Returns:
+        dict: Заголовки без ENCODING_HEADERS
+    """
+    return {name: value for name, value in headers.items() if name.lower() not in ENCODING_HEADERS}
+
+
+def fixture_path(fixtures_dir: Path, key: str) -> Path:
+    """
+    Путь к файлу записи
+
+    Args:
+        fixtures_dir (Path): Каталог записей
+        key (str): Ключ записи
+
+    Returns:
+        Path: Путь к JSON-файлу
+    """
+    return fixtures_dir / f"{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}.json"
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """
+    Транспорт, который выполняет запросы и сохраняет удачные ответы в каталог записей
+    """
+    def __init__(self, fixtures_dir, transport: httpx.AsyncBaseTransport = None):
+        """
+        Инициализация транспорта
+
+        Args:
+            fixtures_dir (str | Path): Каталог записей
+            transport (httpx.AsyncBaseTransport, optional): Реальный транспорт. По умолчанию httpx.AsyncHTTPTransport.
+        """
+        self.fixtures_dir = Path(fixtures_dir)
+        self.fixtures_dir.mkdir(parents=True, exist_ok=True)
+        self.transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = await self.transport.handle_async_request(request)
+        # aread возвращает уже распакованное тело (gzip, br)
+        content = await response.aread()
+        headers = decoded_headers(response.headers)
+        if response.status_code < 400:
+            key = fixture_key(request)
+            record = {
+                'key': key,
+                'status': response.status_code,
+                'content_type': response.headers.get('content-type', ''),
+                'headers': headers,
+                'body': base64.b64encode(content).decode('ascii'),
+            }
+            fixture_path(self.fixtures_dir, key).write_text(json.dumps(record, ensure_ascii=False, indent=1))
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=headers,
+            content=content,
+            request=request,
+        )
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """
+    Транспорт, который отвечает из каталога записей без обращения к сети.
+
+    Позволяет задать задержку ответа и долю ошибок, чтобы нагружать конвейер
+    ежедневной сводки на машине без доступа к внешним API.
+    """
+    def __init__(self, fixtures_dir, latency: float = 0, jitter: float = 0,
+                 error_rate: float = 0, seed: int = None):
+        """
+        Инициализация транспорта
+
+        Args:
+            fixtures_dir (str | Path): Каталог записей
+            latency (float, optional): Задержка ответа в секундах. По умолчанию 0.
+            jitter (float, optional): Случайная добавка к задержке в секундах. По умолчанию 0.
+            error_rate (float, optional): Доля ответов 503 (0..1). По умолчанию 0.
+            seed (int, optional): Зерно генератора случайных чисел. По умолчанию None.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.records = {}
+        for path in Path(fixtures_dir).glob('*.json'):
+            record = json.loads(path.read_text())
+            self.records[record['key']] = record
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        delay = self.latency + self.random.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+
+        if self.error_rate and self.random.random() < self.error_rate:
+            return httpx.Response(503, request=request)
+
+        key = fixture_key(request)
+        record = self.records.get(key)
+        if record is None:
+            logging.warning(f"Нет записи для запроса: {key}")
+            return httpx.Response(404, request=request)
+
+        return httpx.Response(
+            status_code=record['status'],
+            # В старых записях сохранен только content-type
+            headers=decoded_headers(record.get('headers') or {'content-type': record['content_type']}),
+            content=base64.b64decode(record['body']),
+            request=request,
+        )
+
+
+def create_client_from_env():
+    """
+    HTTP-клиент для Services в режиме записи или воспроизведения.
+
+    Переменные окружения:
+        SERVICES_MODE: record | replay (иначе None - обычная работа)
+        SERVICES_FIXTURES: каталог записей (по умолчанию data/services_fixtures)
+        SERVICES_REPLAY_LATENCY: задержка воспроизведения в секундах
+        SERVICES_REPLAY_ERROR_RATE: доля ошибок при воспроизведении
+
+    Returns:
+        httpx.AsyncClient: Клиент или None
+    """
+    mode = os.getenv("SERVICES_MODE")
+    fixtures_dir = os.getenv("SERVICES_FIXTURES", "data/services_fixtures")
+
+    if mode == "record":
+        transport = RecordingTransport(fixtures_dir)
+    elif mode == "replay":
+        transport = ReplayTransport(
+            fixtures_dir,
+            latency=float(os.getenv("SERVICES_REPLAY_LATENCY", "0")),
+            error_rate=float(os.getenv("SERVICES_REPLAY_ERROR_RATE", "0")),
+        )
+    else:
+        return None
+
+    logging.info(f"Services работает в режиме {mode}, записи: {fixtures_dir}")
+    return httpx.AsyncClient(
+        transport=transport,
+        timeout=Services.TIMEOUT,
+        limits=Services.LIMITS,
+        headers={'User-Agent': Services.USER_AGENT},
+    )
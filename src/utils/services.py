@@ -1,24 +1,367 @@
 import os
-
-import requests
+import re
+import json
+import time
+import asyncio
 import random
 from datetime import datetime
 import logging
+from typing import Callable
+
+import httpx
+import pytz
+from bs4 import BeautifulSoup, SoupStrainer
+
+from .cache import TTLCache
+from .circuit_breaker import CircuitBreaker, SourceUnavailableError
+from .validators import normalize_city
+
+
+# Соответствие русских названий знаков зодиака адресам horo.mail.ru
+ZODIAC_SIGNS = {
+    'овен': 'aries',
+    'телец': 'taurus',
+    'близнецы': 'gemini',
+    'рак': 'cancer',
+    'лев': 'leo',
+    'дева': 'virgo',
+    'весы': 'libra',
+    'скорпион': 'scorpio',
+    'стрелец': 'sagittarius',
+    'козерог': 'capricorn',
+    'водолей': 'aquarius',
+    'рыбы': 'pisces'
+}
+
+# Границы блока с текстом гороскопа на странице horo.mail.ru
+HOROSCOPE_BLOCK_START = re.compile(rb'<main\b[^>]*\bitemprop=["\']articleBody["\']', re.IGNORECASE)
+HOROSCOPE_BLOCK_END = re.compile(rb'</main\s*>', re.IGNORECASE)
+HOROSCOPE_TEXT_CLASS = 'b6a5d4949c'
+
+
+def extract_horoscope_text(content: bytes, encoding: str = 'utf-8') -> str:
+    """
+    Извлекает текст гороскопа из страницы horo.mail.ru.
+
+    Вместо разбора всей страницы вырезает блок <main itemprop="articleBody"> и строит
+    дерево только для div с текстом. Результат совпадает с разбором полной страницы.
 
-from bs4 import BeautifulSoup
+    Args:
+        content (bytes): Содержимое страницы
+        encoding (str, optional): Кодировка страницы. По умолчанию 'utf-8'.
+
+    Returns:
+        str: Параграфы гороскопа через пустую строку или None, если текст не найден
+    """
+    start = HOROSCOPE_BLOCK_START.search(content)
+    if start is None:
+        return None
+    end = HOROSCOPE_BLOCK_END.search(content, start.end())
+    block = content[start.start():end.end() if end else len(content)].decode(encoding, errors='replace')
+
+    soup = BeautifulSoup(block, 'html.parser', parse_only=SoupStrainer('div', class_=HOROSCOPE_TEXT_CLASS))
+    paragraphs = [
+        p.text.strip()
+        for div in soup.find_all('div', class_=HOROSCOPE_TEXT_CLASS)
+        for p in div.find_all('p')
+    ]
+    return '\n\n'.join(paragraphs) if paragraphs else None
 
 
 class Services:
+    """
+    Внешние источники данных для ежедневной сводки.
+
+    Все запросы выполняются через общий пул соединений httpx.AsyncClient
+    со строгими таймаутами, поэтому не блокируют цикл событий. Ответы
+    кэшируются по ключу (источник, параметр), так что число внешних запросов
+    не зависит от количества пользователей. Если источник недоступен,
+    предохранитель отключает его, а пользователи получают последнее удачное
+    значение с указанием его возраста. При переданном хранилище кэш
+    переживает перезапуск: он загружается при первом обращении и
+    записывается пакетами с задержкой.
+    """
+    # Строгие таймауты: сводка не должна ждать медленный источник дольше нескольких секунд
+    TIMEOUT = httpx.Timeout(5.0, connect=3.0)
+    LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10)
+    USER_AGENT = (
+        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+        '(KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+    )
+    # Время жизни закэшированных ответов по источникам, в секундах
+    TTLS = {
+        'weather': 30 * 60,
+        'fiat': 60 * 60,
+        'crypto': 10 * 60,
+        'horoscope': 6 * 60 * 60,
+    }
+    # Задержка отложенной записи кэша в хранилище, в секундах
+    FLUSH_DELAY = 5
+    # Сохраненные ответы старше этого срока не загружаются и удаляются из хранилища, в секундах
+    PERSIST_MAX_AGE = 2 * 24 * 60 * 60
+    # Как часто при записи кэша из хранилища удаляются старые ответы, в секундах
+    PRUNE_INTERVAL = 60 * 60
+    # Часовой пояс, в котором наступает "сегодня" гороскопа (как у планировщиков бота)
+    TIMEZONE = pytz.timezone("Europe/Moscow")
+
+    def __init__(self, client: httpx.AsyncClient = None, cache: TTLCache = None, store=None,
+                 clock: Callable[[], datetime] = None):
+        """
+        Инициализация сервисов
+
+        Args:
+            client (httpx.AsyncClient, optional): HTTP-клиент. По умолчанию создается при первом запросе.
+            cache (TTLCache, optional): Кэш ответов. По умолчанию создается новый.
+            store (Database, optional): Хранилище кэша между перезапусками
+                (get_external_cache/save_external_cache/prune_external_cache). По умолчанию кэш не сохраняется.
+            clock (Callable, optional): Текущее время с часовым поясом. По умолчанию время в TIMEZONE.
+        """
+        self._client = client
+        self.clock = clock or (lambda: datetime.now(self.TIMEZONE))
+        # Запасные значения нужны не дольше, чем хранятся сохраненные ответы
+        self.cache = cache or TTLCache(max_age=self.PERSIST_MAX_AGE)
+        self._breakers = {source: CircuitBreaker() for source in self.TTLS}
+        # Фоновые пробные запросы к отключенным источникам
+        self._probes = set()
+
+        self.store = store
+        self._store_loaded = store is None
+        self._dirty = {}
+        self._flush_handle = None
+        self._pruned_at = 0.0
+        if store is not None:
+            self.cache.on_store = self._mark_dirty
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """
+        Общий HTTP-клиент с пулом соединений
+
+        Returns:
+            httpx.AsyncClient: HTTP-клиент
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.TIMEOUT,
+                limits=self.LIMITS,
+                headers={'User-Agent': self.USER_AGENT},
+            )
+        return self._client
+
+    async def close(self):
+        """
+        Сохранение кэша и закрытие HTTP-клиента и его соединений
+        """
+        self.flush()
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+
+    def _load_store(self):
+        """
+        Загрузка сохраненных ответов в кэш при первом обращении
+        """
+        self._store_loaded = True
+        try:
+            self._prune_store()
+            rows = self.store.get_external_cache(time.time() - self.PERSIST_MAX_AGE)
+        except Exception as e:
+            logging.error(f"Ошибка загрузки сохраненного кэша: {e}")
+            return
+        for source, param, value, fetched_at in rows:
+            if source in self.TTLS and self.cache.get_entry((source, param)) is None:
+                self.cache.set((source, param), json.loads(value), ttl=self.TTLS[source], fetched_at=fetched_at)
+        logging.info(f"Загружено сохраненных ответов: {len(rows)}")
+
+    def _mark_dirty(self, key: tuple, entry):
+        """
+        Помечает запись кэша для отложенной записи в хранилище
+
+        Args:
+            key (tuple): Ключ (источник, параметр)
+            entry (CacheEntry): Запись кэша
+        """
+        self._dirty[key] = entry
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.FLUSH_DELAY, self.flush)
+
+    def _prune_store(self):
+        """
+        Удаление из хранилища ответов старше PERSIST_MAX_AGE
+        """
+        now = time.time()
+        self._pruned_at = now
+        deleted = self.store.prune_external_cache(now - self.PERSIST_MAX_AGE)
+        if deleted:
+            logging.info(f"Удалено устаревших сохраненных ответов: {deleted}")
+
+    def flush(self):
+        """
+        Запись накопленных изменений кэша в хранилище одной транзакцией.
+
+        Запись идет в цикле событий: соединение sqlite принадлежит его потоку.
+        Изменения копятся не меньше FLUSH_DELAY секунд и пишутся одной короткой
+        транзакцией; раз в PRUNE_INTERVAL после нее удаляются старые ответы.
+        """
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        rows = [
+            (source, param, json.dumps(entry.value, ensure_ascii=False), entry.fetched_at)
+            for (source, param), entry in dirty.items()
+        ]
+        try:
+            self.store.save_external_cache(rows)
+            if time.time() - self._pruned_at >= self.PRUNE_INTERVAL:
+                self._prune_store()
+        except Exception as e:
+            logging.error(f"Ошибка сохранения кэша: {e}")
+
+    async def _cached(self, source: str, param: str, fetch):
+        """
+        Получение данных источника через кэш и предохранитель.
+
+        Если источник отключен предохранителем или запрос к нему не удался,
+        возвращается последнее удачное значение. Пробный запрос к отключенному
+        источнику при наличии такого значения выполняется в фоне.
+
+        Args:
+            source (str): Источник (ключ TTLS)
+            param (str): Параметр запроса
+            fetch (Callable): Корутинная функция загрузки
+
+        Returns:
+            tuple: (данные источника, возраст устаревших данных в секундах или None для свежих)
+
+        Raises:
+            SourceUnavailableError: Источник отключен, а закэшированного значения нет
+        """
+        if not self._store_loaded:
+            self._load_store()
+
+        key = (source, param)
+        ttl = self.TTLS[source]
+        if self.cache.is_fresh(key):
+            return await self.cache.get_or_fetch(key, fetch, ttl=ttl), None
+
+        breaker = self._breakers[source]
+        guarded = self._guarded(breaker, fetch)
+        stale = self.cache.get_entry(key)
+
+        if breaker.state == CircuitBreaker.CLOSED:
+            try:
+                return await self.cache.get_or_fetch(key, guarded, ttl=ttl), None
+            except Exception:
+                if stale is None:
+                    raise
+                logging.warning(f"Источник {source} недоступен, используем данные из кэша")
+        elif breaker.allow_request():
+            if stale is None:
+                return await self.cache.get_or_fetch(key, guarded, ttl=ttl), None
+            probe = asyncio.ensure_future(self._probe(key, guarded, ttl))
+            self._probes.add(probe)
+            probe.add_done_callback(self._probes.discard)
+
+        if stale is None:
+            raise SourceUnavailableError(f"Источник {source} временно отключен")
+        return stale.value, time.time() - stale.fetched_at
+
     @staticmethod
-    def get_weather(city: str) -> str:
+    def _guarded(breaker: CircuitBreaker, fetch):
         """
-        Получаем погоду через OpenWeatherMap API
-        
+        Оборачивает загрузку учетом результата в предохранителе
+
+        Args:
+            breaker (CircuitBreaker): Предохранитель источника
+            fetch (Callable): Корутинная функция загрузки
+
+        Returns:
+            Callable: Корутинная функция загрузки
+        """
+        async def guarded():
+            try:
+                value = await fetch()
+            except LookupError:
+                # Источник ответил, но данных нет (например, неизвестный город): он исправен
+                breaker.record_success()
+                raise
+            except Exception:
+                breaker.record_failure()
+                raise
+            except BaseException:
+                # Отмена: без учета полуоткрытый предохранитель не пропустил бы больше ни одного запроса
+                breaker.record_cancelled()
+                raise
+            breaker.record_success()
+            return value
+        return guarded
+
+    async def _probe(self, key: tuple, fetch, ttl: float):
+        """
+        Фоновый пробный запрос к отключенному источнику
+
+        Args:
+            key (tuple): Ключ (источник, параметр)
+            fetch (Callable): Корутинная функция загрузки
+            ttl (float): Время жизни значения
+        """
+        try:
+            await self.cache.get_or_fetch(key, fetch, ttl=ttl)
+            logging.info(f"Источник {key[0]} снова доступен")
+        except Exception as e:
+            logging.warning(f"Пробный запрос к {key[0]} не удался: {e}")
+
+    @staticmethod
+    def _with_age(text: str, age: float) -> str:
+        """
+        Добавляет к тексту пометку о возрасте устаревших данных
+
+        Args:
+            text (str): Текст
+            age (float): Возраст данных в секундах или None для свежих
+
+        Returns:
+            str: Текст с пометкой
+        """
+        if age is None:
+            return text
+        minutes = int(age // 60)
+        if minutes < 60:
+            return f"{text}\n⏱ Данные обновлены {minutes} мин назад"
+        return f"{text}\n⏱ Данные обновлены {minutes // 60} ч назад"
+
+    def cache_stats(self) -> dict:
+        """
+        Статистика кэша по источникам
+
+        Returns:
+            dict: {источник: {'hits': ..., 'misses': ..., 'coalesced': ...}}
+        """
+        return self.cache.stats()
+
+    def breaker_states(self) -> dict:
+        """
+        Состояние предохранителей по источникам
+
+        Returns:
+            dict: {источник: 'closed' | 'open' | 'half_open'}
+        """
+        return {source: breaker.state for source, breaker in self._breakers.items()}
+
+    async def _fetch_weather(self, city: str) -> str:
+        """
+        Запрос погоды в OpenWeatherMap API
+
         Args:
             city (str): Название города
-        
+
         Returns:
             str: Строка с информацией о погоде
+
+        Raises:
+            LookupError: Город не найден
         """
         api_key = os.getenv("OpenWeatherAPI")  # Получите на openweathermap.org
         base_url = "http://api.openweathermap.org/data/2.5/weather"
@@ -30,20 +373,89 @@ class Services:
             'lang': 'ru'
         }
 
+        response = await self.client.get(base_url, params=params)
+        if response.status_code == 404:
+            raise LookupError(f"Город не найден: {city}")
+        response.raise_for_status()
+        data = response.json()
+        return (f"🌤 Погода в {city}:\n"
+                f"Температура: {data['main']['temp']}°C\n"
+                f"Ощущается как: {data['main']['feels_like']}°C\n"
+                f"Влажность: {data['main']['humidity']}%\n"
+                f"Ветер: {data['wind']['speed']} м/с")
+
+    async def _fetch_fiat_rate(self) -> float:
+        """
+        Запрос курса USD/RUB в exchangerate-api
+
+        Returns:
+            float: Курс USD/RUB
+        """
+        response = await self.client.get("https://api.exchangerate-api.com/v4/latest/USD")
+        response.raise_for_status()
+        return response.json()['rates']['RUB']
+
+    async def _fetch_crypto_rates(self) -> dict:
+        """
+        Запрос курсов криптовалют в CryptoCompare API
+
+        Returns:
+            dict: Курсы в долларах {'BTC': ..., 'ETH': ..., 'TON': ...}
+        """
+        response = await self.client.get(
+            "https://min-api.cryptocompare.com/data/pricemulti",
+            params={'fsyms': 'BTC,ETH,TON', 'tsyms': 'USD'}
+        )
+        response.raise_for_status()
+        data = response.json()
+        return {symbol: data[symbol]['USD'] for symbol in ('BTC', 'ETH', 'TON')}
+
+    async def _fetch_horoscope(self, sign_en: str) -> str:
+        """
+        Загрузка и парсинг гороскопа с horo.mail.ru
+
+        Args:
+            sign_en (str): Знак зодиака в адресе страницы (aries, taurus, ...)
+
+        Returns:
+            str: Текст гороскопа
+
+        Raises:
+            LookupError: Текст гороскопа не найден на странице
+        """
+        url = f"https://horo.mail.ru/prediction/{sign_en}/today/"
+
+        page = await self.client.get(url)
+        page.raise_for_status()
+
+        text = extract_horoscope_text(page.content, page.encoding or 'utf-8')
+        if text:
+            return text
+
+        raise LookupError(f"Текст гороскопа не найден: {url}")
+
+    async def get_weather(self, city: str) -> str:
+        """
+        Получаем погоду через OpenWeatherMap API
+        
+        Args:
+            city (str): Название города
+        
+        Returns:
+            str: Строка с информацией о погоде
+        """
+        # Один ключ кэша для "moscow", " Moscow " и "MOSCOW"
+        city = normalize_city(city)
         try:
-            response = requests.get(base_url, params=params)
-            data = response.json()
-            return (f"🌤 Погода в {city}:\n"
-                    f"Температура: {data['main']['temp']}°C\n"
-                    f"Ощущается как: {data['main']['feels_like']}°C\n"
-                    f"Влажность: {data['main']['humidity']}%\n"
-                    f"Ветер: {data['wind']['speed']} м/с")
+            text, age = await self._cached('weather', city, lambda: self._fetch_weather(city))
+            return self._with_age(text, age)
+        except LookupError:
+            return f"Не удалось найти город {city}"
         except Exception as e:
             logging.error(f"Weather API error: {e}")
             return f"Не удалось получить погоду для {city}"
 
-    @staticmethod
-    def get_exchange_rates() -> str:
+    async def get_exchange_rates(self) -> str:
         """
         Курсы валют через CryptoCompare API
         
@@ -51,28 +463,26 @@ class Services:
             str: Строка с информацией о курсах валют
         """
         try:
-            # Курсы фиата
-            usd_rub = requests.get("https://api.exchangerate-api.com/v4/latest/USD").json()['rates']['RUB']
-
-            # Криптовалюты
-            crypto_data = requests.get(
-                "https://min-api.cryptocompare.com/data/pricemulti",
-                params={'fsyms': 'BTC,ETH,TON', 'tsyms': 'USD'}
-            ).json()
+            # Курсы фиата и криптовалют запрашиваем параллельно
+            (usd_rub, fiat_age), (crypto, crypto_age) = await asyncio.gather(
+                self._cached('fiat', 'USD/RUB', self._fetch_fiat_rate),
+                self._cached('crypto', 'BTC,ETH,TON', self._fetch_crypto_rates),
+            )
 
-            return (f"💱 Курсы:\n"
+            text = (f"💱 Курсы:\n"
                     f"USD/RUB: {usd_rub:.2f}\n"
-                    f"BTC: ${crypto_data['BTC']['USD']}\n"
-                    f"ETH: ${crypto_data['ETH']['USD']}\n"
-                    f"TON: ${crypto_data['TON']['USD']}")
+                    f"BTC: ${crypto['BTC']}\n"
+                    f"ETH: ${crypto['ETH']}\n"
+                    f"TON: ${crypto['TON']}")
+            ages = [age for age in (fiat_age, crypto_age) if age is not None]
+            return self._with_age(text, max(ages) if ages else None)
         except Exception as e:
             logging.error(f"Exchange API error: {e}")
             return "Не удалось получить курсы валют"
 
-    @staticmethod
-    def get_horoscope(sign: str) -> str:
+    async def get_horoscope(self, sign: str) -> str:
         """
-        Парсинг гороскопа с новым селектором
+        Гороскоп на сегодня для знака зодиака
         
         Args:
             sign (str): Знак зодиака
@@ -80,49 +490,15 @@ class Services:
         Returns:
             str: Строка с гороскопом
         """
-        signs = {
-            'овен': 'aries',
-            'телец': 'taurus',
-            'близнецы': 'gemini',
-            'рак': 'cancer',
-            'лев': 'leo',
-            'дева': 'virgo',
-            'весы': 'libra',
-            'скорпион': 'scorpio',
-            'стрелец': 'sagittarius',
-            'козерог': 'capricorn',
-            'водолей': 'aquarius',
-            'рыбы': 'pisces'
-        }
-
         try:
-            sign_en = signs.get(sign.lower(), 'aries')
-            url = f"https://horo.mail.ru/prediction/{sign_en}/today/"
-            
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            
-            page = requests.get(url, headers=headers, timeout=10)
-            page.raise_for_status()
-            
-            soup = BeautifulSoup(page.content, 'html.parser')
-            
-            # Новый селектор на основе предоставленной структуры
-            main_content = soup.find('main', {'itemprop': 'articleBody'})
-            
-            if main_content:
-                # Собираем все параграфы внутри div с классом 'b6a5d4949c'
-                paragraphs = []
-                for div in main_content.find_all('div', class_='b6a5d4949c'):
-                    paragraphs.extend(p.text.strip() for p in div.find_all('p'))
-                
-                if paragraphs:
-                    text = '\n\n'.join(paragraphs)
-                    return f"♋ Гороскоп для {sign} на сегодня:\n\n{text}"
-            
+            sign_en = ZODIAC_SIGNS.get(sign.lower(), 'aries')
+            # Дата в ключе: гороскоп "на сегодня" меняется в полночь по Москве, а не по часам контейнера
+            param = f"{sign_en}/{self.clock().date().isoformat()}"
+            text, age = await self._cached('horoscope', param, lambda: self._fetch_horoscope(sign_en))
+            return self._with_age(f"♋ Гороскоп для {sign} на сегодня:\n\n{text}", age)
+        except LookupError as e:
+            logging.error(f"Horoscope error: {e}")
             return f"Не удалось найти текст гороскопа для {sign}"
-                
         except Exception as e:
             logging.error(f"Horoscope error: {e}")
             return f"Не удалось получить гороскоп для {sign}"
@@ -0,0 +1,341 @@
+import functools
+import inspect
+import json
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Callable, Iterable, List, Optional
+
+from apscheduler.events import EVENT_JOB_ADDED
+from telegram.request import HTTPXRequest
+
+from ..core.logger import logger
+from .metrics import method_labels
+
+# Текущий трейс и номер открытого в нем спана
+_current: ContextVar[Optional[tuple]] = ContextVar("trace_span", default=None)
+
+
+class Trace:
+    """
+    Спаны одного обновления или задания: [имя, вид, родитель, начало, конец, ошибка, атрибуты]
+    """
+    __slots__ = ('trace_id', 'started_at', 'spans', 'skipped')
+
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex[:16]
+        # Время начала по часам, для записи в файл
+        self.started_at = time.time()
+        self.spans: List[list] = []
+        # Спаны сверх MAX_SPANS не записываются, только считаются
+        self.skipped = 0
+
+
+class _NoSpan:
+    """
+    Пустой спан для вызовов вне трейса
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+NO_SPAN = _NoSpan()
+
+
+class _Span:
+    """
+    Открытый спан: контекстный менеджер, работающий и в корутинах
+    """
+    __slots__ = ('tracer', 'trace', 'index', 'token')
+
+    def __init__(self, tracer: 'Tracer', trace: Trace, index: int):
+        self.tracer = tracer
+        self.trace = trace
+        self.index = index
+        self.token = None
+
+    def __enter__(self):
+        self.token = _current.set((self.trace, self.index))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        span = self.trace.spans[self.index]
+        span[4] = time.perf_counter()
+        if exc_type is not None:
+            span[5] = exc_type.__name__
+        _current.reset(self.token)
+        if span[2] is None:
+            self.tracer._finish(self.trace)
+        return False
+
+    def set(self, **attrs):
+        """
+        Добавляет атрибуты спана
+        """
+        span = self.trace.spans[self.index]
+        if span[6] is None:
+            span[6] = attrs
+        else:
+            span[6].update(attrs)
+
+
+class Tracer:
+    """
+    Трассировка обновлений и заданий планировщика.
+
+    Каждое обновление Telegram и каждый запуск задания - отдельный трейс,
+    внутри него спаны обработчиков, методов Database, запросов Services и
+    вызовов Bot API. Спаны пишутся в список трейса (два замера времени на
+    спан); по завершении трейс попадает в файл, если он выбран выборкой или
+    оказался медленным. Запись в JSONL идет в отдельном потоке.
+    """
+    # Доля трейсов, которые записываются независимо от длительности
+    SAMPLE_RATE = 0.1
+    # Трейсы не короче этого записываются всегда, в миллисекундах
+    SLOW_MS = 1000
+    # Сколько трейсов может ждать записи; сверх этого трейсы отбрасываются
+    MAX_PENDING = 10000
+    # Сколько спанов хранится в одном трейсе (рассылка сводки - это тысячи отправок)
+    MAX_SPANS = 1000
+    DEFAULT_PATH = "data/traces.jsonl"
+
+    def __init__(self, path=DEFAULT_PATH, sample_rate: float = None, slow_ms: float = None):
+        """
+        Инициализация трассировки и запуск потока записи
+
+        Args:
+            path (str | Path, optional): Файл трейсов. По умолчанию data/traces.jsonl.
+            sample_rate (float, optional): Доля записываемых трейсов. По умолчанию SAMPLE_RATE.
+            slow_ms (float, optional): Порог медленного трейса в мс. По умолчанию SLOW_MS.
+        """
+        self.path = str(path)
+        self.sample_rate = self.SAMPLE_RATE if sample_rate is None else sample_rate
+        self.slow_ms = self.SLOW_MS if slow_ms is None else slow_ms
+        self.logger = logger.getChild('Tracer')
+        self.exported = 0
+        self.dropped = 0
+        # Очередь ограничена: если поток записи не успевает, трейсы отбрасываются, а не копятся
+        self._queue = queue.Queue(maxsize=self.MAX_PENDING)
+        self._writer = threading.Thread(target=self._write_loop, name="tracer", daemon=True)
+        self._writer.start()
+
+    def span(self, name: str, kind: str, root: bool = False, **attrs):
+        """
+        Спан внутри текущего трейса или, для root, новый трейс
+
+        Args:
+            name (str): Имя спана
+            kind (str): Вид: update, job, handler, db, service, telegram
+            root (bool, optional): Начинать трейс, если его нет. По умолчанию False.
+            **attrs: Атрибуты спана
+
+        Returns:
+            Контекстный менеджер спана (вне трейса - пустой)
+        """
+        current = _current.get()
+        if current is None:
+            if not root:
+                return NO_SPAN
+            trace, parent = Trace(), None
+        else:
+            trace, parent = current
+            if len(trace.spans) >= self.MAX_SPANS:
+                trace.skipped += 1
+                return NO_SPAN
+        trace.spans.append([name, kind, parent, time.perf_counter(), None, None, attrs or None])
+        return _Span(self, trace, len(trace.spans) - 1)
+
+    def instrument(self, obj, kind: str, methods: Iterable[str] = None, label_prefix: str = None, root: bool = False):
+        """
+        Заменяет методы экземпляра обертками, открывающими спан на время вызова
+
+        Args:
+            obj: Экземпляр
+            kind (str): Вид спанов
+            methods (Iterable[str] | dict, optional): Имена методов или {имя метода: имя спана}.
+                По умолчанию все публичные методы.
+            label_prefix (str, optional): Префикс имени спана. По умолчанию имя класса.
+            root (bool, optional): Вызов вне трейса начинает новый трейс. По умолчанию False.
+        """
+        for name, span_name in method_labels(obj, methods, label_prefix).items():
+            setattr(obj, name, self.wrap(getattr(obj, name), span_name, kind, root))
+
+    def wrap(self, func: Callable, name: str, kind: str, root: bool = False) -> Callable:
+        """
+        Обертка функции или корутинной функции спаном
+
+        Args:
+            func (Callable): Функция
+            name (str): Имя спана
+            kind (str): Вид спана
+            root (bool, optional): Вызов вне трейса начинает новый трейс. По умолчанию False.
+
+        Returns:
+            Callable: Обертка
+        """
+        span = self.span
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def traced(*args, **kwargs):
+                with span(name, kind, root):
+                    return await func(*args, **kwargs)
+        else:
+            @functools.wraps(func)
+            def traced(*args, **kwargs):
+                with span(name, kind, root):
+                    return func(*args, **kwargs)
+        traced._traced = True
+        return traced
+
+    def trace_jobs(self, scheduler, prefix: str):
+        """
+        Каждый запуск заданий планировщика становится отдельным трейсом.
+        Задания, добавленные позже, оборачиваются при добавлении (EVENT_JOB_ADDED).
+
+        Args:
+            scheduler: Планировщик APScheduler
+            prefix (str): Префикс имени трейса
+        """
+        def trace_job(job):
+            if not getattr(job.func, "_traced", False):
+                job.modify(func=self.wrap(job.func, f"{prefix}.{job.id}", "job", root=True))
+
+        def on_job_added(event):
+            job = scheduler.get_job(event.job_id, event.jobstore)
+            if job is not None:
+                trace_job(job)
+
+        for job in scheduler.get_jobs():
+            trace_job(job)
+        scheduler.add_listener(on_job_added, EVENT_JOB_ADDED)
+
+    def _finish(self, trace: Trace):
+        """
+        Завершение трейса: решение о записи и передача в поток записи
+        """
+        root = trace.spans[0]
+        duration_ms = (root[4] - root[3]) * 1000
+        if duration_ms < self.slow_ms and random.random() >= self.sample_rate:
+            return
+        started = root[3]
+        spans = [
+            {
+                'name': name,
+                'kind': kind,
+                'parent': parent,
+                'start_ms': round((start - started) * 1000, 3),
+                # Спан задачи, пережившей трейс, остается незакрытым
+                'duration_ms': round((end - start) * 1000, 3) if end is not None else None,
+                'error': error,
+                'attrs': attrs,
+            }
+            for name, kind, parent, start, end, error, attrs in trace.spans
+        ]
+        try:
+            self._queue.put_nowait({
+                'trace_id': trace.trace_id,
+                'name': root[0],
+                'kind': root[1],
+                'started_at': round(trace.started_at, 3),
+                'duration_ms': round(duration_ms, 3),
+                'skipped_spans': trace.skipped,
+                'spans': spans,
+            })
+        except queue.Full:
+            self.dropped += 1
+
+    def _write_loop(self):
+        """
+        Поток записи: сериализация и дозапись трейсов в файл
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            stopping = False
+            while not stopping:
+                record = self._queue.get()
+                if record is None:
+                    break
+                batch = [record]
+                # Забираем все накопившееся, чтобы писать пачками
+                while True:
+                    try:
+                        record = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if record is None:
+                        stopping = True
+                        break
+                    batch.append(record)
+                try:
+                    f.write("".join(json.dumps(item, ensure_ascii=False) + "\n" for item in batch))
+                    f.flush()
+                    self.exported += len(batch)
+                except Exception as e:
+                    self.logger.error(f"Ошибка записи трейсов: {e}")
+
+    def close(self):
+        """
+        Запись оставшихся трейсов и остановка потока записи
+        """
+        # Поток записи разбирает очередь, поэтому место для признака остановки освободится
+        try:
+            self._queue.put(None, timeout=5)
+        except queue.Full:
+            self.logger.error("Поток записи трейсов не отвечает, оставшиеся трейсы не записаны")
+            return
+        self._writer.join(timeout=5)
+
+
+class TracedRequest(HTTPXRequest):
+    """
+    HTTP-запросы к Bot API со спаном на каждый вызов метода (sendMessage, editMessageText, ...)
+    """
+    def __init__(self, tracer: Tracer, **kwargs):
+        """
+        Args:
+            tracer (Tracer): Трассировка
+            **kwargs: Аргументы HTTPXRequest
+        """
+        super().__init__(**kwargs)
+        self.tracer = tracer
+
+    async def do_request(self, url: str, method: str, request_data=None, **kwargs):
+        with self.tracer.span(f"telegram.{url.rsplit('/', 1)[-1]}", "telegram") as span:
+            code, payload = await super().do_request(url, method, request_data, **kwargs)
+            span.set(status=code)
+            return code, payload
+
+
+def create_tracer_from_env():
+    """
+    Трассировка, если она включена.
+
+    Переменные окружения:
+        TRACE_SAMPLE_RATE: доля записываемых трейсов (без нее трассировка выключена)
+        TRACE_SLOW_MS: трейсы не короче этого записываются всегда (по умолчанию 1000)
+        TRACE_FILE: файл трейсов (по умолчанию data/traces.jsonl)
+
+    Returns:
+        Tracer: Трассировка или None
+    """
+    sample_rate = os.getenv("TRACE_SAMPLE_RATE")
+    if not sample_rate:
+        return None
+    return Tracer(
+        os.getenv("TRACE_FILE", Tracer.DEFAULT_PATH),
+        sample_rate=float(sample_rate),
+        slow_ms=float(os.getenv("TRACE_SLOW_MS", Tracer.SLOW_MS)),
+    )
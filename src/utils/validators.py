@@ -66,3 +66,44 @@ def validate_zodiac_sign(sign: str) -> bool:
                   'дева', 'весы', 'скорпион', 'стрелец',
                   'козерог', 'водолей', 'рыбы']
     return sign.lower() in valid_signs
+
+def validate_city(city: str) -> bool:
+    """
+    Проверка названия города для запроса погоды (например, "Moscow" или "Brest,BY")
+    
+    Args:
+        city (str): Название города
+    
+    Returns:
+        bool: True если название валидно, иначе False
+    """
+    return bool(re.match(r'^[^\W\d_][\w .\'-]{0,49}(,[A-Za-z]{2})?$', city))
+
+def normalize_city(city: str) -> str:
+    """
+    Единое написание города: лишние пробелы убираются, слова названия с заглавной
+    буквы, код страны заглавными ("  new  york,us" -> "New York,US")
+
+    Args:
+        city (str): Название города
+
+    Returns:
+        str: Название города
+    """
+    name, comma, country = city.partition(',')
+    return ' '.join(name.split()).title() + comma + country.strip().upper()
+
+def validate_time(time_str: str) -> bool:
+    """
+    Проверка формата времени (ЧЧ:ММ)
+    
+    Args:
+        time_str (str): Строка со временем для проверки
+    
+    Returns:
+        bool: True если время валидно, иначе False
+    """
+    if not re.match(r'^\d{1,2}:\d{2}$', time_str):
+        return False
+    hours, minutes = map(int, time_str.split(':'))
+    return hours < 24 and minutes < 60
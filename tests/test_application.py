@@ -0,0 +1,96 @@
+import asyncio
+import json
+
+from telegram.ext import Application, TypeHandler
+from telegram.request import BaseRequest
+
+from src.bot.application import OrderedApplication
+
+
+class OfflineRequest(BaseRequest):
+    """Bot API без сети: нужен только getMe из Application.initialize"""
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        me = {"id": 1, "is_bot": True, "first_name": "bot", "username": "bot"}
+        return 200, json.dumps({"ok": True, "result": me}).encode()
+
+
+class TupleOrderedApplication(OrderedApplication):
+    """Обновления - кортежи (пользователь, номер)"""
+
+    @staticmethod
+    def _ordering_key(update):
+        return update[0]
+
+
+async def build():
+    """Приложение, которое записывает обработанные обновления, пока открыт release"""
+    app = (
+        Application.builder().token("123:test").request(OfflineRequest())
+        .application_class(TupleOrderedApplication).build()
+    )
+    app.processed = []
+    app.release = asyncio.Event()
+
+    async def record(update, context):
+        await app.release.wait()
+        app.processed.append(update)
+
+    app.add_handler(TypeHandler(tuple, record))
+    await app.initialize()
+    return app
+
+
+def test_user_updates_are_processed_in_order_and_callers_wait():
+    async def run():
+        app = await build()
+        calls = [asyncio.ensure_future(app.process_update((1, n))) for n in range(3)]
+        calls.append(asyncio.ensure_future(app.process_update((2, 0))))
+        await asyncio.sleep(0)
+        # Вызовы ждут обработки своего обновления, а не возвращаются сразу
+        assert not any(call.done() for call in calls)
+        app.release.set()
+        await asyncio.gather(*calls)
+        return app.processed
+
+    processed = asyncio.run(run())
+    assert [update for update in processed if update[0] == 1] == [(1, 0), (1, 1), (1, 2)]
+    assert (2, 0) in processed
+
+
+def test_user_queue_is_bounded():
+    async def run():
+        app = await build()
+        calls = [asyncio.ensure_future(app.process_update((1, n))) for n in range(app.MAX_PENDING + 3)]
+        await asyncio.sleep(0)
+        app.release.set()
+        await asyncio.gather(*calls)
+        return app
+
+    app = asyncio.run(run())
+    # Первое обновление выполняется, MAX_PENDING ждут, остальные отброшены
+    assert len(app.processed) == app.MAX_PENDING + 1
+    assert app.dropped_updates == 2
+    assert not app._user_queues
+
+
+def test_cancelled_queue_releases_waiting_callers():
+    async def run():
+        app = await build()
+        calls = [asyncio.ensure_future(app.process_update((1, n))) for n in range(3)]
+        await asyncio.sleep(0)
+        calls[0].cancel()
+        results = await asyncio.gather(*calls, return_exceptions=True)
+        return app, results
+
+    app, results = asyncio.run(run())
+    assert all(isinstance(result, asyncio.CancelledError) for result in results)
+    assert app.dropped_updates == 2
+    assert not app._user_queues
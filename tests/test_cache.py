@@ -0,0 +1,91 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+
+import httpx
+import pytest
+
+from src.utils.cache import TTLCache
+from src.utils.services import Services
+from src.utils.validators import normalize_city
+
+
+def test_concurrent_misses_share_one_fetch():
+    cache = TTLCache()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_fetch(("weather", "Moscow"), fetch) for _ in range(10)))
+
+    assert asyncio.run(run()) == [1] * 10
+    assert calls == 1
+    assert cache.stats()["weather"] == {"hits": 0, "misses": 1, "coalesced": 9}
+
+
+def test_failed_fetch_is_not_cached():
+    cache = TTLCache()
+
+    async def fail():
+        raise RuntimeError("source down")
+
+    async def ok():
+        return "value"
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await cache.get_or_fetch(("fiat", "USD/RUB"), fail, ttl=60)
+        return await cache.get_or_fetch(("fiat", "USD/RUB"), ok, ttl=60)
+
+    assert asyncio.run(run()) == "value"
+    assert cache.stats()["fiat"]["misses"] == 2
+    assert len(cache) == 1
+
+
+def test_expired_entry_is_kept_until_max_age():
+    cache = TTLCache(default_ttl=10, max_age=100)
+    now = time.time()
+    cache.set(("weather", "Moscow"), "stale", fetched_at=now - 50)
+    assert not cache.is_fresh(("weather", "Moscow"))
+    assert cache.get_entry(("weather", "Moscow")).value == "stale"
+
+    cache.set(("weather", "Minsk"), "old", fetched_at=now - 200)
+    cache.purge(now)
+    assert cache.get_entry(("weather", "Minsk")) is None
+    assert cache.get_entry(("weather", "Moscow")) is not None
+
+
+def test_size_cap_evicts_least_recently_stored():
+    cache = TTLCache(max_entries=3)
+    for city in ("A", "B", "C"):
+        cache.set(("weather", city), city)
+    # Повторное сохранение переносит запись в конец
+    cache.set(("weather", "A"), "A2")
+    cache.set(("weather", "D"), "D")
+    assert len(cache) == 3
+    assert cache.get_entry(("weather", "B")) is None
+    assert cache.get_entry(("weather", "A")).value == "A2"
+    assert cache.evicted == 1
+
+
+def test_city_keys_are_normalized():
+    assert normalize_city("  new   york ,us") == "New York,US"
+    assert normalize_city("МОСКВА") == normalize_city("москва") == "Москва"
+    assert normalize_city("Brest,BY") == "Brest,BY"
+
+
+def test_horoscope_key_uses_moscow_date():
+    page = (
+        '<main itemprop="articleBody"><div class="b6a5d4949c"><p>Текст</p></div></main>'
+    ).encode()
+    client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, content=page)))
+    # 22:30 UTC - в Москве уже следующие сутки
+    services = Services(client, clock=lambda: datetime(2025, 3, 1, 22, 30, tzinfo=timezone.utc).astimezone(Services.TIMEZONE))
+
+    assert "Текст" in asyncio.run(services.get_horoscope("овен"))
+    assert services.cache.get_entry(("horoscope", "aries/2025-03-02")) is not None
@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from src.utils.circuit_breaker import CircuitBreaker
+from src.utils.services import Services
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.failure_threshold):
+        assert breaker.allow_request()
+        breaker.record_failure()
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+
+def test_half_open_allows_single_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    open_breaker(breaker)
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow_request()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.failures == 0
+
+
+def test_failed_probe_reopens():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    open_breaker(breaker)
+    breaker.opened_at -= 60
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+
+def test_cancelled_probe_does_not_stick_half_open():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    open_breaker(breaker)
+    breaker.opened_at -= 60
+    assert breaker.allow_request()
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    async def run():
+        probe = asyncio.ensure_future(Services._guarded(breaker, hang)())
+        await asyncio.sleep(0)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+    asyncio.run(run())
+    assert breaker.state == CircuitBreaker.OPEN
+    # Следующий запрос снова пробный, без ожидания reset_timeout
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def test_lookup_error_counts_as_success():
+    breaker = CircuitBreaker(failure_threshold=1)
+
+    async def not_found():
+        raise LookupError("город не найден")
+
+    with pytest.raises(LookupError):
+        asyncio.run(Services._guarded(breaker, not_found)())
+    assert breaker.state == CircuitBreaker.CLOSED
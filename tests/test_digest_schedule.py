@@ -0,0 +1,50 @@
+from src.bot.services.digest_schedule import MINUTES_PER_DAY, DigestSchedule
+
+
+def test_load_groups_users_by_minute():
+    schedule = DigestSchedule()
+    schedule.load({1: 480, 2: 480, 3: 450})
+    assert len(schedule) == 3
+    assert schedule.users_at(480) == {1, 2}
+    assert schedule.users_at(450) == {3}
+    assert schedule.users_at(0) == set()
+
+
+def test_set_minute_moves_user_between_buckets():
+    schedule = DigestSchedule()
+    schedule.load({1: 480, 2: 480})
+    schedule.set_minute(1, 600)
+    assert schedule.users_at(480) == {2}
+    assert schedule.users_at(600) == {1}
+    assert schedule.minute_of(1) == 600
+    assert len(schedule) == 2
+
+    # Повторная установка того же времени не дублирует пользователя
+    schedule.set_minute(1, 600)
+    assert schedule.users_at(600) == {1}
+
+
+def test_remove_drops_empty_bucket():
+    schedule = DigestSchedule()
+    schedule.load({1: 480})
+    schedule.remove(1)
+    schedule.remove(1)
+    assert schedule.minute_of(1) is None
+    assert schedule.users_at(480) == set()
+    assert len(schedule) == 0
+
+
+def test_users_at_wraps_around_midnight_and_returns_copy():
+    schedule = DigestSchedule()
+    schedule.load({1: 5})
+    assert schedule.users_at(MINUTES_PER_DAY + 5) == {1}
+    schedule.users_at(5).add(2)
+    assert schedule.users_at(5) == {1}
+
+
+def test_load_replaces_previous_state():
+    schedule = DigestSchedule()
+    schedule.load({1: 480})
+    schedule.load({2: 480})
+    assert schedule.users_at(480) == {2}
+    assert schedule.minute_of(1) is None
@@ -0,0 +1,78 @@
+import asyncio
+from datetime import date, datetime
+
+import pytest
+
+from src.bot.services.scheduler_service import SchedulerService
+from src.core.database import Database
+from src.core.medication_store import MedicationStore
+
+
+def add(db, user_id, name, start=None):
+    return db.add_medication(
+        user_id, name, 1, 2, (start or date.today()).isoformat(), 10, "days", 5, "days", 2
+    )
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / "users.db"))
+    yield db
+    db.conn.close()
+
+
+def test_snapshot_round_trip(db, tmp_path):
+    path = tmp_path / "medications.snapshot"
+    store = MedicationStore(db, path)
+    first = add(db, 1, "Витамин D")
+    add(db, 2, "Омега-3")
+    store.save_snapshot()
+    assert path.exists()
+    # Журнал, вошедший в снимок, очищен
+    assert db.get_medication_changes(0)[1] == set()
+
+    # Изменения после снимка догружаются из журнала
+    db.update_medication(first.id, name="Витамин D3")
+    add(db, 3, "Магний")
+
+    loaded = MedicationStore(db, path)
+    assert loaded.snapshot_seq is not None
+    assert sorted(loaded.names) == ["Витамин D3", "Магний", "Омега-3"]
+    assert sorted(loaded.active_on(date.today())) == sorted(store.active_on(date.today()))
+
+
+def test_snapshot_job_runs_on_loop(db, tmp_path):
+    path = tmp_path / "medications.snapshot"
+    store = MedicationStore(db, path)
+    add(db, 1, "Витамин D")
+    service = SchedulerService(db, None, store)
+    service.setup_medication_checks()
+
+    async def run_job():
+        service.start()
+        try:
+            job = service.scheduler.get_job("medication_snapshot")
+            job.modify(next_run_time=datetime.now(service.scheduler.timezone))
+            for _ in range(50):
+                if path.exists():
+                    break
+                await asyncio.sleep(0.05)
+        finally:
+            service.scheduler.shutdown(wait=False)
+
+    asyncio.run(run_job())
+    assert path.exists()
+    assert db.get_medication_changes(0)[1] == set()
+
+
+def test_snapshot_keeps_names_with_separators(db, tmp_path):
+    path = tmp_path / "medications.snapshot"
+    store = MedicationStore(db, path)
+    names = ["Витамин\0D", "", "Омега\n3", "Магний"]
+    for user_id, name in enumerate(names, 1):
+        add(db, user_id, name)
+    store.save_snapshot()
+
+    loaded = MedicationStore(db, path)
+    assert loaded.snapshot_seq is not None
+    assert loaded.names == store.names == names
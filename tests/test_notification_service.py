@@ -0,0 +1,103 @@
+import asyncio
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from src.bot.services.notification_service import NotificationService
+from src.core.database import Database
+
+
+class StubServices:
+    async def get_exchange_rates(self):
+        return "rates"
+
+    async def get_weather(self, city):
+        return f"weather {city}"
+
+    async def get_horoscope(self, sign):
+        return f"horoscope {sign}"
+
+
+class StubBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        self.sent.append(chat_id)
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / "users.db"))
+    yield db
+    db.conn.close()
+
+
+@pytest.fixture
+def service(db):
+    bot = StubBot()
+    service = NotificationService(db, SimpleNamespace(bot=bot), StubServices())
+    service.bot = bot
+    return service
+
+
+def add_medication(db, user_id):
+    return db.add_medication(user_id, "Витамин D", 1, 1, date.today().isoformat(), 10, "days", 5, "days", 1)
+
+
+def test_first_medication_adds_recipient_without_reload(db, service):
+    service.reload_schedule()
+    assert service.schedule.minute_of(1) is None
+
+    medication = add_medication(db, 1)
+    assert service.schedule.minute_of(1) == 8 * 60
+
+    db.set_user_digest_time(1, "07:30")
+    assert service.schedule.minute_of(1) == 7 * 60 + 30
+
+    # Без лекарств пользователь остается получателем, пока задано время сводки
+    db.delete_medication(medication.id)
+    assert service.schedule.minute_of(1) == 7 * 60 + 30
+
+
+def test_last_medication_removes_recipient(db, service):
+    medication = add_medication(db, 1)
+    service.reload_schedule()
+    assert service.schedule.minute_of(1) is not None
+
+    db.delete_medication(medication.id)
+    assert service.schedule.minute_of(1) is None
+
+
+def test_missed_minutes_are_caught_up(db, service):
+    db.set_user_digest_time(1, "09:00")
+    db.set_user_digest_time(2, "09:01")
+    db.set_user_digest_time(3, "09:03")
+    now = [datetime(2026, 1, 1, 8, 59, tzinfo=service.scheduler.timezone)]
+    service.clock = lambda: now[0]
+
+    async def run():
+        # 08:59, затем такт с опозданием в 09:02: 09:00 и 09:01 досылаются, 09:03 еще не наступило
+        await service.dispatch_digests()
+        now[0] += timedelta(minutes=3)
+        await service.dispatch_digests()
+
+    asyncio.run(run())
+    assert sorted(service.bot.sent) == [1, 2]
+
+
+def test_catch_up_carries_over_midnight(db, service):
+    db.set_user_digest_time(1, "23:59")
+    db.set_user_digest_time(2, "00:00")
+    now = [datetime(2026, 1, 1, 23, 58, tzinfo=service.scheduler.timezone)]
+    service.clock = lambda: now[0]
+
+    async def run():
+        # 23:58, затем такт с опозданием в 00:01: 23:59 и 00:00 досылаются
+        await service.dispatch_digests()
+        now[0] += timedelta(minutes=3)
+        await service.dispatch_digests()
+
+    asyncio.run(run())
+    assert sorted(service.bot.sent) == [1, 2]
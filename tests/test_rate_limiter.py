@@ -0,0 +1,41 @@
+from src.bot.rate_limiter import RateLimiter
+
+
+def test_burst_up_to_capacity_then_refill():
+    limiter = RateLimiter(capacity=3, refill_rate=1)
+    assert [limiter.allow(1, 1, now=0) for _ in range(4)] == [True, True, True, False]
+    # За полсекунды восполняется половина токена - мало для запроса
+    assert not limiter.allow(1, 1, now=0.5)
+    assert limiter.allow(1, 1, now=1.0)
+    # Запас не превышает capacity даже после долгого простоя
+    assert [limiter.allow(1, 1, now=100) for _ in range(4)] == [True, True, True, False]
+
+
+def test_cost_is_charged_per_request():
+    limiter = RateLimiter(capacity=5, refill_rate=1)
+    assert limiter.allow(1, 2, now=0)
+    assert limiter.allow(1, 2, now=0)
+    assert not limiter.allow(1, 2, now=0)
+    assert limiter.allow(1, 1, now=0)
+
+
+def test_users_have_separate_buckets():
+    limiter = RateLimiter(capacity=1, refill_rate=1)
+    assert limiter.allow(1, 1, now=0)
+    assert not limiter.allow(1, 1, now=0)
+    assert limiter.allow(2, 1, now=0)
+
+
+def test_idle_users_are_evicted():
+    limiter = RateLimiter(capacity=2, refill_rate=1)
+    start = limiter._last_evict
+    limiter.allow(1, 1, now=start)
+    limiter.allow(2, 1, now=start + RateLimiter.IDLE_TTL - 30)
+    assert len(limiter) == 2
+
+    # Проверка раз в EVICT_INTERVAL удаляет только простаивающих дольше IDLE_TTL
+    later = start + RateLimiter.IDLE_TTL - 30 + RateLimiter.EVICT_INTERVAL
+    limiter.allow(3, 1, now=later)
+    assert len(limiter) == 2
+    # Удаленный пользователь начинает с полным запасом
+    assert limiter.allow(1, 2, now=later)
@@ -0,0 +1,50 @@
+import re
+
+from src.utils.helpers import split_message
+
+TAG = re.compile(r"<(/?)(\w+)[^>]*>")
+
+
+def balanced(text):
+    stack = []
+    for match in TAG.finditer(text):
+        if match.group(1):
+            if not stack or stack.pop() != match.group(2):
+                return False
+        else:
+            stack.append(match.group(2))
+    return not stack
+
+
+def test_parts_are_joined_up_to_limit():
+    parts = ["a" * 40, "b" * 40, "c" * 40]
+    assert split_message(parts, limit=100) == ["a" * 40 + "\n\n" + "b" * 40, "c" * 40]
+
+
+def test_long_part_is_split_on_lines():
+    lines = [f"• <b>Лекарство {i}</b>" for i in range(20)]
+    messages = split_message(["Заголовок", "\n".join(lines)], limit=100)
+    assert all(len(message) <= 100 for message in messages)
+    assert messages[0] == "Заголовок"
+    assert "\n".join(messages[1:]).split("\n") == lines
+
+
+def test_long_line_is_not_cut_inside_tag_or_entity():
+    line = "x" * 45 + "<b>bold</b>" + "&amp;" * 20
+    messages = split_message([line], limit=50)
+    assert all(len(message) <= 50 for message in messages)
+    for message in messages:
+        assert balanced(message)
+        assert not re.search(r"&\w*$", message)
+        assert not re.search(r"<[^>]*$", message)
+    assert "".join(messages).replace("<b></b>", "") == line
+
+
+def test_open_tags_are_closed_and_reopened():
+    line = "<b>" + "слово " * 30 + "</b>"
+    messages = split_message([line], limit=60)
+    assert len(messages) > 1
+    assert all(len(message) <= 60 and balanced(message) for message in messages)
+    assert all(message.startswith("<b>") for message in messages)
+    text = "".join(TAG.sub("", message) for message in messages)
+    assert text == TAG.sub("", line)